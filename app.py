@@ -1,15 +1,14 @@
 # General dependencies
+import uuid
+import importlib
 import streamlit as st
 
 # Local dependencies
-from source.utils.load_dataset import load_dataset, FAQUAD_TEST_PATH
-from source.pages.title_page import generate_title_page
-from source.pages.game_page import generate_game_page
-from source.pages.result_page import generate_results_page
-from source.pages.error_page import generate_error_page
-from source.pages.leaderboard_page import generate_leaderboard_page
-from source.pages.credits_page import generate_credits_page
-from source.pages.available_pages import Pages
+from source.pages.available_pages import Pages, PAGE_GENERATORS
+from source.pages.admin_page import ADMIN_TOKEN
+from source.utils.profiler import profile_call, PROFILE_ALL
+from source.utils.session_persistence import restore_game_session, persist_game_session
+from source.utils.load_dataset import load_warmup
 
 # Page config
 st.set_page_config(
@@ -18,32 +17,49 @@ st.set_page_config(
     layout="wide"
 )
 
-# Loads the dataset
-load_dataset(FAQUAD_TEST_PATH)
+# Starts warming the shared resources up in the background (once per server process)
+load_warmup()
 
 # Defines the current page as the title page if needed
 if "current_page" not in st.session_state:
     st.session_state["current_page"] = Pages.HOME
 
-# Loads the title page
-if st.session_state["current_page"] == Pages.HOME: 
-    with st.spinner("Aguarde por favor..."): generate_title_page()
+# Resumes the game of the "sid" query parameter, if the session does not have it
+restore_game_session()
 
-# Loads the page of the main game
-elif st.session_state["current_page"] == Pages.GAME: 
-    with st.spinner("Aguarde por favor..."): generate_game_page()
+# Opens the hidden admin page with "?admin=<token>"
+if ADMIN_TOKEN and st.query_params.get("admin") == ADMIN_TOKEN:
+    st.session_state["current_page"] = Pages.ADMIN
 
-# Loads the page of results
-elif st.session_state["current_page"] == Pages.RESULTS:
-    with st.spinner("Aguarde por favor..."): generate_results_page()
+# Switches the profiling of the session with "?profile=1" or "?profile=0"
+if "profile" in st.query_params:
+    st.session_state["profiling"] = st.query_params["profile"] == "1"
 
-# Loads the page of leaderboard
-elif st.session_state["current_page"] == Pages.LEADERBOARD:
-    with st.spinner("Aguarde por favor..."): generate_leaderboard_page()
 
-# Loads the credits
-elif st.session_state["current_page"] == Pages.CREDITS:
-    with st.spinner("Aguarde por favor..."): generate_credits_page()
+def _generate_current_page():
+    '''
+    Generates the current page, importing its module (and
+    its dependencies) only the first time it is shown.
+    '''
+    page = st.session_state["current_page"]
+    module_name, generator_name = PAGE_GENERATORS.get(page, PAGE_GENERATORS[None])
+    generate_page = getattr(importlib.import_module(module_name), generator_name)
 
-# Loads the error page
-else: generate_error_page()
\ No newline at end of file
+    # Pages with a spinner while loading
+    if page in (Pages.HOME, Pages.GAME, Pages.RESULTS, Pages.LEADERBOARD, Pages.CREDITS):
+        with st.spinner("Aguarde por favor..."): generate_page()
+    else:
+        generate_page()
+
+
+# Generates the current page; profiled only for the sessions asking for it
+# (the game is saved to the session store even when the page reruns the script)
+try:
+    if PROFILE_ALL or st.session_state.get("profiling", False):
+        if "profiling_id" not in st.session_state:
+            st.session_state["profiling_id"] = uuid.uuid4().hex[:8]
+        profile_call(_generate_current_page, "{}_{}".format(st.session_state["profiling_id"], st.session_state["current_page"].name))
+    else:
+        _generate_current_page()
+finally:
+    persist_game_session()
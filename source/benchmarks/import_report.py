@@ -0,0 +1,176 @@
+'''
+Startup report of the Streamlit app: the import times of the modules of
+the project and the cost of the first paint of the title page.
+
+The import times come from `python -X importtime`, run in a fresh process
+over the app (as `AppTest` runs it), and are limited to the modules of
+the project (`source.*`). For each one the report has its own import
+time and its cumulative time (including everything it imported), along
+with the heavy third-party packages it pulled in for the first time.
+
+The first paint is measured in another fresh process: the time of the
+first run of the title page and the resident memory of the process right
+after it.
+
+Usage:
+-----
+
+    python -m source.benchmarks.import_report
+    python -m source.benchmarks.import_report --page GAME --json import_report.json
+'''
+# General dependencies
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+# Root of the repository, from which the app is run
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+APP_PATH = os.path.join(ROOT_DIR, "app.py")
+
+# Third-party packages worth reporting when imported at startup
+HEAVY_PACKAGES = ("numpy", "scipy", "pandas", "pyarrow", "nltk", "torch", "transformers", "altair", "PIL")
+
+# Line of `-X importtime`: "import time: <self us> | <cumulative us> | <indented module>"
+_IMPORTTIME_REGEX = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+# Script of the fresh process: first run of the app, optionally moved to another page
+_FIRST_PAINT_SCRIPT = '''
+import os, sys, json, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app_path!r}, default_timeout=120)
+{set_page}app.run()
+elapsed = time.perf_counter() - start
+rss = int(open("/proc/self/statm").read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+print(json.dumps({{
+    "seconds": elapsed,
+    "rss_mib": rss / 2**20,
+    "exception": [str(exception.value) for exception in app.exception],
+    "heavy_packages": [name for name in {heavy!r} if name in sys.modules],
+}}))
+'''
+
+
+def parse_importtime(stderr: str, prefix: str = "source") -> list[dict]:
+    '''
+    Parses the output of `python -X importtime`, returning the modules of
+    the project in import order, with their own and cumulative times (ms)
+    and the heavy packages first imported while they were being imported.
+
+    Parameters:
+    ----------
+
+    stderr: str
+        The standard error of the process run with `-X importtime`.
+
+    prefix: str
+        The top-level package of the project.
+    '''
+    # Entries in the order their imports finished, with their depth
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_REGEX.match(line)
+        if match is not None:
+            entries.append((int(match[1]), int(match[2]), len(match[3]) // 2, match[4]))
+
+    # Every module finishes after the modules it imported (deeper entries right before it)
+    modules = []
+    for idx, (self_us, cumulative_us, depth, name) in enumerate(entries):
+        if name != prefix and not name.startswith(prefix + "."):
+            continue
+        heavy = []
+        child = idx - 1
+        while child >= 0 and entries[child][2] > depth:
+            child_name = entries[child][3]
+            if child_name in HEAVY_PACKAGES:
+                heavy.append(child_name)
+            child -= 1
+        modules.append({
+            "module": name,
+            "self_ms": self_us / 1000,
+            "cumulative_ms": cumulative_us / 1000,
+            "heavy_packages": sorted(heavy),
+        })
+    return modules
+
+
+def _run_fresh(script: str, importtime: bool = False) -> subprocess.CompletedProcess:
+    ''' Runs a script in a fresh interpreter from the root of the repository. '''
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", script]
+    # (without the warm-up, which would import every page in the background)
+    environment = {**os.environ, "QA_GAME_WARMUP": "0"}
+    return subprocess.run(command, cwd=ROOT_DIR, env=environment, capture_output=True, text=True, check=True)
+
+
+def run_import_report(page: str | None = None, repeats: int = 3) -> dict:
+    '''
+    Measures the imports of the project and the first paint of a page,
+    each in fresh processes.
+
+    Parameters:
+    ----------
+
+    page: str | None
+        The name of the page (of `Pages`) shown in the first run; the
+        title page by default.
+
+    repeats: int
+        The number of fresh processes of the first paint measurements.
+    '''
+    set_page = ""
+    if page is not None:
+        set_page = "from source.pages.available_pages import Pages\napp.session_state['current_page'] = Pages.{}\n".format(page)
+    script = _FIRST_PAINT_SCRIPT.format(app_path=APP_PATH, set_page=set_page, heavy=HEAVY_PACKAGES)
+
+    # Imports of the project
+    process = _run_fresh(script, importtime=True)
+    modules = parse_importtime(process.stderr)
+
+    # First paints, without the overhead of `-X importtime`
+    paints = [json.loads(_run_fresh(script).stdout.strip().splitlines()[-1]) for _ in range(repeats)]
+    return {
+        "page": page or "HOME",
+        "modules": modules,
+        "project_import_ms": sum(module["self_ms"] for module in modules),
+        "first_paint_seconds": sorted(paint["seconds"] for paint in paints)[len(paints) // 2],
+        "first_paint_rss_mib": sorted(paint["rss_mib"] for paint in paints)[len(paints) // 2],
+        "heavy_packages": paints[-1]["heavy_packages"],
+        "exception": paints[-1]["exception"],
+    }
+
+
+def _print_report(report: dict, limit: int) -> None:
+    print("{:<48}{:>10}{:>14}  {}".format("module", "self ms", "cumulative ms", "heavy packages"))
+    modules = sorted(report["modules"], key=lambda module: module["cumulative_ms"], reverse=True)
+    for module in modules[:limit]:
+        print("{:<48}{:>10.1f}{:>14.1f}  {}".format(
+            module["module"], module["self_ms"], module["cumulative_ms"], ", ".join(module["heavy_packages"])))
+    print()
+    print("Own import time of the project: {:.1f} ms".format(report["project_import_ms"]))
+    print("First paint of {}: {:.3f} s, {:.1f} MiB resident".format(
+        report["page"], report["first_paint_seconds"], report["first_paint_rss_mib"]))
+    print("Heavy packages loaded: {}".format(", ".join(report["heavy_packages"]) or "none"))
+    for exception in report["exception"]:
+        print("Exception of the app: " + exception)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Startup import report of the QA Game.")
+    parser.add_argument("--page", default=None, help="page (of Pages) of the first run, the title page by default")
+    parser.add_argument("--repeats", type=int, default=3, help="fresh processes of the first paint measurements")
+    parser.add_argument("--limit", type=int, default=30, help="modules shown, by cumulative time")
+    parser.add_argument("--json", default=None, help="optional path to save the report as JSON")
+    args = parser.parse_args()
+
+    report = run_import_report(args.page, args.repeats)
+    _print_report(report, args.limit)
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+'''
+Throughput of the neural model answering concurrent sessions, either
+with independent batch-size-1 calls (as every session calling
+`get_prediction` on its own) or through the micro-batching
+`InferenceService`.
+
+Every client thread answers its share of the questions of the dataset,
+one at a time, as a session waiting for each answer would.
+
+Usage:
+-----
+
+    python -m source.benchmarks.inference_batching --clients 16 --requests 256
+    python -m source.benchmarks.inference_batching --batch-size 32 --window-ms 5 --threads 4
+'''
+# General dependencies
+import os
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# Root of the repository, from which the dataset and the model are read
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+
+def _read_pairs(path: str, num_requests: int) -> list[tuple[str, str]]:
+    ''' Returns the (context, question) pairs of the first questions of a dataset. '''
+    from source.utils.faquad import FaquadDataset
+    dataset = FaquadDataset(path)
+    pairs = []
+    for question_id in range(min(num_requests, dataset.num_questions)):
+        title_idx, paragraph, question = dataset.get_question_indexes(question_id)
+        title = dataset.sorted_titles[title_idx]
+        pairs.append((dataset.get_context(title, paragraph), dataset.get_question(title, paragraph, question)))
+    return pairs
+
+
+def _run_clients(answer, pairs: list[tuple[str, str]], num_clients: int) -> dict[str, float]:
+    ''' Answers every pair from concurrent clients, returning the throughput and the latencies. '''
+    def client(client_idx: int) -> list[float]:
+        latencies = []
+        for context, question in pairs[client_idx::num_clients]:
+            start = time.perf_counter()
+            answer(context, question)
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_clients) as executor:
+        latencies = [value for values in executor.map(client, range(num_clients)) for value in values]
+    elapsed = time.perf_counter() - start
+    return {
+        "requests_per_s": len(pairs) / elapsed,
+        "latency_p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "latency_p95_ms": 1000 * float(np.percentile(latencies, 95)),
+    }
+
+
+def main() -> None:
+    from source.utils.paths import FAQUAD_TEST_PATH
+
+    parser = argparse.ArgumentParser(description="Throughput of the neural model with and without micro-batching.")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent sessions")
+    parser.add_argument("--requests", type=int, default=256, help="questions answered by each mode")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--window-ms", type=float, default=10)
+    parser.add_argument("--threads", type=int, default=None, help="number of CPU threads of torch")
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)
+    import torch
+    from source.models.neural_model import get_prediction, get_predictions
+    from source.models.inference_service import InferenceService
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    pairs = _read_pairs(FAQUAD_TEST_PATH, args.requests)
+
+    # Warms the model and the encodings of the contexts up
+    get_predictions(pairs[:args.batch_size])
+
+    # Independent batch-size-1 calls of every client, at the same time
+    independent = _run_clients(get_prediction, pairs, args.clients)
+
+    # Micro-batching service
+    service = InferenceService(get_predictions, max_batch_size=args.batch_size, window_ms=args.window_ms, max_queue_size=4 * args.clients)
+    batched = _run_clients(lambda context, question: service.submit(context, question, block=True).result(), pairs, args.clients)
+    metrics = service.metrics
+
+    print("{:<14}{:>12}{:>14}{:>14}".format("mode", "req/s", "p50 (ms)", "p95 (ms)"))
+    for name, result in (("independent", independent), ("batched", batched)):
+        print("{:<14}{:>12.1f}{:>14.1f}{:>14.1f}".format(name, result["requests_per_s"], result["latency_p50_ms"], result["latency_p95_ms"]))
+    print()
+    print("Mean batch size: {:.1f} ({} batches), mean queue wait: {:.1f} ms, max queue depth: {}".format(
+        metrics["mean_batch_size"], metrics["batches"], metrics["mean_wait_ms"], metrics["max_queue_depth"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+'''
+Load test of the Streamlit app with concurrent simulated players.
+
+Every player is an in-process `streamlit.testing.v1.AppTest` that goes
+through the title page, the game page (highlighting and submitting the
+answers of several questions), the results page and the leaderboard.
+
+The players of a worker process are all alive at the same time, each one
+in its own thread, as the sessions of a single Streamlit server. Since
+`AppTest` swaps a process-wide runtime for every rerun, the reruns of a
+process run one at a time behind a lock: the harness does not measure
+real concurrency within a process, only the memory of many live sessions
+and the cost of every rerun on its own. The rerun latency is timed once
+the lock is held, and the time waiting for it is reported apart. Only
+the worker processes, like several app servers sharing the same
+leaderboard file, run truly in parallel.
+
+The report contains the rerun latency percentiles of every step, the
+wait for the lock, the memory growth per session and the contention
+over the leaderboard file.
+
+Usage:
+-----
+
+    python -m source.benchmarks.load_test --sessions 20 --questions 5 --processes 2
+'''
+# General dependencies
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import numpy as np
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Root of the repository, from which the app is run
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+APP_PATH = os.path.join(ROOT_DIR, "app.py")
+
+# Only one AppTest can run at a time in a process
+_RUN_LOCK = threading.Lock()
+
+
+class _LeaderboardProbe:
+    '''
+    Wraps the leaderboard read-modify-write of the results page,
+    recording the wall-clock interval of every write.
+    '''
+    def __init__(self, result_page) -> None:
+        self._result_page = result_page
+        self._local = threading.local()
+        self._load = result_page.load_leaderboard
+        self._save = result_page.save_leaderboard
+        self.intervals: list[tuple[float, float]] = []
+
+    def load(self):
+        self._local.start = time.time()
+        return self._load()
+
+    def save(self, df) -> None:
+        try:
+            self._save(df)
+        finally:
+            self.intervals.append((self._local.start, time.time()))
+
+    def install(self) -> None:
+        self._result_page.load_leaderboard = self.load
+        self._result_page.save_leaderboard = self.save
+
+    def uninstall(self) -> None:
+        self._result_page.load_leaderboard = self._load
+        self._result_page.save_leaderboard = self._save
+
+
+def _click(at, label: str) -> None:
+    [button for button in at.button if button.label == label][0].click()
+
+
+def _timed_run(at, step: str, latencies: dict[str, list[float]], timeout: float) -> None:
+    # (the wait for the lock is queueing behind the other players, not the app)
+    start = time.perf_counter()
+    with _RUN_LOCK:
+        latencies["lock_wait"].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        at.run(timeout=timeout)
+        latencies[step].append(time.perf_counter() - start)
+    if len(at.exception) > 0:
+        raise RuntimeError("step {} failed: {}".format(step, at.exception[0].message))
+
+
+def simulate_player(player_idx: int, num_questions: int, hit_rate: float, timeout: float) -> tuple[object, dict[str, list[float]]]:
+    '''
+    Plays a full game through the app, returning the app (so its session
+    stays alive for the memory measurement) and the latencies of its reruns
+    by step, along with the waits for the lock ("lock_wait").
+    '''
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(player_idx)
+    latencies = defaultdict(list)
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+
+    # Title page
+    _timed_run(at, "title", latencies, timeout)
+    at.text_input[0].input("Jogador {}".format(player_idx))
+    _timed_run(at, "user_name", latencies, timeout)
+
+    # Waits for the warm-up of the server, as a load balancer would
+    while [button for button in at.button if button.label == "Iniciar novo jogo"][0].disabled:
+        time.sleep(0.1)
+        _timed_run(at, "warmup", latencies, timeout)
+    _click(at, "Iniciar novo jogo")
+    _timed_run(at, "start_game", latencies, timeout)
+
+    # Game page: highlights and submits answers to several questions
+    game = at.session_state["game_session"]
+    for _ in range(num_questions):
+        context = game.context
+        if rng.random() < hit_rate:
+            answer = game.dataset.get_answers(game.topic, game.paragraph_idx, game.question_idx)[0]
+            start, end = answer["answer_start"], answer["answer_start"] + len(answer["text"])
+        else:
+            start = rng.randrange(len(context))
+            end = min(len(context), start + rng.randint(1, 40))
+        at.session_state["context_highlighter_{}".format(game.question_id)] = [
+            {"start": start, "end": end, "text": context[start:end], "tag": ""}]
+        _timed_run(at, "highlight", latencies, timeout)
+        _click(at, "Submeter resposta")
+        _timed_run(at, "submit", latencies, timeout)
+        _click(at, "Próxima questão")
+        _timed_run(at, "next_question", latencies, timeout)
+
+    # Results and leaderboard
+    _click(at, "Finalizar Jogo")
+    _timed_run(at, "results", latencies, timeout)
+    _click(at, "Placar de líderes")
+    _timed_run(at, "leaderboard", latencies, timeout)
+    return at, latencies
+
+
+def _run_worker(player_indexes: list[int], num_questions: int, hit_rate: float, timeout: float, leaderboard_path: str, trace_memory: bool) -> dict:
+    ''' Runs the given players concurrently in the current process. '''
+    os.chdir(ROOT_DIR)
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+    import source.pages.result_page as result_page
+    import source.utils.leaderboard as leaderboard
+
+    # Every process writes to the same temporary leaderboard
+    leaderboard.GAME_LEADERBOARD_PATH = leaderboard_path
+    probe = _LeaderboardProbe(result_page)
+    probe.install()
+
+    # Warms the imports and the caches up with a player out of the measurements
+    simulate_player(-1 - player_indexes[0], 1, hit_rate, timeout)
+    probe.intervals.clear()
+
+    # Runs every player of this process at the same time
+    if trace_memory:
+        tracemalloc.start()
+        memory_before, _ = tracemalloc.get_traced_memory()
+    else:
+        memory_before = _current_rss()
+    try:
+        with ThreadPoolExecutor(max_workers=len(player_indexes)) as executor:
+            results = list(executor.map(
+                lambda idx: simulate_player(idx, num_questions, hit_rate, timeout),
+                player_indexes))
+        if trace_memory:
+            memory_after, memory_peak = tracemalloc.get_traced_memory()
+        else:
+            memory_after, memory_peak = _current_rss(), None
+    finally:
+        tracemalloc.stop()
+        probe.uninstall()
+
+    # Latencies by step
+    latencies = defaultdict(list)
+    for _, player_latencies in results:
+        for step, values in player_latencies.items():
+            latencies[step].extend(values)
+
+    return {
+        "latencies": dict(latencies),
+        "memory_growth": memory_after - memory_before,
+        "memory_peak": memory_peak,
+        "max_rss_mb": _max_rss_mb(),
+        "leaderboard_intervals": probe.intervals,
+    }
+
+
+def _summarize(values: list[float]) -> dict[str, float]:
+    values_ms = np.array(values) * 1000
+    return {
+        "count": len(values_ms),
+        "p50_ms": float(np.percentile(values_ms, 50)),
+        "p90_ms": float(np.percentile(values_ms, 90)),
+        "p99_ms": float(np.percentile(values_ms, 99)),
+        "max_ms": float(values_ms.max()),
+    }
+
+
+def _current_rss() -> int:
+    ''' Returns the current resident memory of the process in bytes (the peak one if unavailable). '''
+    try:
+        with open("/proc/self/statm", "r") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return int((_max_rss_mb() or 0) * 1024 ** 2)
+
+
+def _max_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 ** 2) if sys.platform == "darwin" else max_rss / 1024
+
+
+def _overlaps(intervals: list[tuple[float, float]]) -> tuple[int, int]:
+    ''' Returns the number of writes overlapping a previous one and the maximum number of simultaneous writes. '''
+    events = sorted([(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals])
+    active, max_active, overlapping = 0, 0, 0
+    for _, delta in events:
+        if delta == 1 and active > 0:
+            overlapping += 1
+        active += delta
+        max_active = max(max_active, active)
+    return overlapping, max_active
+
+
+def run_load_test(num_sessions: int, num_questions: int, num_processes: int = 1, hit_rate: float = 0.5, timeout: float = 60, trace_memory: bool = False) -> dict:
+    '''
+    Runs the load test, returning its report.
+
+    Parameters:
+    ----------
+
+    num_sessions: int
+        The number of simulated players.
+
+    num_questions: int
+        The number of questions answered by every player.
+
+    num_processes: int
+        The number of worker processes (app servers) sharing the players.
+
+    hit_rate: float
+        The probability of a player highlighting the right answer.
+
+    timeout: float
+        The timeout, in seconds, of every rerun.
+
+    trace_memory: bool
+        Measures the memory growth with `tracemalloc` instead of the
+        resident memory; more precise, but it slows the reruns down.
+    '''
+    os.chdir(ROOT_DIR)
+    import source.utils.leaderboard as leaderboard
+
+    # The leaderboard of the test is a temporary copy of the original one
+    leaderboard_path = os.path.join(tempfile.mkdtemp(prefix="qa_game_load_test_"), "game_leaderboard.csv")
+    original_path = leaderboard.GAME_LEADERBOARD_PATH
+    leaderboard.GAME_LEADERBOARD_PATH = leaderboard_path
+
+    # So are the log of the answers, the statistics of the questions and the store of the games (read by the spawned workers)
+    original_environ = dict(os.environ)
+    os.environ["QA_GAME_ANSWER_EVENTS_DIRECTORY"] = os.path.join(os.path.dirname(leaderboard_path), "answer_events")
+    os.environ["QA_GAME_QUESTION_STATS_DIRECTORY"] = os.path.join(os.path.dirname(leaderboard_path), "question_stats")
+    os.environ["QA_GAME_SESSION_STORE"] = "sqlite:" + os.path.join(os.path.dirname(leaderboard_path), "sessions.sqlite3")
+
+    initial_rows = len(leaderboard.load_leaderboard())
+
+    # Splits the players among the processes
+    num_processes = max(1, min(num_processes, num_sessions))
+    players = [list(range(num_sessions))[idx::num_processes] for idx in range(num_processes)]
+
+    # Runs every process
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=num_processes, mp_context=multiprocessing.get_context("spawn")) as executor:
+            workers = list(executor.map(
+                _run_worker, players,
+                [num_questions] * num_processes, [hit_rate] * num_processes,
+                [timeout] * num_processes, [leaderboard_path] * num_processes,
+                [trace_memory] * num_processes))
+        elapsed = time.perf_counter() - start
+        final_rows = len(leaderboard.load_leaderboard())
+    finally:
+        leaderboard.GAME_LEADERBOARD_PATH = original_path
+        os.environ.clear()
+        os.environ.update(original_environ)
+
+    # Latencies by step and overall, and the waits for the lock
+    latencies = defaultdict(list)
+    for worker in workers:
+        for step, values in worker["latencies"].items():
+            latencies[step].extend(values)
+    lock_waits = latencies.pop("lock_wait", [])
+    all_latencies = [value for values in latencies.values() for value in values]
+
+    # Leaderboard contention
+    intervals = [interval for worker in workers for interval in worker["leaderboard_intervals"]]
+    overlapping_writes, max_concurrent_writers = _overlaps(intervals)
+
+    return {
+        "sessions": num_sessions,
+        "questions_per_session": num_questions,
+        "processes": num_processes,
+        "elapsed_s": elapsed,
+        "reruns_per_s": len(all_latencies) / elapsed,
+        "rerun_latency": {"all": _summarize(all_latencies), **{step: _summarize(values) for step, values in latencies.items()}},
+        "lock_wait": _summarize(lock_waits),
+        "memory": {
+            "growth_per_session_kb": sum(worker["memory_growth"] for worker in workers) / num_sessions / 1024,
+            "measured_by": "tracemalloc" if trace_memory else "rss",
+            "traced_peak_mb": max(worker["memory_peak"] for worker in workers) / (1024 ** 2) if trace_memory else None,
+            "max_rss_mb": max(worker["max_rss_mb"] or 0 for worker in workers) or None,
+        },
+        "leaderboard": {
+            "writes": len(intervals),
+            "overlapping_writes": overlapping_writes,
+            "max_concurrent_writers": max_concurrent_writers,
+            "lost_rows": initial_rows + num_processes + num_sessions - final_rows,
+            "write": _summarize([end - start for start, end in intervals]) if intervals else None,
+        },
+    }
+
+
+def _print_report(report: dict) -> None:
+    print("Sessions: {sessions} ({questions_per_session} questions each, {processes} processes)".format(**report))
+    print("Elapsed: {:.2f} s ({:.1f} reruns/s)".format(report["elapsed_s"], report["reruns_per_s"]))
+    print()
+    print("{:<14}{:>7}{:>10}{:>10}{:>10}{:>10}".format("step", "count", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+    for step, summary in report["rerun_latency"].items():
+        print("{:<14}{count:>7}{p50_ms:>10.1f}{p90_ms:>10.1f}{p99_ms:>10.1f}{max_ms:>10.1f}".format(step, **summary))
+    print("{:<14}{count:>7}{p50_ms:>10.1f}{p90_ms:>10.1f}{p99_ms:>10.1f}{max_ms:>10.1f}  (queueing, not included above)".format("lock_wait", **report["lock_wait"]))
+    print()
+    memory = report["memory"]
+    print("Memory growth per session ({}): {:.1f} KiB (traced peak {} MiB, max RSS {} MiB)".format(
+        memory["measured_by"], memory["growth_per_session_kb"],
+        "{:.1f}".format(memory["traced_peak_mb"]) if memory["traced_peak_mb"] is not None else "n/a",
+        "{:.1f}".format(memory["max_rss_mb"]) if memory["max_rss_mb"] is not None else "n/a"))
+    board = report["leaderboard"]
+    print("Leaderboard: {} writes, {} overlapping, up to {} concurrent writers, {} lost rows".format(
+        board["writes"], board["overlapping_writes"], board["max_concurrent_writers"], board["lost_rows"]))
+    if board["write"] is not None:
+        print("Leaderboard read-modify-write: p50 {p50_ms:.1f} ms, p99 {p99_ms:.1f} ms".format(**board["write"]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test of the QA Game with concurrent simulated players.")
+    parser.add_argument("--sessions", type=int, default=20, help="number of simulated players")
+    parser.add_argument("--questions", type=int, default=5, help="questions answered by every player")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes (app servers) sharing the players")
+    parser.add_argument("--hit-rate", type=float, default=0.5, help="probability of highlighting the right answer")
+    parser.add_argument("--timeout", type=float, default=60, help="timeout of every rerun, in seconds")
+    parser.add_argument("--tracemalloc", action="store_true", help="measure memory with tracemalloc (slower reruns)")
+    parser.add_argument("--json", default=None, help="optional path to save the report as JSON")
+    args = parser.parse_args()
+
+    report = run_load_test(
+        args.sessions, args.questions, args.processes,
+        hit_rate=args.hit_rate, timeout=args.timeout, trace_memory=args.tracemalloc)
+    _print_report(report)
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+
+
+if __name__ == "__main__":
+    main()
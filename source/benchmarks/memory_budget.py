@@ -0,0 +1,286 @@
+'''
+Memory budget suite of the datasets and of the state of the game sessions.
+
+Every measurement runs in a fresh process, once with `tracemalloc` (the
+memory allocated by Python and still retained, along with its peak) and
+once without it (the growth of the resident memory of the process):
+
+    dataset_<corpus>        construction of the `FaquadDataset` of every corpus
+    session_base            a new `GameSession`, before any answer
+    session_per_question    growth of a session per answered question
+    results                 the results computed by `GameSession.finish`
+
+The session state is also broken down per attribute (`user_textual_answers`,
+`running_scores` and `scores_results`).
+Every measurement has a budget (in KiB) for its retained memory; the
+suite exits with status 1 if any of them is exceeded, so it can gate
+deploys.
+
+Usage:
+-----
+
+    python -m source.benchmarks.memory_budget
+    python -m source.benchmarks.memory_budget --budget dataset_full=4096 --rss-budget session_per_question=8
+'''
+# General dependencies
+import gc
+import os
+import sys
+import json
+import array
+import argparse
+import tracemalloc
+import numpy as np
+import multiprocessing
+
+# Root of the repository, from which the datasets are read
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+# Default budgets (in KiB) of the retained memory of every measurement
+DEFAULT_BUDGETS_KIB = {
+    "dataset_dev": 384,
+    "dataset_train": 2560,
+    "dataset_full": 2560,
+    "session_base": 16,
+    "session_per_question": 1,
+    "results": 16,
+}
+
+
+def _current_rss() -> int:
+    ''' Returns the current resident memory of the process in bytes (0 if unavailable). '''
+    try:
+        with open("/proc/self/statm", "r") as fp:
+            return int(fp.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def deep_sizeof(obj, seen: set | None = None) -> int:
+    ''' Returns the size in bytes of an object and of the objects it holds. '''
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, array.array, np.ndarray)):
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+class _Probe:
+    ''' Memory of the process between phases, either traced or resident. '''
+    def __init__(self, traced: bool) -> None:
+        self.traced = traced
+        gc.collect()
+        if traced:
+            tracemalloc.start()
+        self._last = self._current()
+
+    def _current(self) -> int:
+        return tracemalloc.get_traced_memory()[0] if self.traced else _current_rss()
+
+    def phase(self) -> dict[str, float]:
+        ''' Returns the growth (and the traced peak) since the last phase, in KiB. '''
+        gc.collect()
+        current = self._current()
+        result = {"growth_kib": (current - self._last) / 1024}
+        if self.traced:
+            result["peak_kib"] = (tracemalloc.get_traced_memory()[1] - self._last) / 1024
+            tracemalloc.reset_peak()
+        self._last = current
+        return result
+
+    def stop(self) -> None:
+        if self.traced:
+            tracemalloc.stop()
+
+
+def _measure_dataset(path: str, traced: bool) -> dict:
+    from source.utils.faquad import FaquadDataset
+    probe = _Probe(traced)
+    dataset = FaquadDataset(path)
+    result = probe.phase()
+    probe.stop()
+    result["num_questions"] = dataset.num_questions
+    return result
+
+
+def _measure_session(dataset_path: str, outputs_path: str, num_questions: int, traced: bool) -> dict:
+    from source.utils.faquad import FaquadDataset
+    from source.engine.game_session import GameSession
+    from source.models.model_answers import ModelAnswers
+
+    # Shared resources, not part of the session
+    dataset = FaquadDataset(dataset_path)
+    model_answers = ModelAnswers(dataset, outputs_path)
+    num_questions = min(num_questions, dataset.num_questions)
+    sorted_titles = dataset.sorted_titles
+    answers = []
+    for question_id in range(num_questions):
+        title_idx, paragraph, question = dataset.get_question_indexes(question_id)
+        answer = dataset.get_answers(sorted_titles[title_idx], paragraph, question)[0]
+        answers.append((question_id, [{"start": answer["answer_start"], "end": answer["answer_start"] + len(answer["text"])}]))
+
+    # New session
+    probe = _Probe(traced)
+    game = GameSession(dataset, model_answers, ordering="sequential")
+    base = probe.phase()
+
+    # Answers every question
+    for question_id, selections in answers:
+        game.select_question(*dataset.get_question_indexes(question_id))
+        game.submit(selections)
+    answered = probe.phase()
+
+    # Results
+    game.finish()
+    results = probe.phase()
+    probe.stop()
+
+    return {
+        "session_base": base,
+        "session_per_question": {key: value / num_questions for key, value in answered.items()},
+        "results": results,
+        "num_questions": num_questions,
+        "attributes_kib": {
+            name: deep_sizeof(getattr(game, name)) / 1024
+            for name in ("user_textual_answers", "running_scores", "scores_results")
+        },
+    }
+
+
+def _run_isolated(function, *args) -> dict:
+    ''' Runs a measurement in a fresh process. '''
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def run_memory_budget(
+    corpora: dict[str, str],
+    session_corpus: tuple[str, str],
+    num_questions: int = 50,
+    budgets_kib: dict[str, float] | None = None,
+    rss_budgets_kib: dict[str, float] | None = None
+) -> dict:
+    '''
+    Runs every measurement of the suite and checks them against their budgets.
+
+    Parameters:
+    ----------
+
+    corpora: dict[str, str]
+        The path of the dataset of every corpus to be measured.
+
+    session_corpus: tuple[str, str]
+        The paths of the dataset and of the model outputs of the sessions.
+
+    num_questions: int
+        The number of questions answered by the measured session.
+
+    budgets_kib: dict[str, float] | None
+        The budgets of the retained (traced) memory of the measurements;
+        `DEFAULT_BUDGETS_KIB` by default.
+
+    rss_budgets_kib: dict[str, float] | None
+        The budgets of the resident memory growth of the measurements.
+    '''
+    budgets_kib = {**DEFAULT_BUDGETS_KIB, **(budgets_kib or {})}
+    rss_budgets_kib = rss_budgets_kib or {}
+    measurements: dict[str, dict] = {}
+
+    # Datasets
+    for name, path in corpora.items():
+        traced = _run_isolated(_measure_dataset, path, True)
+        resident = _run_isolated(_measure_dataset, path, False)
+        measurements["dataset_{}".format(name)] = {
+            "traced_kib": traced["growth_kib"],
+            "traced_peak_kib": traced["peak_kib"],
+            "rss_kib": resident["growth_kib"],
+        }
+
+    # Sessions
+    traced = _run_isolated(_measure_session, *session_corpus, num_questions, True)
+    resident = _run_isolated(_measure_session, *session_corpus, num_questions, False)
+    for name in ("session_base", "session_per_question", "results"):
+        measurements[name] = {
+            "traced_kib": traced[name]["growth_kib"],
+            "traced_peak_kib": traced[name]["peak_kib"],
+            "rss_kib": resident[name]["growth_kib"],
+        }
+
+    # Budgets
+    failures = []
+    for name, measurement in measurements.items():
+        measurement["budget_kib"] = budgets_kib.get(name)
+        measurement["rss_budget_kib"] = rss_budgets_kib.get(name)
+        if measurement["budget_kib"] is not None and measurement["traced_kib"] > measurement["budget_kib"]:
+            failures.append("{}: {:.1f} KiB retained > {:.1f} KiB".format(name, measurement["traced_kib"], measurement["budget_kib"]))
+        if measurement["rss_budget_kib"] is not None and measurement["rss_kib"] > measurement["rss_budget_kib"]:
+            failures.append("{}: {:.1f} KiB resident > {:.1f} KiB".format(name, measurement["rss_kib"], measurement["rss_budget_kib"]))
+
+    return {
+        "measurements": measurements,
+        "session_questions": traced["num_questions"],
+        "session_attributes_kib": traced["attributes_kib"],
+        "failures": failures,
+    }
+
+
+def _print_report(report: dict) -> None:
+    print("{:<24}{:>14}{:>14}{:>12}{:>12}  {}".format("measurement", "retained KiB", "peak KiB", "RSS KiB", "budget KiB", "status"))
+    for name, measurement in report["measurements"].items():
+        exceeded = any(failure.startswith(name + ":") for failure in report["failures"])
+        budget = measurement["budget_kib"]
+        print("{:<24}{:>14.1f}{:>14.1f}{:>12.1f}{:>12}  {}".format(
+            name, measurement["traced_kib"], measurement["traced_peak_kib"], measurement["rss_kib"],
+            "-" if budget is None else "{:.0f}".format(budget), "EXCEEDED" if exceeded else "ok"))
+    print()
+    print("Session state after {} answers:".format(report["session_questions"]))
+    for name, size in report["session_attributes_kib"].items():
+        print("    {:<24}{:>10.1f} KiB".format(name, size))
+    for failure in report["failures"]:
+        print("Budget exceeded: " + failure)
+
+
+def _parse_budgets(values: list[str]) -> dict[str, float]:
+    budgets = {}
+    for value in values:
+        name, _, kib = value.partition("=")
+        budgets[name] = float(kib)
+    return budgets
+
+
+def main() -> None:
+    from source.utils.paths import FAQUAD_TEST_PATH, FAQUAD_TRAIN_PATH, FAQUAD_DATASET_PATH, FAQUAD_TEST_OUTPUTS_PATH
+
+    parser = argparse.ArgumentParser(description="Memory budget suite of the QA Game.")
+    parser.add_argument("--questions", type=int, default=50, help="questions answered by the measured session")
+    parser.add_argument("--budget", action="append", default=[], metavar="NAME=KIB", help="budget of the retained memory of a measurement")
+    parser.add_argument("--rss-budget", action="append", default=[], metavar="NAME=KIB", help="budget of the resident memory growth of a measurement")
+    parser.add_argument("--json", default=None, help="optional path to save the report as JSON")
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)
+    report = run_memory_budget(
+        {"dev": FAQUAD_TEST_PATH, "train": FAQUAD_TRAIN_PATH, "full": FAQUAD_DATASET_PATH},
+        (FAQUAD_TEST_PATH, FAQUAD_TEST_OUTPUTS_PATH),
+        num_questions=args.questions,
+        budgets_kib=_parse_budgets(args.budget),
+        rss_budgets_kib=_parse_budgets(args.rss_budget))
+    _print_report(report)
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as fp:
+            json.dump(report, fp, indent=2)
+    sys.exit(1 if report["failures"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+'''
+Equivalence and speed of the dedicated parser of the Stanford oneline
+trees (`parse_tree`) against the `nltk` extraction of `symbolic_model`
+(`extract_sentences` followed by `extract_phrases`), the one used by
+`preprocess_context` before.
+
+The trees are read from a file of parser output (one tree per line) or
+generated at random, as the parser would produce them: words under
+part-of-speech tags, nested sentences and repeated sentences. Malformed
+trees must be refused by both.
+
+Usage:
+-----
+
+    python -m source.benchmarks.parse_trees --contexts 200 --sentences 20
+    python -m source.benchmarks.parse_trees --trees ./text_sintax_.txt
+'''
+# General dependencies
+import os
+import time
+import random
+import argparse
+
+# Root of the repository, from which the models are imported
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+# Labels and words of the generated trees
+_PHRASE_LABELS = ("S", "S", "NP", "VP", "PP", "AP", "ADVP", "CONJP")
+_TAG_LABELS = ("N", "V", "PREP", "ART", "ADJ", "CONJ", "PNT")
+_WORDS = ("o", "a", "de", "curso", "aluno", "disciplina", "deve", "verificar", "se", "banca", ",", ";", ".")
+
+# Malformed trees, refused by both parsers
+_MALFORMED = ("(S (N a)", "(S (N a)))", "(S (N a)) (S (N b))", "a (S (N b))", "(S (N a)) b", ")", "(")
+
+
+def _generate_tree(rng: random.Random, depth: int) -> str:
+    ''' Returns a random bracketed tree, as the parser would produce. '''
+    if depth == 0 or rng.random() < 0.25:
+        return "({} {})".format(rng.choice(_TAG_LABELS), rng.choice(_WORDS))
+    children = " ".join(_generate_tree(rng, depth - 1) for _ in range(rng.randint(1, 3)))
+    return "({} {})".format(rng.choice(_PHRASE_LABELS), children)
+
+
+def generate_contexts(num_contexts: int, num_sentences: int, seed: int = 0) -> list[list[str]]:
+    ''' Returns the trees of random contexts, some of their sentences repeated. '''
+    rng = random.Random(seed)
+    contexts = []
+    for _ in range(num_contexts):
+        trees = ["(ROOT (S {} {}))".format(_generate_tree(rng, 6), _generate_tree(rng, 6)) for _ in range(num_sentences)]
+        contexts.append(trees + rng.sample(trees, num_sentences // 4))
+    return contexts
+
+
+def _nltk_phrases(tree_list: list[str]) -> dict[int, dict[str, list[str]]]:
+    from source.models.symbolic_model import extract_sentences, extract_phrases
+    return {idx: extract_phrases(sentence) for idx, sentence in enumerate(extract_sentences(tree_list))}
+
+
+def _outcome(function, tree_list: list[str]):
+    ''' Returns the output of an extraction, or the type of the error raised. '''
+    try:
+        return function(tree_list)
+    except Exception as e:
+        return type(e)
+
+
+def run_comparison(contexts: list[list[str]]) -> dict:
+    ''' Compares the outputs and the times of both extractions over the trees of every context. '''
+    from source.models.parse_tree import extract_sentences_phrases
+
+    # Outputs and times of each extraction
+    outputs, times = {}, {}
+    for name, function in (("nltk", _nltk_phrases), ("parse_tree", extract_sentences_phrases)):
+        start = time.perf_counter()
+        outputs[name] = [_outcome(function, tree_list) for tree_list in contexts]
+        times[name] = time.perf_counter() - start
+
+    # Malformed trees
+    malformed = [
+        (tree, _outcome(_nltk_phrases, [tree]), _outcome(extract_sentences_phrases, [tree]))
+        for tree in _MALFORMED
+    ]
+    return {
+        "contexts": len(contexts),
+        "trees": sum(len(tree_list) for tree_list in contexts),
+        "mismatches": [idx for idx, (expected, actual) in enumerate(zip(outputs["nltk"], outputs["parse_tree"])) if expected != actual],
+        "malformed_mismatches": [tree for tree, expected, actual in malformed if not (isinstance(expected, type) and expected is actual)],
+        "times_s": times,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Equivalence and speed of the dedicated parser of the oneline trees against nltk.")
+    parser.add_argument("--trees", default=None, help="file of parser output, one tree per line, as a single context")
+    parser.add_argument("--contexts", type=int, default=200, help="generated contexts")
+    parser.add_argument("--sentences", type=int, default=20, help="generated sentences per context")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Trees
+    if args.trees is not None:
+        with open(args.trees, "r", encoding="utf-8") as fp:
+            contexts = [[line for line in fp.read().split("\n") if line != ""]]
+    else:
+        contexts = generate_contexts(args.contexts, args.sentences, args.seed)
+
+    os.chdir(ROOT_DIR)
+    report = run_comparison(contexts)
+    print("{} contexts, {} trees".format(report["contexts"], report["trees"]))
+    print("nltk: {:.3f} s, parse_tree: {:.3f} s ({:.1f}x)".format(
+        report["times_s"]["nltk"], report["times_s"]["parse_tree"], report["times_s"]["nltk"] / report["times_s"]["parse_tree"]))
+    print("Different outputs: {} contexts, {} malformed trees".format(len(report["mismatches"]), len(report["malformed_mismatches"])))
+    if report["mismatches"] or report["malformed_mismatches"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+'''
+Scaling suite of the dataset and of the game engine over synthetic
+corpora (see `synthetic_corpus`) at growing multiples of a real one.
+
+Every scale runs in a fresh process, timing (per call, in µs):
+
+    load                    construction of the `FaquadDataset`
+    sorted_titles           the sorted titles of the dataset
+    next_indexes            `get_next_question_indexes`
+    previous_indexes        `get_previous_question_indexes`
+    navigation              `GameSession.next_question` and `previous_question`
+    paragraphs_previews     previews of the paragraphs of a topic (first call)
+    questions_previews      previews of the questions of a paragraph (first call)
+    topics_mask             `get_answered_topics_mask` of a game
+    paragraphs_mask         `get_answered_paragraphs_mask` of a game
+    questions_mask          `get_answered_questions_mask` of a game
+    grading                 `check_answer_from_user_selections`
+    submit                  `GameSession.submit`, per answer
+    finish                  `GameSession.finish`, per answer
+
+The games answer `--answers-per-scale` questions per unit of scale, so
+their length grows with the corpus as well. The growth of every
+operation is the exponent `k` of the fit time ~ size^k over the
+scales: 0 for constant time, 1 for linear time per call.
+
+Usage:
+-----
+
+    python -m source.benchmarks.scaling
+    python -m source.benchmarks.scaling --scales 1 10 100 1000 --json
+'''
+# General dependencies
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+import numpy as np
+import multiprocessing
+
+# Root of the repository, from which the base corpus is read
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+
+# Operations of the suite, in report order
+OPERATIONS = (
+    "load", "sorted_titles", "next_indexes", "previous_indexes", "navigation",
+    "paragraphs_previews", "questions_previews", "topics_mask", "paragraphs_mask",
+    "questions_mask", "grading", "submit", "finish",
+)
+
+
+def _time_calls(function, arguments: list) -> float:
+    ''' Returns the mean time (in µs) of calling a function with every argument. '''
+    start = time.perf_counter()
+    for argument in arguments:
+        function(*argument)
+    return 1e6 * (time.perf_counter() - start) / max(len(arguments), 1)
+
+
+def _measure_scale(path: str, num_samples: int, num_answers: int, seed: int) -> dict:
+    from source.utils.faquad import FaquadDataset
+    from source.engine.game_session import GameSession
+    from source.models.model_answers import ModelAnswers
+    from source.utils.answer_checker import check_answer_from_user_selections
+    rng = random.Random(seed)
+    timings = {}
+
+    # Loading
+    start = time.perf_counter()
+    dataset = FaquadDataset(path)
+    timings["load"] = 1e6 * (time.perf_counter() - start)
+    model_answers = ModelAnswers(dataset)
+    titles = dataset.sorted_titles
+    num_answers = min(num_answers, dataset.num_questions)
+
+    # Random questions, as (title, paragraph, question), along with their expected answers
+    question_ids = [rng.randrange(dataset.num_questions) for _ in range(num_samples)]
+    questions = [
+        (titles[title_idx], paragraph, question)
+        for title_idx, paragraph, question in map(dataset.get_question_indexes, question_ids)
+    ]
+    answers = [dataset.get_answers(*question) for question in questions]
+    selections = [
+        [{"start": answer[0]["answer_start"], "end": answer[0]["answer_start"] + len(answer[0]["text"])}]
+        for answer in answers
+    ]
+
+    # Dataset
+    timings["sorted_titles"] = _time_calls(lambda: dataset.sorted_titles, [()] * num_samples)
+    timings["next_indexes"] = _time_calls(dataset.get_next_question_indexes, questions)
+    timings["previous_indexes"] = _time_calls(dataset.get_previous_question_indexes, questions)
+    timings["paragraphs_previews"] = _time_calls(dataset.get_paragraphs_previews, [(title,) for title, _, _ in questions])
+    timings["questions_previews"] = _time_calls(dataset.get_questions_previews, [(title, paragraph) for title, paragraph, _ in questions])
+    timings["grading"] = _time_calls(check_answer_from_user_selections, list(zip(selections, answers)))
+
+    # Game answering random questions
+    game = GameSession(dataset, model_answers, ordering="sequential", seed=seed)
+    answered = rng.sample(range(dataset.num_questions), num_answers)
+    answered_selections = []
+    for question_id in answered:
+        title_idx, paragraph, question = dataset.get_question_indexes(question_id)
+        answer = dataset.get_answers(titles[title_idx], paragraph, question)[0]
+        answered_selections.append([{"start": answer["answer_start"], "end": answer["answer_start"] + len(answer["text"])}])
+    start = time.perf_counter()
+    for question_id, user_selections in zip(answered, answered_selections):
+        game.select_question(*dataset.get_question_indexes(question_id))
+        game.submit(user_selections)
+    timings["submit"] = 1e6 * (time.perf_counter() - start) / num_answers
+
+    # Navigation and masks of the game
+    game.select_question(*dataset.get_question_indexes(question_ids[0]))
+    timings["navigation"] = _time_calls(
+        lambda step: game.next_question() if step % 2 == 0 else game.previous_question(),
+        [(step,) for step in range(num_samples)])
+    timings["topics_mask"] = _time_calls(dataset.get_answered_topics_mask, [(game.user_textual_answers,)] * num_samples)
+    timings["paragraphs_mask"] = _time_calls(dataset.get_answered_paragraphs_mask, [(title, game.user_textual_answers) for title, _, _ in questions])
+    timings["questions_mask"] = _time_calls(dataset.get_answered_questions_mask, [(title, paragraph, game.user_textual_answers) for title, paragraph, _ in questions])
+
+    # Results
+    start = time.perf_counter()
+    game.finish()
+    timings["finish"] = 1e6 * (time.perf_counter() - start) / num_answers
+
+    return {
+        "topics": len(titles),
+        "questions": dataset.num_questions,
+        "answers": num_answers,
+        "timings_us": timings,
+    }
+
+
+def _run_isolated(function, *args) -> dict:
+    ''' Runs a measurement in a fresh process. '''
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def get_growth(sizes: list[int], timings: list[float]) -> float:
+    ''' Returns the exponent `k` of the least-squares fit of time ~ size^k. '''
+    if len(sizes) < 2:
+        return float("nan")
+    return float(np.polyfit(np.log(sizes), np.log(np.maximum(timings, 1e-3)), 1)[0])
+
+
+def run_scaling(
+    base_path: str,
+    scales: list[int],
+    num_samples: int = 500,
+    answers_per_scale: int = 20,
+    seed: int = 0
+) -> dict:
+    '''
+    Runs the suite over a synthetic corpus of every scale of a base one.
+
+    Parameters:
+    ----------
+
+    base_path: str
+        The path of the real corpus to be scaled.
+
+    scales: list[int]
+        The multiples of the base corpus to be measured.
+
+    num_samples: int
+        The number of calls timed for every operation.
+
+    answers_per_scale: int
+        The number of answers of the measured game per unit of scale.
+
+    seed: int
+        The seed of the corpora and of the sampled questions.
+    '''
+    from source.benchmarks.synthetic_corpus import write_corpus
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for scale in scales:
+            path = os.path.join(directory, "synthetic_{}.json".format(scale))
+            write_corpus(base_path, scale, path, seed)
+            results[scale] = _run_isolated(_measure_scale, path, num_samples, answers_per_scale * scale, seed)
+            results[scale]["size_mb"] = os.path.getsize(path) / 2**20
+            os.remove(path)
+
+    sizes = [results[scale]["questions"] for scale in scales]
+    growth = {
+        operation: get_growth(sizes, [results[scale]["timings_us"][operation] for scale in scales])
+        for operation in OPERATIONS
+    }
+    return {"scales": results, "growth": growth}
+
+
+def _print_report(report: dict) -> None:
+    scales = list(report["scales"])
+    print("{:<22}".format("scale") + "".join("{:>12}".format("{}x".format(scale)) for scale in scales) + "{:>10}".format("growth"))
+    for name in ("questions", "answers"):
+        print("{:<22}".format(name) + "".join("{:>12}".format(report["scales"][scale][name]) for scale in scales))
+    print("{:<22}".format("size (MB)") + "".join("{:>12.1f}".format(report["scales"][scale]["size_mb"]) for scale in scales))
+    print()
+    print("Time per call (µs):")
+    for operation in OPERATIONS:
+        print("{:<22}".format(operation)
+              + "".join("{:>12.1f}".format(report["scales"][scale]["timings_us"][operation]) for scale in scales)
+              + "{:>10.2f}".format(report["growth"][operation]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scaling suite of the dataset and of the game engine over synthetic corpora.")
+    parser.add_argument("--base", default=os.path.join(ROOT_DIR, "data", "dev.json"), help="the real corpus to be scaled")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--samples", type=int, default=500, help="calls timed for every operation")
+    parser.add_argument("--answers-per-scale", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="prints the report as JSON")
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)
+    report = run_scaling(args.base, args.scales, args.samples, args.answers_per_scale, args.seed)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+'''
+Generator of synthetic corpora in the SQuAD (FaQuAD) format, at any
+multiple of the size of a real corpus.
+
+Every copy of a topic of the base corpus becomes a new topic with the
+same paragraphs and questions, whose contexts are prefixed by a sentence
+of random words of the corpus (so no two contexts are equal) and whose
+answers are shifted accordingly, so they remain valid spans.
+
+Usage:
+-----
+
+    python -m source.benchmarks.synthetic_corpus --scale 100 --output ./data/corpora/synthetic_100.json
+'''
+# General dependencies
+import os
+import re
+import json
+import random
+import argparse
+
+
+def generate_corpus(base: dict, scale: int, seed: int = 0) -> dict:
+    '''
+    Returns a synthetic corpus with `scale` copies of every topic of a
+    base corpus.
+
+    Parameters:
+    ----------
+
+    base: dict
+        The base corpus, as read from its .json file.
+
+    scale: int
+        The number of copies of every topic.
+
+    seed: int
+        The seed of the random words.
+    '''
+    rng = random.Random(seed)
+    words = sorted({
+        word
+        for topic in base["data"]
+        for paragraph in topic["paragraphs"]
+        for word in re.findall(r"\w+", paragraph["context"])
+    })
+
+    data = []
+    for copy in range(scale):
+        for topic in base["data"]:
+            paragraphs = []
+            for paragraph in topic["paragraphs"]:
+                prefix = " ".join(rng.choice(words) for _ in range(rng.randint(5, 15))) + ". "
+                paragraphs.append({
+                    "context": prefix + paragraph["context"],
+                    "qas": [
+                        {
+                            **qa,
+                            "id": "{}-{}".format(qa.get("id", ""), copy),
+                            "answers": [
+                                {**answer, "answer_start": answer["answer_start"] + len(prefix)}
+                                for answer in qa["answers"]
+                            ],
+                        }
+                        for qa in paragraph["qas"]
+                    ],
+                })
+            data.append({"title": "{} {:05d}".format(topic["title"], copy) if scale > 1 else topic["title"], "paragraphs": paragraphs})
+
+    # Topics are written shuffled, as they are not sorted in the real corpora either
+    rng.shuffle(data)
+    return {"version": base.get("version", "synthetic"), "data": data}
+
+
+def write_corpus(base_path: str, scale: int, output_path: str, seed: int = 0) -> dict[str, int]:
+    ''' Writes a synthetic corpus of a base corpus, returning its number of topics, paragraphs and questions. '''
+    with open(base_path, "r", encoding="utf-8") as fp:
+        base = json.load(fp)
+    corpus = generate_corpus(base, scale, seed)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as fp:
+        json.dump(corpus, fp, ensure_ascii=False)
+    return {
+        "topics": len(corpus["data"]),
+        "paragraphs": sum(len(topic["paragraphs"]) for topic in corpus["data"]),
+        "questions": sum(len(paragraph["qas"]) for topic in corpus["data"] for paragraph in topic["paragraphs"]),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generates a synthetic FaQuAD corpus at a multiple of a real one.")
+    parser.add_argument("--base", default="./data/dev.json", help="the real corpus to be scaled")
+    parser.add_argument("--scale", type=int, default=10, help="copies of every topic")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    sizes = write_corpus(args.base, args.scale, args.output, args.seed)
+    print("{topics} topics, {paragraphs} paragraphs and {questions} questions written to {path} ({size:.1f} MB)".format(
+        **sizes, path=args.output, size=os.path.getsize(args.output) / 2**20))
+
+
+if __name__ == "__main__":
+    main()
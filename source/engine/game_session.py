@@ -0,0 +1,456 @@
+# General dependencies
+import json
+import time
+import uuid
+import zlib
+import base64
+import random
+import numpy as np
+
+# Local dependencies
+from source.utils.faquad import FaquadDataset
+from source.utils.answer_checker import check_answer_from_user_selections
+from source.utils.answer_records import AnswerRecords, get_answer_text
+from source.utils.running_scores import RunningScores
+from source.models.metrics import compute_f1, exact_match
+from source.models.model_answers import ModelAnswers
+from source.utils.question_stats import QuestionStats
+from source.engine.question_scheduler import QuestionScheduler, get_question_order
+
+# Version of the format of the games serialized by `GameSession.to_bytes`
+STATE_VERSION = 3
+
+
+class GameSession:
+    '''
+    UI-independent engine of a game of the QA Game. It holds the state
+    of a single player and implements the rules of the game: question
+    selection, navigation, answer submission and scoring.
+
+    Parameters:
+    ----------
+
+    dataset: FaquadDataset
+        The dataset for the QA Game.
+
+    model_answers: ModelAnswers
+        The answers of the models for the questions of the dataset.
+
+    user_name: str
+        The name chosen by the user.
+
+    ordering: str
+        The order of the questions for the navigation, one of
+        `ORDERINGS`: "sequential", "shuffled", "difficulty" or "hit_rate".
+
+    seed: int | None
+        The seed of the shuffled ordering; random if None.
+
+    corpus_name: str | None
+        The name of the corpus of the dataset, if known.
+
+    corpus_digest: str | None
+        The digest of the version of the corpus of the dataset, if
+        known, so the game is restored over the same version.
+
+    question_stats: QuestionStats | None
+        The statistics of the questions across every player, updated
+        by the submissions of the game, if any.
+    '''
+    def __init__(
+        self,
+        dataset: FaquadDataset,
+        model_answers: ModelAnswers,
+        user_name: str = "Convidado",
+        ordering: str = "sequential",
+        seed: int | None = None,
+        corpus_name: str | None = None,
+        question_stats: QuestionStats | None = None,
+        corpus_digest: str | None = None
+    ) -> None:
+
+        # Shared resources
+        self.dataset = dataset
+        self.model_answers = model_answers
+        self.corpus_name = corpus_name
+        self.corpus_digest = corpus_digest
+        self.question_stats = question_stats
+        self.user_name = user_name
+
+        # Unique id of the game, for the logs
+        self.game_id: str = uuid.uuid4().hex
+
+        # Indexes of the selected question
+        self.topic_idx: int = 0
+        self.paragraph_idx: int = 0
+        self.question_idx: int = 0
+
+        # Answers of the user (along with whether they are correct)
+        self.user_textual_answers = AnswerRecords()
+
+        # Scores of the answers, computed as they are submitted; the answers of the
+        # models not available yet (with live inference) are scored once they are
+        self.running_scores = RunningScores()
+        self._unscored: list[tuple[int, int]] = []
+
+        # Time control (wall clock, so it is meaningful across processes)
+        self.initial_time: float = time.time()
+        self.end_time: float | None = None
+
+        # Results, available once the game is finished
+        self.scores_results: dict | None = None
+        self._answered_questions: list[tuple[int, str]] | None = None
+
+        # Order of the questions not answered yet, starting from the first one
+        self.ordering = ordering
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.scheduler = QuestionScheduler(get_question_order(dataset, ordering, self.seed, model_answers, question_stats))
+        self.select_question(*self.dataset.get_question_indexes(self.scheduler.first()))
+
+    @property
+    def topic(self) -> str:
+        ''' The name of the selected topic. '''
+        return self.dataset.sorted_titles[self.topic_idx]
+
+    @property
+    def indexes(self) -> tuple[int, int, int]:
+        ''' The indexes of the selected topic, paragraph and question. '''
+        return self.topic_idx, self.paragraph_idx, self.question_idx
+
+    @property
+    def question_id(self) -> int:
+        ''' The global id of the selected question. '''
+        return self.dataset.get_question_id(*self.indexes)
+
+    @property
+    def context(self) -> str:
+        ''' The context of the selected question. '''
+        return self.dataset.get_context(self.topic, self.paragraph_idx)
+
+    @property
+    def question(self) -> str:
+        ''' The text of the selected question. '''
+        return self.dataset.get_question(self.topic, self.paragraph_idx, self.question_idx)
+
+    @property
+    def answered(self) -> bool:
+        ''' Indicates if the selected question was already answered. '''
+        return self.question_id in self.user_textual_answers
+
+    @property
+    def correct(self) -> bool:
+        ''' Indicates if the selected question was correctly answered. '''
+        return self.user_textual_answers.is_correct(self.question_id)
+
+    @property
+    def num_answered(self) -> int:
+        ''' The number of submitted answers. '''
+        return len(self.user_textual_answers)
+
+    @property
+    def num_correct(self) -> int:
+        ''' The number of correct submitted answers. '''
+        return self.user_textual_answers.num_correct
+
+    @property
+    def finished(self) -> bool:
+        ''' Indicates if the game is finished. '''
+        return self.scores_results is not None
+
+    def select_question(self, topic_idx: int, paragraph_idx: int, question_idx: int) -> None:
+        ''' Selects a question by the indexes of its sorted topic, its paragraph and itself. '''
+        if not 0 <= topic_idx < len(self.dataset.sorted_titles):
+            raise ValueError("invalid topic index {}".format(topic_idx))
+        topic = self.dataset.sorted_titles[topic_idx]
+        if not 0 <= paragraph_idx < self.dataset.get_num_paragraphs(topic):
+            raise ValueError("invalid paragraph index {}".format(paragraph_idx))
+        if not 0 <= question_idx < self.dataset.get_num_questions(topic, paragraph_idx):
+            raise ValueError("invalid question index {}".format(question_idx))
+        self.topic_idx, self.paragraph_idx, self.question_idx = topic_idx, paragraph_idx, question_idx
+
+    def next_question(self) -> None:
+        '''
+        Selects the next question not answered yet, following the ordering
+        of the game; once every question is answered, the next one of the
+        dataset.
+        '''
+        question_id = self.scheduler.next(self.question_id)
+        if question_id is None:
+            self.select_question(*self.dataset.get_next_question_indexes(
+                self.topic, self.paragraph_idx, self.question_idx))
+        else:
+            self.select_question(*self.dataset.get_question_indexes(question_id))
+
+    def previous_question(self) -> None:
+        '''
+        Selects the previous question not answered yet, following the
+        ordering of the game; once every question is answered, the
+        previous one of the dataset.
+        '''
+        question_id = self.scheduler.previous(self.question_id)
+        if question_id is None:
+            self.select_question(*self.dataset.get_previous_question_indexes(
+                self.topic, self.paragraph_idx, self.question_idx))
+        else:
+            self.select_question(*self.dataset.get_question_indexes(question_id))
+
+    def get_user_offsets(self, question_id: int | None = None) -> list[tuple[int, int]]:
+        ''' Returns the offsets of the selections of an answered question (the selected one by default). '''
+        if question_id is None:
+            question_id = self.question_id
+        return self.user_textual_answers.get_offsets(question_id)
+
+    def get_user_f1(self, question_id: int | None = None) -> float:
+        ''' Returns the F1 score of the answer of an answered question (the selected one by default). '''
+        if question_id is None:
+            question_id = self.question_id
+        tidx, cidx, qidx = self.dataset.get_question_indexes(question_id)
+        title = self.dataset.sorted_titles[tidx]
+        answer = get_answer_text(self.dataset.get_context(title, cidx), self.get_user_offsets(question_id))
+        return max(compute_f1(answer, expected["text"]) for expected in self.dataset.get_answers(title, cidx, qidx))
+
+    def submit(self, user_selections: list[dict]) -> bool:
+        '''
+        Submits the answer of the user for the selected question.
+
+        Parameters:
+        ----------
+
+        user_selections: list[dict]
+            The selections made by the user over the context; every
+            selection has, at least, the attributes "start" and "end".
+
+        Returns:
+        -------
+
+        correct: bool
+            Indicates if the answer is correct.
+        '''
+        if self.finished:
+            raise ValueError("the game is already finished")
+        if self.answered:
+            raise ValueError("question {} was already answered".format(self.indexes))
+
+        # Checks and records the answer
+        question_answers = self.dataset.get_answers(self.topic, self.paragraph_idx, self.question_idx)
+        correct = check_answer_from_user_selections(user_selections, question_answers)
+        self.user_textual_answers.add(self.question_id, user_selections, correct)
+        self.scheduler.mark_answered(self.question_id)
+
+        # Scores the answer of the user
+        position = self.num_answered - 1
+        user_f1 = self._score(position, self.question_id, {"user": (get_answer_text(self.context, self.get_user_offsets()), correct)})
+
+        # Updates the statistics of the question across every player
+        if self.question_stats is not None:
+            self.question_stats.record(self.indexes, correct, user_f1)
+
+        # Starts computing the answers of the models, if not available yet,
+        # scoring the ones already available (of this and of previous answers)
+        self.model_answers.request(self.indexes)
+        self._unscored.append((position, self.question_id))
+        self._score_models(wait=False)
+        return correct
+
+    def _score(self, position: int, question_id: int, answers: dict[str, tuple[str, bool]]) -> float:
+        '''
+        Scores the answers of some agents for the answer at a given position
+        of the game, returning the F1 score of the last one. Every answer is
+        a tuple with its text and a boolean indicating if it is correct.
+        '''
+        tidx, cidx, qidx = self.dataset.get_question_indexes(question_id)
+        ground_truth = [answer["text"] for answer in self.dataset.get_answers(self.dataset.sorted_titles[tidx], cidx, qidx)]
+
+        # Saves the max scores among the different expected answers
+        for agent, (answer, is_correct) in answers.items():
+            if not isinstance(answer, str):
+                answer = ""
+            f1 = max(compute_f1(answer, expected) for expected in ground_truth)
+            em = max(exact_match(answer, expected) for expected in ground_truth)
+            self.running_scores.add(position, agent, f1, em, is_correct)
+        return f1
+
+    def _score_models(self, wait: bool) -> None:
+        ''' Scores the answers of the models that are available (or every one, waiting for them, if `wait`). '''
+        unscored = []
+        for position, question_id in self._unscored:
+            indexes = self.dataset.get_question_indexes(question_id)
+            if wait or self.model_answers.is_ready(indexes):
+                self._score(position, question_id, self.model_answers.get(indexes))
+            else:
+                unscored.append((position, question_id))
+        self._unscored = unscored
+
+    def finish(self) -> dict:
+        '''
+        Finishes the game and computes its results.
+
+        Returns:
+        -------
+
+        scores_results: dict[str, tuple[float, float]]
+            Results of the scores; every value is a tuple containing
+            the mean and the standard deviation of their respective
+            score in this order. The keys are composed by the name
+            of the metric ("f1", "em" and "hit"), followed by an
+            underline ("_") and the name of the agent ("user",
+            "symbolic" and "neural"). Except "hit": this contains
+            boolean arrays as values, following the order of the
+            answers in "user_textual_answers".
+        '''
+        if self.finished:
+            return self.scores_results
+        if self.num_answered == 0:
+            raise ValueError("no answer was submitted")
+        self.end_time = time.time()
+
+        # Summarizes the running scores, once the answers of the models are scored
+        self._score_models(wait=True)
+        self.scores_results = self.running_scores.summary()
+        return self.scores_results
+
+    def get_answered_questions(self) -> list[tuple[int, str]]:
+        ''' Returns the global ids and the texts of the answered questions, in answering order. '''
+        if self._answered_questions is not None:
+            return self._answered_questions
+        questions = []
+        for question_id in self.user_textual_answers:
+            tidx, cidx, qidx = self.dataset.get_question_indexes(question_id)
+            questions.append((question_id, self.dataset.get_question(self.dataset.sorted_titles[tidx], cidx, qidx)))
+
+        # The answers of a finished game do not change anymore
+        if self.finished:
+            self._answered_questions = questions
+        return questions
+
+    def compare_answers(self, question_id: int) -> dict[str, str | list[str]]:
+        '''
+        Returns the answers of every agent for an answered question. The
+        keys are "expected" (list of possible answers), "user", "symbolic"
+        and "neural".
+        '''
+        indexes = self.dataset.get_question_indexes(question_id)
+        title = self.dataset.sorted_titles[indexes[0]]
+        model_answers = self.model_answers.get(indexes)
+        symbolic_answer, _ = model_answers["symbolic"]
+        neural_answer, _ = model_answers["neural"]
+        return {
+            "expected": [answer["text"] for answer in self.dataset.get_answers(title, *indexes[1:])],
+            "user": get_answer_text(self.dataset.get_context(title, indexes[1]), self.get_user_offsets(question_id)),
+            "symbolic": symbolic_answer if isinstance(symbolic_answer, str) else "",
+            "neural": neural_answer if isinstance(neural_answer, str) else "",
+        }
+
+    def to_bytes(self) -> bytes:
+        '''
+        Serializes the state of the player into a compact (compressed JSON)
+        form, without the shared resources (dataset, answers of the models
+        and statistics), which are given back to `from_bytes`.
+        '''
+        state = {
+            "version": STATE_VERSION,
+            "game_id": self.game_id,
+            "corpus_name": self.corpus_name,
+            "corpus_digest": self.corpus_digest,
+            "user_name": self.user_name,
+            "ordering": self.ordering,
+            "seed": self.seed,
+            "indexes": list(self.indexes),
+            "initial_time": self.initial_time,
+            "end_time": self.end_time,
+            "answers": self.user_textual_answers.to_state(),
+            "running_scores": self.running_scores.to_state(),
+            "unscored": self._unscored,
+            "scores": None if self.scores_results is None else {
+                key: value.tolist() if key.startswith("hit") else list(value)
+                for key, value in self.scores_results.items()
+            },
+        }
+
+        # The order of the players' hit rate changes over time, so it is kept
+        if self.ordering == "hit_rate":
+            state["order"] = base64.b64encode(self.scheduler.order.astype(np.int32).tobytes()).decode("ascii")
+        return zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+
+    @staticmethod
+    def read_corpus(data: bytes) -> tuple[str | None, str | None]:
+        ''' Returns the name and the digest of the version of the corpus of a game serialized by `to_bytes`. '''
+        state = json.loads(zlib.decompress(data).decode("utf-8"))
+        return state["corpus_name"], state.get("corpus_digest")
+
+    @classmethod
+    def from_bytes(
+        cls,
+        data: bytes,
+        dataset: FaquadDataset,
+        model_answers: ModelAnswers,
+        question_stats: QuestionStats | None = None
+    ) -> "GameSession":
+        '''
+        Rebuilds a game serialized by `to_bytes` over the shared resources
+        of its corpus. Raises ValueError for games of another version of
+        the format.
+        '''
+        state = json.loads(zlib.decompress(data).decode("utf-8"))
+        if state.get("version") != STATE_VERSION:
+            raise ValueError("unsupported version {} of a saved game".format(state.get("version")))
+        game = cls(
+            dataset, model_answers,
+            user_name=state["user_name"],
+            ordering=state["ordering"] if "order" not in state else "sequential",
+            seed=state["seed"],
+            corpus_name=state["corpus_name"],
+            question_stats=question_stats,
+            corpus_digest=state["corpus_digest"])
+        game.ordering = state["ordering"]
+        if "order" in state:
+            game.scheduler = QuestionScheduler(np.frombuffer(base64.b64decode(state["order"]), dtype=np.int32))
+
+        # Answers of the player and running scores
+        game.game_id = state["game_id"]
+        game.user_textual_answers = AnswerRecords.from_state(state["answers"])
+        for question_id in game.user_textual_answers:
+            game.scheduler.mark_answered(question_id)
+        game.running_scores = RunningScores.from_state(state["running_scores"])
+        game._unscored = [tuple(entry) for entry in state["unscored"]]
+
+        # Time, results and selected question
+        game.initial_time = state["initial_time"]
+        game.end_time = state["end_time"]
+        if state["scores"] is not None:
+            game.scores_results = {
+                key: np.array(value, dtype=bool) if key.startswith("hit") else tuple(value)
+                for key, value in state["scores"].items()
+            }
+        game.select_question(*state["indexes"])
+        return game
+
+    def to_dict(self) -> dict:
+        ''' Returns a JSON-serializable summary of the state of the game. '''
+        state = {
+            "game_id": self.game_id,
+            "corpus_name": self.corpus_name,
+            "user_name": self.user_name,
+            "topic_idx": self.topic_idx,
+            "paragraph_idx": self.paragraph_idx,
+            "question_idx": self.question_idx,
+            "question_id": self.question_id,
+            "topic": self.topic,
+            "context": self.context,
+            "question": self.question,
+            "answered": self.answered,
+            "correct": self.correct if self.answered else None,
+            "num_answered": self.num_answered,
+            "num_correct": self.num_correct,
+            "finished": self.finished,
+            "ordering": self.ordering,
+            "num_remaining": self.scheduler.num_remaining,
+        }
+        if self.question_stats is not None:
+            state["question_stats"] = self.question_stats.get(self.indexes)
+        if self.finished:
+            state["scores"] = {
+                key: value.tolist() if key.startswith("hit") else list(value)
+                for key, value in self.scores_results.items()
+            }
+        return state
@@ -0,0 +1,340 @@
+# General dependencies
+import re
+import json
+import os
+import uuid
+import asyncio
+import argparse
+import threading
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+
+# Local dependencies
+from source.engine.game_session import GameSession
+from source.engine.session_store import SessionStore, build_session_store, SESSION_STORE_URL
+from source.utils.corpus_registry import Corpus, CorpusRegistry
+from source.utils.question_stats import QuestionStats, get_question_stats_path
+from source.utils.corpora import build_corpus_registry, DEFAULT_CORPUS, SYMBOLIC_MODE, CORPORA_RELOAD_SECONDS
+from source.models.model_answers import SYMBOLIC_MODES
+from source.models.inference_service import get_neural_service_metrics
+from source.utils.warmup import WarmUp, build_warmup_steps, WARMUP_ENABLED, WARMUP_CORPORA
+
+# Threads running the handlers, so a slow request (a corpus load, the session
+# store or a game waiting for the models) never stalls the other connections
+API_WORKERS = int(os.environ.get("QA_GAME_API_WORKERS", "16"))
+
+# Maximum size (in bytes) of the body of a request
+MAX_BODY = int(os.environ.get("QA_GAME_API_MAX_BODY_BYTES", str(2**20)))
+
+# Routes of the API: (method, path pattern, name of the handler)
+_ROUTES = [
+    ("GET", re.compile(r"^/health$"), "_health"),
+    ("GET", re.compile(r"^/corpora$"), "_list_corpora"),
+    ("POST", re.compile(r"^/sessions$"), "_create_session"),
+    ("GET", re.compile(r"^/sessions/(?P<session_id>[\w-]+)$"), "_get_session"),
+    ("DELETE", re.compile(r"^/sessions/(?P<session_id>[\w-]+)$"), "_delete_session"),
+    ("POST", re.compile(r"^/sessions/(?P<session_id>[\w-]+)/select$"), "_select_question"),
+    ("POST", re.compile(r"^/sessions/(?P<session_id>[\w-]+)/next$"), "_next_question"),
+    ("POST", re.compile(r"^/sessions/(?P<session_id>[\w-]+)/previous$"), "_previous_question"),
+    ("POST", re.compile(r"^/sessions/(?P<session_id>[\w-]+)/submit$"), "_submit_answer"),
+    ("POST", re.compile(r"^/sessions/(?P<session_id>[\w-]+)/finish$"), "_finish_game"),
+]
+
+
+class HTTPError(Exception):
+    ''' Error to be answered to the client with the given status. '''
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class GameServer:
+    '''
+    Asynchronous HTTP/1.1 JSON API over `GameSession` objects.
+
+    Endpoints:
+    ---------
+
+    GET /health
+    GET /corpora
+    POST /sessions                          {"user_name": str, "corpus": str, "ordering": str, "seed": int}
+    GET /sessions/<id>
+    DELETE /sessions/<id>
+    POST /sessions/<id>/select              {"topic_idx": int, "paragraph_idx": int, "question_idx": int}
+    POST /sessions/<id>/next
+    POST /sessions/<id>/previous
+    POST /sessions/<id>/submit              {"selections": [{"start": int, "end": int}, ...]}
+    POST /sessions/<id>/finish
+
+    Parameters:
+    ----------
+
+    registry: CorpusRegistry
+        The corpora available to the sessions, each one
+        loaded once and shared by the sessions playing it.
+
+    default_corpus: str
+        The corpus of the sessions not choosing one.
+
+    session_store: SessionStore | None
+        The store shared with other servers, where every session is saved
+        after each change and from which unknown sessions are resumed.
+
+    warmup: WarmUp | None
+        The warm-up of the server; until it is done, the health check
+        answers 503, so load balancers only route traffic to warm servers.
+
+    num_workers: int
+        The threads running the handlers; the requests of a session
+        run one at a time.
+    '''
+    def __init__(
+        self,
+        registry: CorpusRegistry,
+        default_corpus: str = DEFAULT_CORPUS,
+        session_store: SessionStore | None = None,
+        warmup: WarmUp | None = None,
+        num_workers: int = API_WORKERS
+    ) -> None:
+        self.registry = registry
+        self.default_corpus = default_corpus
+        self.session_store = session_store
+        self.warmup = warmup
+        self.sessions: dict[str, GameSession] = {}
+
+        # Handlers run in threads, holding the lock of their session
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="http_api")
+        self._session_locks: dict[str, threading.Lock] = {}
+        self._stats_lock = threading.Lock()
+
+        # Statistics of the questions of the latest version of every corpus, along with the version
+        self.question_stats: dict[str, tuple[int, QuestionStats]] = {}
+
+        # Last known serialized state of every session, to detect changes made by other servers
+        self._saved: dict[str, bytes] = {}
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        ''' Serves the API until cancelled. '''
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        ''' Handles every request of a (keep-alive) connection. '''
+        try:
+            while True:
+
+                # Request line
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "malformed request line"}, False)
+                    break
+
+                # Headers
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                # Body (the connection is closed after an invalid length, as the body cannot be skipped)
+                try:
+                    length = int(headers.get("content-length", "0"))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._write_response(writer, HTTPStatus.BAD_REQUEST, {"error": "invalid Content-Length"}, False)
+                    break
+                if length > MAX_BODY:
+                    await self._write_response(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "body larger than {} bytes".format(MAX_BODY)}, False)
+                    break
+                body = await reader.readexactly(length)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+
+                # Dispatch, outside of the event loop
+                status, payload = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.dispatch, method, target.split("?")[0], body)
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    def dispatch(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, dict]:
+        ''' Routes a request to its handler, returning the status and the JSON payload of the response. '''
+        try:
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "expected a JSON object")
+            for route_method, pattern, handler in _ROUTES:
+                match = pattern.match(path)
+                if match and route_method == method:
+                    session_id = match.groupdict().get("session_id")
+                    if session_id is None:
+                        return getattr(self, handler)(payload)
+                    try:
+                        with self._session_locks.setdefault(session_id, threading.Lock()):
+                            return getattr(self, handler)(payload, session_id)
+                    finally:
+                        if session_id not in self.sessions:
+                            self._session_locks.pop(session_id, None)
+            raise HTTPError(HTTPStatus.NOT_FOUND, "unknown route {} {}".format(method, path))
+        except HTTPError as e:
+            return e.status, {"error": str(e)}
+        except json.JSONDecodeError:
+            return HTTPStatus.BAD_REQUEST, {"error": "invalid JSON body"}
+        except (ValueError, KeyError, TypeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+
+    async def _write_response(self, writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict, keep_alive: bool) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = "HTTP/1.1 {} {}\r\nContent-Type: application/json; charset=utf-8\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n".format(
+            status.value, status.phrase, len(body), "keep-alive" if keep_alive else "close")
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def _get_question_stats(self, corpus: Corpus) -> QuestionStats:
+        with self._stats_lock:
+            version, question_stats = self.question_stats.get(corpus.name, (0, None))
+            if question_stats is None or question_stats.dataset is not corpus.dataset:
+                question_stats = QuestionStats(corpus.dataset, get_question_stats_path(corpus.name, corpus.digest), digest=corpus.digest)
+                self.registry.when_released(corpus, question_stats.close)
+                if corpus.version >= version:
+                    self.question_stats[corpus.name] = (corpus.version, question_stats)
+            return question_stats
+
+    def _get(self, session_id: str) -> GameSession:
+        # Resumes the sessions saved (or changed) by other servers, or before a restart,
+        # over the version of the corpus they started on
+        if self.session_store is not None:
+            data = self.session_store.get(session_id)
+            if data is None:
+                self.sessions.pop(session_id, None)
+            elif data != self._saved.get(session_id):
+                corpus_name, corpus_digest = GameSession.read_corpus(data)
+                if corpus_name in self.registry.names:
+                    corpus = self.registry.get_version(corpus_name, corpus_digest)
+                    if corpus is None:
+                        self.sessions.pop(session_id, None)
+                        raise HTTPError(HTTPStatus.GONE, "the corpus of session {} has changed".format(session_id))
+                    self.sessions[session_id] = GameSession.from_bytes(
+                        data, corpus.dataset, corpus.model_answers, self._get_question_stats(corpus))
+                    self._saved[session_id] = data
+        if session_id not in self.sessions:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "unknown session {}".format(session_id))
+        return self.sessions[session_id]
+
+    def _save(self, session_id: str) -> None:
+        if self.session_store is not None:
+            self._saved[session_id] = self.sessions[session_id].to_bytes()
+            self.session_store.put(session_id, self._saved[session_id])
+
+    def _health(self, payload: dict) -> tuple[HTTPStatus, dict]:
+        ready = self.warmup is None or self.warmup.ready
+        return HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE, {
+            "status": "ok" if ready else "warming",
+            "sessions": len(self.sessions),
+            "corpora_loaded": self.registry.loaded_names,
+            "corpora_versions": self.registry.versions,
+            "corpora_reload_errors": dict(self.registry.reload_errors),
+            "inference": get_neural_service_metrics(),
+            "warmup": None if self.warmup is None else self.warmup.status,
+        }
+
+    def _list_corpora(self, payload: dict) -> tuple[HTTPStatus, dict]:
+        return HTTPStatus.OK, {"corpora": [{"name": name, "label": self.registry.get_label(name)} for name in self.registry.names]}
+
+    def _create_session(self, payload: dict) -> tuple[HTTPStatus, dict]:
+        corpus_name = str(payload.get("corpus", self.default_corpus))
+        if corpus_name not in self.registry.names:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "unknown corpus {}".format(corpus_name))
+        corpus = self.registry.get(corpus_name)
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = GameSession(
+            corpus.dataset, corpus.model_answers,
+            user_name=str(payload.get("user_name", "Convidado"))[:32],
+            ordering=str(payload.get("ordering", "sequential")),
+            seed=int(payload["seed"]) if payload.get("seed") is not None else None,
+            corpus_name=corpus_name,
+            question_stats=self._get_question_stats(corpus),
+            corpus_digest=corpus.digest)
+        self._save(session_id)
+        return HTTPStatus.CREATED, {"session_id": session_id, "corpus": corpus_name, **self.sessions[session_id].to_dict()}
+
+    def _get_session(self, payload: dict, session_id: str) -> tuple[HTTPStatus, dict]:
+        return HTTPStatus.OK, self._get(session_id).to_dict()
+
+    def _delete_session(self, payload: dict, session_id: str) -> tuple[HTTPStatus, dict]:
+        self._get(session_id)
+        del self.sessions[session_id]
+        if self.session_store is not None:
+            self.session_store.delete(session_id)
+            self._saved.pop(session_id, None)
+        return HTTPStatus.OK, {"session_id": session_id}
+
+    def _select_question(self, payload: dict, session_id: str) -> tuple[HTTPStatus, dict]:
+        session = self._get(session_id)
+        session.select_question(int(payload["topic_idx"]), int(payload["paragraph_idx"]), int(payload["question_idx"]))
+        self._save(session_id)
+        return HTTPStatus.OK, session.to_dict()
+
+    def _next_question(self, payload: dict, session_id: str) -> tuple[HTTPStatus, dict]:
+        session = self._get(session_id)
+        session.next_question()
+        self._save(session_id)
+        return HTTPStatus.OK, session.to_dict()
+
+    def _previous_question(self, payload: dict, session_id: str) -> tuple[HTTPStatus, dict]:
+        session = self._get(session_id)
+        session.previous_question()
+        self._save(session_id)
+        return HTTPStatus.OK, session.to_dict()
+
+    def _submit_answer(self, payload: dict, session_id: str) -> tuple[HTTPStatus, dict]:
+        session = self._get(session_id)
+        selections = [
+            {"start": int(selection["start"]), "end": int(selection["end"])}
+            for selection in payload.get("selections", [])
+        ]
+        if any(not 0 <= sel["start"] <= sel["end"] <= len(session.context) for sel in selections):
+            raise ValueError("selection out of the bounds of the context")
+        session.submit(selections)
+        self._save(session_id)
+        return HTTPStatus.OK, session.to_dict()
+
+    def _finish_game(self, payload: dict, session_id: str) -> tuple[HTTPStatus, dict]:
+        session = self._get(session_id)
+        session.finish()
+        self._save(session_id)
+        return HTTPStatus.OK, session.to_dict()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="HTTP API for the QA Game.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--default-corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--live-inference", action="store_true", help="answer the questions missing from the outputs on demand")
+    parser.add_argument("--write-back", action="store_true", help="append the live answers to the outputs file")
+    parser.add_argument("--symbolic-mode", choices=SYMBOLIC_MODES, default=SYMBOLIC_MODE, help="mode of the symbolic model for the live answers")
+    parser.add_argument("--session-store", default=SESSION_STORE_URL, help="sqlite:<path>, file:<directory> or none")
+    args = parser.parse_args()
+
+    registry = build_corpus_registry(live_inference=args.live_inference, write_back=args.write_back, symbolic_mode=args.symbolic_mode)
+    registry.watch(CORPORA_RELOAD_SECONDS)
+    warmup = WarmUp(build_warmup_steps(registry, [args.default_corpus] + WARMUP_CORPORA, leaderboard=False)).start() if WARMUP_ENABLED else None
+    server = GameServer(registry, args.default_corpus, build_session_store(args.session_store), warmup)
+    print("Serving the QA Game API on http://{}:{}".format(args.host, args.port))
+    asyncio.run(server.serve(args.host, args.port))
+
+
+if __name__ == "__main__":
+    main()
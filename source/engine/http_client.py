@@ -0,0 +1,63 @@
+# General dependencies
+import json
+import asyncio
+
+class GameClient:
+    '''
+    Minimal asynchronous client for the HTTP API of the QA Game,
+    keeping a single keep-alive connection.
+
+    Parameters:
+    ----------
+
+    host: str
+        The host of the API.
+
+    port: int
+        The port of the API.
+    '''
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765) -> None:
+        self.host = host
+        self.port = port
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    async def __aenter__(self) -> "GameClient":
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        ''' Closes the connection. '''
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader, self._writer = None, None
+
+    async def request(self, method: str, path: str, payload: dict | None = None) -> tuple[int, dict]:
+        ''' Sends a request, returning the status code and the decoded JSON response. '''
+        if self._writer is None:
+            await self.__aenter__()
+
+        # Request
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        head = "{} {} HTTP/1.1\r\nHost: {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n".format(
+            method, path, self.host, len(body))
+        self._writer.write(head.encode("latin-1") + body)
+        await self._writer.drain()
+
+        # Response
+        status = int((await self._reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        response = await self._reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, json.loads(response) if response else {}
@@ -0,0 +1,235 @@
+# General dependencies
+import os
+import time
+import weakref
+import threading
+import numpy as np
+
+# Local dependencies
+from source.utils.faquad import FaquadDataset
+from source.models.model_answers import AGENTS, ModelAnswers
+from source.utils.question_stats import QuestionStats
+
+# Orderings of the questions
+ORDERINGS = ("sequential", "shuffled", "difficulty", "hit_rate")
+
+# Interval (in seconds) during which the games starting with the hit rate ordering share its order
+HIT_RATE_ORDER_SECONDS = float(os.environ.get("QA_GAME_HIT_RATE_ORDER_SECONDS", "60"))
+
+
+class FenwickTree:
+    '''
+    Binary indexed tree over an array of counts, supporting point updates,
+    prefix sums and the search of the k-th unit in O(log n).
+
+    Parameters:
+    ----------
+
+    values: np.ndarray
+        The initial counts.
+    '''
+    def __init__(self, values: np.ndarray) -> None:
+        self.size = len(values)
+
+        # Vectorized linear construction: every node holds the sum of the
+        # counts in (idx - lowbit(idx), idx], a difference of prefix sums
+        prefix = np.zeros(self.size + 1, dtype=np.int64)
+        np.cumsum(values, out=prefix[1:])
+        indexes = np.arange(1, self.size + 1)
+        self._tree = np.zeros(self.size + 1, dtype=np.int32)
+        self._tree[1:] = prefix[indexes] - prefix[indexes - (indexes & -indexes)]
+
+        # Highest power of two not above the size, for the searches
+        self._top = 1 << (self.size.bit_length() - 1) if self.size > 0 else 0
+
+    def add(self, position: int, delta: int) -> None:
+        ''' Adds a delta to the count of a (0-based) position. '''
+        idx = position + 1
+        while idx <= self.size:
+            self._tree[idx] += delta
+            idx += idx & -idx
+
+    def prefix_sum(self, position: int) -> int:
+        ''' Returns the sum of the counts of the positions up to a (0-based) position, inclusive. '''
+        total = 0
+        idx = position + 1
+        while idx > 0:
+            total += int(self._tree[idx])
+            idx -= idx & -idx
+        return total
+
+    def find(self, k: int) -> int:
+        ''' Returns the first (0-based) position whose prefix sum reaches k (k >= 1). '''
+        position = 0
+        step = self._top
+        while step > 0:
+            if position + step <= self.size and self._tree[position + step] < k:
+                position += step
+                k -= int(self._tree[position])
+            step >>= 1
+        return position
+
+
+class QuestionOrder:
+    '''
+    Order of the questions of a game and the rank of every question in
+    it, read-only so the games of a corpus version playing the same
+    ordering share them (see `get_question_order`).
+
+    Parameters:
+    ----------
+
+    order: np.ndarray[int]
+        The global ids of the questions, in the order they are played.
+    '''
+    def __init__(self, order: np.ndarray) -> None:
+        self.order = np.array(order, dtype=np.int32)
+        self.ranks = np.empty_like(self.order)
+        self.ranks[self.order] = np.arange(len(self.order), dtype=np.int32)
+        self.order.flags.writeable = False
+        self.ranks.flags.writeable = False
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+
+class QuestionScheduler:
+    '''
+    Keeps the questions not answered yet in a given order, finding the
+    next or the previous one from any question in O(log n). Only the
+    answered questions (a bitmap) and the counts of the remaining ones
+    (a Fenwick tree) belong to the game; the order may be shared.
+
+    Parameters:
+    ----------
+
+    order: QuestionOrder | np.ndarray[int]
+        The order of the questions, or their global ids in the order
+        they are played.
+    '''
+    def __init__(self, order: QuestionOrder | np.ndarray) -> None:
+        self.question_order = order if isinstance(order, QuestionOrder) else QuestionOrder(order)
+        self._remaining = FenwickTree(np.ones(len(self.question_order), dtype=np.int32))
+        self._answered = bytearray((len(self.question_order) + 7) // 8)
+        self.num_remaining = len(self.question_order)
+
+    @property
+    def order(self) -> np.ndarray:
+        ''' The global ids of the questions, in the order they are played. '''
+        return self.question_order.order
+
+    def mark_answered(self, question_id: int) -> None:
+        ''' Removes a question from the remaining ones. '''
+        byte, bit = question_id >> 3, 1 << (question_id & 7)
+        if not self._answered[byte] & bit:
+            self._answered[byte] |= bit
+            self._remaining.add(int(self.question_order.ranks[question_id]), -1)
+            self.num_remaining -= 1
+
+    def first(self) -> int | None:
+        ''' Returns the first remaining question, if any. '''
+        if self.num_remaining == 0:
+            return None
+        return int(self.question_order.order[self._remaining.find(1)])
+
+    def next(self, question_id: int) -> int | None:
+        ''' Returns the remaining question following a given one (wrapping around), if any. '''
+        if self.num_remaining == 0:
+            return None
+        count = self._remaining.prefix_sum(int(self.question_order.ranks[question_id]))
+        k = count + 1 if count < self.num_remaining else 1
+        return int(self.question_order.order[self._remaining.find(k)])
+
+    def previous(self, question_id: int) -> int | None:
+        ''' Returns the remaining question preceding a given one (wrapping around), if any. '''
+        if self.num_remaining == 0:
+            return None
+        count = self._remaining.prefix_sum(int(self.question_order.ranks[question_id]) - 1)
+        k = count if count > 0 else self.num_remaining
+        return int(self.question_order.order[self._remaining.find(k)])
+
+
+def build_question_order(
+    dataset: FaquadDataset,
+    ordering: str = "sequential",
+    seed: int | None = None,
+    model_answers: ModelAnswers | None = None,
+    question_stats: QuestionStats | None = None
+) -> np.ndarray:
+    '''
+    Returns the global ids of the questions of a dataset in a given order.
+
+    Parameters:
+    ----------
+
+    dataset: FaquadDataset
+        The dataset of the questions.
+
+    ordering: str
+        One of `ORDERINGS`: "sequential" follows the dataset, "shuffled"
+        is a random permutation, "difficulty" plays first the questions
+        correctly answered by more models and "hit_rate" the questions
+        correctly answered by more players.
+
+    seed: int | None
+        The seed of the shuffled ordering.
+
+    model_answers: ModelAnswers | None
+        The answers of the models, required by the difficulty ordering.
+
+    question_stats: QuestionStats | None
+        The statistics of the players, required by the hit rate ordering.
+    '''
+    if ordering not in ORDERINGS:
+        raise ValueError("expected ordering to be one of {}, got {}".format(ORDERINGS, ordering))
+    if ordering == "sequential":
+        return np.arange(dataset.num_questions)
+    if ordering == "shuffled":
+        return np.random.default_rng(seed).permutation(dataset.num_questions)
+    if ordering == "hit_rate":
+        if question_stats is None:
+            raise ValueError("the hit rate ordering requires the statistics of the questions")
+        return np.argsort(-question_stats.get_hit_rates(), kind="stable")
+    if model_answers is None:
+        raise ValueError("the difficulty ordering requires the answers of the models")
+
+    # Number of models answering correctly every question; unknown answers count as wrong
+    num_correct = np.zeros(dataset.num_questions, dtype=np.int64)
+    for agent in AGENTS:
+        for indexes, (_, correct) in model_answers.precomputed[agent].items():
+            try:
+                num_correct[dataset.get_question_id(*indexes)] += bool(correct)
+            except KeyError:
+                continue
+    return np.argsort(-num_correct, kind="stable")
+
+
+# Orders shared by the games of every corpus version (its dataset), by ordering,
+# along with the time they were built; freed along with the version
+_SHARED_ORDERS: "weakref.WeakKeyDictionary[FaquadDataset, dict[str, tuple[float, QuestionOrder]]]" = weakref.WeakKeyDictionary()
+_SHARED_ORDERS_LOCK = threading.Lock()
+
+
+def get_question_order(
+    dataset: FaquadDataset,
+    ordering: str = "sequential",
+    seed: int | None = None,
+    model_answers: ModelAnswers | None = None,
+    question_stats: QuestionStats | None = None
+) -> QuestionOrder:
+    '''
+    Returns the order of the questions of a dataset (see
+    `build_question_order`), shared by the games of the same dataset and
+    ordering: once per dataset for the sequential and the difficulty
+    orderings, for `HIT_RATE_ORDER_SECONDS` for the hit rate one (as the
+    hit rates change). Shuffled orders belong to their game.
+    '''
+    if ordering == "shuffled":
+        return QuestionOrder(build_question_order(dataset, ordering, seed, model_answers, question_stats))
+    with _SHARED_ORDERS_LOCK:
+        orders = _SHARED_ORDERS.setdefault(dataset, {})
+        built, question_order = orders.get(ordering, (None, None))
+        if question_order is None or (ordering == "hit_rate" and time.monotonic() - built > HIT_RATE_ORDER_SECONDS):
+            question_order = QuestionOrder(build_question_order(dataset, ordering, seed, model_answers, question_stats))
+            orders[ordering] = (time.monotonic(), question_order)
+        return question_order
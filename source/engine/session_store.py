@@ -0,0 +1,158 @@
+# General dependencies
+import os
+import abc
+import time
+import sqlite3
+import threading
+
+# Location of the store of the games, shared by every process of the server:
+# "sqlite:<path>", "file:<directory>" or "none" (games live only in their process)
+SESSION_STORE_URL = os.environ.get("QA_GAME_SESSION_STORE", "sqlite:./data/sessions.sqlite3")
+
+# Games not updated for longer than this (in days) are removed from the store
+SESSION_MAX_AGE_DAYS = float(os.environ.get("QA_GAME_SESSION_MAX_AGE_DAYS", "7"))
+
+
+class SessionStore(abc.ABC):
+    '''
+    Store of serialized games (see `GameSession.to_bytes`) by the id of
+    their session, shared by the processes of the server so any of them
+    can resume a game, even after a restart.
+    '''
+    @abc.abstractmethod
+    def get(self, session_id: str) -> bytes | None:
+        ''' Returns the serialized game of a session, if stored. '''
+
+    @abc.abstractmethod
+    def put(self, session_id: str, data: bytes) -> None:
+        ''' Stores (or replaces) the serialized game of a session. '''
+
+    @abc.abstractmethod
+    def delete(self, session_id: str) -> None:
+        ''' Removes the game of a session, if stored. '''
+
+    @abc.abstractmethod
+    def prune(self, max_age: float) -> int:
+        ''' Removes the games not updated for `max_age` seconds, returning how many. '''
+
+
+class SQLiteSessionStore(SessionStore):
+    '''
+    Session store over a SQLite database in WAL mode, so the readers of
+    every process are never blocked by the writer. Every thread has its
+    own connection.
+
+    Parameters:
+    ----------
+
+    path: str
+        The path of the database.
+    '''
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, updated REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated)")
+
+    def _connect(self) -> sqlite3.Connection:
+        if getattr(self._local, "connection", None) is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return self._local.connection
+
+    def get(self, session_id: str) -> bytes | None:
+        row = self._connect().execute("SELECT data FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return None if row is None else bytes(row[0])
+
+    def put(self, session_id: str, data: bytes) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO sessions (id, data, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET data = excluded.data, updated = excluded.updated",
+                (session_id, data, time.time()))
+
+    def delete(self, session_id: str) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def prune(self, max_age: float) -> int:
+        with self._connect() as connection:
+            return connection.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - max_age,)).rowcount
+
+
+class FileSessionStore(SessionStore):
+    '''
+    Session store with a file per session in a (possibly network shared)
+    directory. Files are written aside and renamed, so readers never see
+    a partial game.
+
+    Parameters:
+    ----------
+
+    directory: str
+        The directory of the files of the sessions.
+    '''
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_path(self, session_id: str) -> str:
+        if not session_id.isalnum():
+            raise ValueError("invalid session id {}".format(session_id))
+        return os.path.join(self.directory, session_id + ".game")
+
+    def get(self, session_id: str) -> bytes | None:
+        try:
+            with open(self._get_path(session_id), "rb") as fp:
+                return fp.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, session_id: str, data: bytes) -> None:
+        path = self._get_path(session_id)
+        temporary_path = "{}.{}-{}.tmp".format(path, os.getpid(), threading.get_ident())
+        with open(temporary_path, "wb") as fp:
+            fp.write(data)
+        os.replace(temporary_path, path)
+
+    def delete(self, session_id: str) -> None:
+        try:
+            os.remove(self._get_path(session_id))
+        except FileNotFoundError:
+            pass
+
+    def prune(self, max_age: float) -> int:
+        removed = 0
+        limit = time.time() - max_age
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+
+def build_session_store(url: str = SESSION_STORE_URL, max_age_days: float | None = SESSION_MAX_AGE_DAYS) -> SessionStore | None:
+    '''
+    Builds the session store of a URL ("sqlite:<path>", "file:<directory>"
+    or "none"), removing its games older than `max_age_days`.
+    '''
+    kind, _, location = url.partition(":")
+    if kind == "none" or url == "":
+        return None
+    if kind == "sqlite":
+        store = SQLiteSessionStore(location)
+    elif kind == "file":
+        store = FileSessionStore(location)
+    else:
+        raise ValueError("expected a session store as sqlite:<path>, file:<directory> or none, got {}".format(url))
+    if max_age_days is not None:
+        store.prune(max_age_days * 86400)
+    return store
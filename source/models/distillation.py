@@ -0,0 +1,272 @@
+# General dependencies
+import os
+import json
+import time
+import random
+import argparse
+import numpy as np
+import torch
+import torch.nn.functional as F
+from tqdm import tqdm
+from transformers import BertConfig, BertForQuestionAnswering, BertTokenizerFast, get_linear_schedule_with_warmup
+
+# Local dependencies
+from source.utils.faquad import FaquadDataset
+from source.models.metrics import compute_f1, exact_match
+from source.utils.paths import FAQUAD_TRAIN_PATH, FAQUAD_TEST_PATH
+
+# Paths of the teacher and of the student
+TEACHER_PATH = "./models/Bert-FaQuAD"
+STUDENT_PATH = "./models/Bert-FaQuAD-student"
+
+
+def read_examples(dataset: FaquadDataset) -> list[dict]:
+    ''' Returns the context, the question and the answers of every question of a dataset. '''
+    examples = []
+    sorted_titles = dataset.sorted_titles
+    for question_id in range(dataset.num_questions):
+        title_idx, paragraph, question = dataset.get_question_indexes(question_id)
+        title = sorted_titles[title_idx]
+        examples.append({
+            "context": dataset.get_context(title, paragraph),
+            "question": dataset.get_question(title, paragraph, question),
+            "answers": dataset.get_answers(title, paragraph, question),
+        })
+    return examples
+
+
+def build_features(examples: list[dict], tokenizer: BertTokenizerFast, max_length: int = 384, stride: int = 128) -> dict[str, torch.Tensor]:
+    '''
+    Tokenizes the (question, context) pairs into windows of at most
+    `max_length` tokens, labelling the tokens of the start and the end
+    of the first answer; windows without the answer point to [CLS].
+    '''
+    encodings = tokenizer(
+        [example["question"] for example in examples],
+        [example["context"] for example in examples],
+        truncation="only_second",
+        max_length=max_length,
+        stride=stride,
+        return_overflowing_tokens=True,
+        return_offsets_mapping=True,
+        padding="max_length")
+
+    # Positions of the answers in every window
+    start_positions, end_positions = [], []
+    for window, offsets in enumerate(encodings["offset_mapping"]):
+        answer = examples[encodings["overflow_to_sample_mapping"][window]]["answers"][0]
+        answer_start = answer["answer_start"]
+        answer_end = answer_start + len(answer["text"])
+        sequence_ids = encodings.sequence_ids(window)
+        context_tokens = [idx for idx, sequence in enumerate(sequence_ids) if sequence == 1]
+
+        # The answer must be entirely inside of the window
+        if len(context_tokens) == 0 or offsets[context_tokens[0]][0] > answer_start or offsets[context_tokens[-1]][1] < answer_end:
+            start_positions.append(0)
+            end_positions.append(0)
+            continue
+        start_positions.append(next(idx for idx in context_tokens if offsets[idx][1] > answer_start))
+        end_positions.append(next(idx for idx in reversed(context_tokens) if offsets[idx][0] < answer_end))
+
+    return {
+        "input_ids": torch.tensor(encodings["input_ids"]),
+        "token_type_ids": torch.tensor(encodings["token_type_ids"]),
+        "attention_mask": torch.tensor(encodings["attention_mask"]),
+        "start_positions": torch.tensor(start_positions),
+        "end_positions": torch.tensor(end_positions),
+    }
+
+
+def build_student(teacher: BertForQuestionAnswering, num_layers: int) -> BertForQuestionAnswering:
+    '''
+    Builds a student with the configuration of the teacher but fewer
+    encoder layers, initialized from evenly spaced layers of the teacher.
+    '''
+    config = BertConfig.from_dict({**teacher.config.to_dict(), "num_hidden_layers": num_layers})
+    student = BertForQuestionAnswering(config)
+
+    # Copies the embeddings, the chosen layers and the QA head
+    student.bert.embeddings.load_state_dict(teacher.bert.embeddings.state_dict())
+    teacher_layers = np.linspace(0, teacher.config.num_hidden_layers - 1, num_layers).round().astype(int)
+    for student_layer, teacher_layer in enumerate(teacher_layers):
+        student.bert.encoder.layer[student_layer].load_state_dict(teacher.bert.encoder.layer[teacher_layer].state_dict())
+    student.qa_outputs.load_state_dict(teacher.qa_outputs.state_dict())
+    return student
+
+
+def distillation_loss(
+    student_logits: tuple[torch.Tensor, torch.Tensor],
+    teacher_logits: tuple[torch.Tensor, torch.Tensor],
+    start_positions: torch.Tensor,
+    end_positions: torch.Tensor,
+    temperature: float,
+    alpha: float
+) -> torch.Tensor:
+    '''
+    Mixes the KL divergence between the softened start/end distributions
+    of the student and of the teacher with the cross entropy against the
+    labelled positions.
+    '''
+    soft_loss = sum(
+        F.kl_div(
+            F.log_softmax(student / temperature, dim=-1),
+            F.softmax(teacher / temperature, dim=-1),
+            reduction="batchmean") * temperature ** 2
+        for student, teacher in zip(student_logits, teacher_logits)
+    ) / 2
+    hard_loss = (
+        F.cross_entropy(student_logits[0], start_positions) +
+        F.cross_entropy(student_logits[1], end_positions)
+    ) / 2
+    return alpha * soft_loss + (1 - alpha) * hard_loss
+
+
+def train_student(
+    student: BertForQuestionAnswering,
+    teacher: BertForQuestionAnswering,
+    features: dict[str, torch.Tensor],
+    epochs: int = 2,
+    batch_size: int = 16,
+    learning_rate: float = 5e-5,
+    temperature: float = 2.0,
+    alpha: float = 0.5
+) -> list[float]:
+    ''' Trains the student against the logits of the teacher, returning the mean loss of every epoch. '''
+    num_windows = len(features["input_ids"])
+    num_steps = epochs * ((num_windows + batch_size - 1) // batch_size)
+    optimizer = torch.optim.AdamW(student.parameters(), lr=learning_rate)
+    scheduler = get_linear_schedule_with_warmup(optimizer, int(0.1 * num_steps), num_steps)
+
+    teacher.eval()
+    losses = []
+    for epoch in range(epochs):
+        student.train()
+        epoch_losses = []
+        permutation = torch.randperm(num_windows)
+        for batch_start in tqdm(range(0, num_windows, batch_size), desc="epoch {}".format(epoch + 1)):
+            batch = {key: value[permutation[batch_start:batch_start + batch_size]] for key, value in features.items()}
+            inputs = {key: batch[key] for key in ("input_ids", "token_type_ids", "attention_mask")}
+
+            # Logits of the teacher, the targets of the student
+            with torch.no_grad():
+                teacher_outputs = teacher(**inputs)
+            student_outputs = student(**inputs)
+
+            loss = distillation_loss(
+                (student_outputs.start_logits, student_outputs.end_logits),
+                (teacher_outputs.start_logits, teacher_outputs.end_logits),
+                batch["start_positions"], batch["end_positions"],
+                temperature, alpha)
+            loss.backward()
+            torch.nn.utils.clip_grad_norm_(student.parameters(), 1.0)
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+            epoch_losses.append(loss.item())
+        losses.append(float(np.mean(epoch_losses)))
+        print("Epoch {}: loss {:.4f}".format(epoch + 1, losses[-1]))
+    return losses
+
+
+def predict(model: BertForQuestionAnswering, tokenizer: BertTokenizerFast, context: str, question: str) -> str:
+    ''' Answers a question as `get_prediction` does, but with any model. '''
+    inputs = tokenizer(question, context, truncation="only_second", max_length=512, return_tensors="pt")
+    with torch.no_grad():
+        outputs = model(**inputs)
+    answer_start = torch.argmax(outputs.start_logits)
+    answer_end = torch.argmax(outputs.end_logits) + 1
+    return tokenizer.convert_tokens_to_string(tokenizer.convert_ids_to_tokens(inputs["input_ids"][0][answer_start:answer_end]))
+
+
+def evaluate(model: BertForQuestionAnswering, tokenizer: BertTokenizerFast, examples: list[dict]) -> dict[str, float]:
+    ''' Returns the EM, the F1 and the mean latency (in ms) of a model over the examples. '''
+    model.eval()
+    em_scores, f1_scores, latencies = [], [], []
+    for example in tqdm(examples, desc="evaluation"):
+        start = time.perf_counter()
+        prediction = predict(model, tokenizer, example["context"], example["question"])
+        latencies.append(time.perf_counter() - start)
+        truths = [answer["text"] for answer in example["answers"]]
+        em_scores.append(max(exact_match(prediction, truth) for truth in truths))
+        f1_scores.append(max(compute_f1(prediction, truth) for truth in truths))
+    return {
+        "exact_match": float(np.mean(em_scores)),
+        "f1": float(np.mean(f1_scores)),
+        "latency_ms": 1000 * float(np.mean(latencies)),
+        "latency_p95_ms": 1000 * float(np.percentile(latencies, 95)),
+    }
+
+
+def get_model_size(model: BertForQuestionAnswering, path: str) -> dict[str, float]:
+    ''' Returns the number of parameters of a model and the size (in MB) of its saved weights. '''
+    files = [os.path.join(path, name) for name in os.listdir(path) if name.endswith((".bin", ".safetensors"))]
+    return {
+        "parameters": sum(parameter.numel() for parameter in model.parameters()),
+        "size_mb": sum(os.path.getsize(file) for file in files) / 2**20,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Distills the neural model of the QA Game into a smaller student, on CPU.")
+    parser.add_argument("--teacher", default=TEACHER_PATH)
+    parser.add_argument("--output", default=STUDENT_PATH)
+    parser.add_argument("--train", default=FAQUAD_TRAIN_PATH)
+    parser.add_argument("--dev", default=FAQUAD_TEST_PATH)
+    parser.add_argument("--layers", type=int, default=4, help="number of encoder layers of the student")
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--learning-rate", type=float, default=5e-5)
+    parser.add_argument("--temperature", type=float, default=2.0)
+    parser.add_argument("--alpha", type=float, default=0.5, help="weight of the distillation loss against the labels")
+    parser.add_argument("--max-length", type=int, default=384)
+    parser.add_argument("--stride", type=int, default=128)
+    parser.add_argument("--threads", type=int, default=None, help="number of CPU threads of torch")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Reproducibility and CPU threads
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    torch.manual_seed(args.seed)
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+
+    # Teacher and student
+    tokenizer = BertTokenizerFast.from_pretrained(args.teacher)
+    teacher = BertForQuestionAnswering.from_pretrained(args.teacher)
+    student = build_student(teacher, args.layers)
+
+    # Training
+    train_examples = read_examples(FaquadDataset(args.train))
+    features = build_features(train_examples, tokenizer, args.max_length, args.stride)
+    print("{} questions of training in {} windows".format(len(train_examples), len(features["input_ids"])))
+    losses = train_student(
+        student, teacher, features,
+        epochs=args.epochs, batch_size=args.batch_size, learning_rate=args.learning_rate,
+        temperature=args.temperature, alpha=args.alpha)
+
+    # Saves the student where `neural_model` can load it (QA_GAME_NEURAL_MODEL)
+    os.makedirs(args.output, exist_ok=True)
+    student.save_pretrained(args.output)
+    tokenizer.save_pretrained(args.output)
+
+    # Report of the student against the teacher
+    dev_examples = read_examples(FaquadDataset(args.dev))
+    report = {
+        "arguments": vars(args),
+        "losses": losses,
+        "teacher": {**evaluate(teacher, tokenizer, dev_examples), **get_model_size(teacher, args.teacher)},
+        "student": {**evaluate(student, tokenizer, dev_examples), **get_model_size(student, args.output)},
+    }
+    with open(os.path.join(args.output, "distillation_report.json"), "w", encoding="utf-8") as fp:
+        json.dump(report, fp, indent=2)
+
+    print("\n{:<10}{:>10}{:>10}{:>14}{:>14}{:>12}".format("", "EM", "F1", "latência (ms)", "parâmetros", "tamanho (MB)"))
+    for name in ("teacher", "student"):
+        row = report[name]
+        print("{:<10}{:>10.3f}{:>10.3f}{:>14.1f}{:>14,}{:>12.1f}".format(
+            name, row["exact_match"], row["f1"], row["latency_ms"], row["parameters"], row["size_mb"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# General dependencies
+import os
+import time
+import queue
+import asyncio
+import threading
+from typing import Any, Callable
+from concurrent.futures import Future
+
+# Configuration of the shared service of the neural model
+INFERENCE_BATCH_SIZE = int(os.environ.get("QA_GAME_INFERENCE_BATCH_SIZE", "16"))
+INFERENCE_WINDOW_MS = float(os.environ.get("QA_GAME_INFERENCE_WINDOW_MS", "10"))
+INFERENCE_QUEUE_SIZE = int(os.environ.get("QA_GAME_INFERENCE_QUEUE_SIZE", "256"))
+
+
+class InferenceQueueFull(Exception):
+    ''' Raised when a request is refused because the queue of the service is full. '''
+
+
+class InferenceService:
+    '''
+    Micro-batching service over a model owned by a single worker thread.
+    Requests from every session are queued; the worker takes the first
+    one, waits up to `window_ms` for more (at most `max_batch_size`) and
+    runs them in a single batch, resolving the future of every request.
+    The requests of a failed batch are run again one at a time, so a bad
+    request only fails its own future.
+
+    Parameters:
+    ----------
+
+    predict_batch: Callable[[list[tuple]], list[Any]]
+        The function answering a batch of requests (the tuples of the
+        arguments given to `submit`), in order.
+
+    max_batch_size: int
+        The maximum number of requests of a batch.
+
+    window_ms: float
+        The maximum time the first request of a batch waits for others.
+
+    max_queue_size: int
+        The maximum number of queued requests; beyond it, `submit`
+        refuses (or waits for) new requests.
+
+    name: str
+        The name of the worker thread.
+    '''
+    def __init__(
+        self,
+        predict_batch: Callable[[list[tuple]], list[Any]],
+        max_batch_size: int = INFERENCE_BATCH_SIZE,
+        window_ms: float = INFERENCE_WINDOW_MS,
+        max_queue_size: int = INFERENCE_QUEUE_SIZE,
+        name: str = "inference"
+    ) -> None:
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "rejected": 0,
+            "failed": 0,
+            "batches": 0,
+            "max_queue_depth": 0,
+            "total_wait_s": 0.0,
+            "total_batch_s": 0.0,
+        }
+        self._batch_sizes: dict[int, int] = {}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, *args, block: bool = False, timeout: float | None = None) -> Future:
+        '''
+        Queues a request, returning the future of its answer. If the queue
+        is full, raises `InferenceQueueFull`, unless `block`, waiting then
+        up to `timeout` seconds for room.
+        '''
+        future: Future = Future()
+        try:
+            self._queue.put((args, future, time.perf_counter()), block=block, timeout=timeout)
+        except queue.Full:
+            with self._metrics_lock:
+                self._metrics["rejected"] += 1
+            raise InferenceQueueFull("the inference queue is full ({} requests)".format(self._queue.maxsize))
+        with self._metrics_lock:
+            self._metrics["requests"] += 1
+            self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self._queue.qsize())
+        return future
+
+    async def predict(self, *args) -> Any:
+        ''' Awaitable answer of a request, for asynchronous servers. '''
+        return await asyncio.wrap_future(self.submit(*args))
+
+    def _take_batch(self) -> list[tuple]:
+        ''' Waits for a request and gathers the ones arriving within the window. '''
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            start = time.perf_counter()
+
+            # Runs the batch; once it fails, its requests are run one at a time,
+            # so only the ones failing on their own fail
+            try:
+                outcomes = [(result, None) for result in self.predict_batch([args for args, _, _ in batch])]
+            except Exception as exception:
+                outcomes = [(None, exception)] if len(batch) == 1 else [self._run_single(args) for args, _, _ in batch]
+            for (_, future, _), (result, error) in zip(batch, outcomes):
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
+
+            # Metrics
+            end = time.perf_counter()
+            with self._metrics_lock:
+                self._metrics["batches"] += 1
+                self._metrics["failed"] += sum(error is not None for _, error in outcomes)
+                self._metrics["total_wait_s"] += sum(start - queued for _, _, queued in batch)
+                self._metrics["total_batch_s"] += end - start
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
+
+    def _run_single(self, args: tuple) -> tuple[Any, Exception | None]:
+        ''' Runs a request in a batch of its own, returning its result or its error. '''
+        try:
+            return self.predict_batch([args])[0], None
+        except Exception as exception:
+            return None, exception
+
+    @property
+    def metrics(self) -> dict[str, float | int | dict[int, int]]:
+        ''' Metrics of the service: counters, queue depth, batch sizes and mean times (ms). '''
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+            batch_sizes = dict(sorted(self._batch_sizes.items()))
+        served = sum(size * count for size, count in batch_sizes.items())
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue_depth": metrics["max_queue_depth"],
+            "requests": metrics["requests"],
+            "rejected": metrics["rejected"],
+            "failed": metrics["failed"],
+            "batches": metrics["batches"],
+            "mean_batch_size": served / metrics["batches"] if metrics["batches"] else 0.0,
+            "batch_sizes": batch_sizes,
+            "mean_wait_ms": 1000 * metrics["total_wait_s"] / served if served else 0.0,
+            "mean_batch_ms": 1000 * metrics["total_batch_s"] / metrics["batches"] if metrics["batches"] else 0.0,
+        }
+
+
+# Service of the neural model shared by every corpus and session of the process
+_neural_service: InferenceService | None = None
+_neural_service_lock = threading.Lock()
+
+
+def get_neural_service() -> InferenceService:
+    '''
+    Returns the service owning the single instance of the neural model of
+    the process, loading the model on the first call. Its requests are
+    (context, question, encodings) tuples (see `get_predictions`).
+    '''
+    global _neural_service
+    with _neural_service_lock:
+        if _neural_service is None:
+            from source.models.neural_model import get_predictions
+            _neural_service = InferenceService(
+                lambda requests: get_predictions([(context, question) for context, question, _ in requests], [encodings for _, _, encodings in requests]),
+                name="neural_inference")
+        return _neural_service
+
+
+def get_neural_service_metrics() -> dict | None:
+    ''' Returns the metrics of the service of the neural model, if started. '''
+    return None if _neural_service is None else _neural_service.metrics
@@ -0,0 +1,229 @@
+'''
+Memory-mapped weights of the neural model, shared by every process of
+the host.
+
+A checkpoint loaded by `from_pretrained` is copied into the private
+memory of every process (app servers, output writers...). Once converted
+to a weights store, the tensors of the model are instead read-only views
+over a memory-mapped file, so every process maps the same pages of the
+page cache: a single physical copy of the weights per host.
+
+The store has two files next to the checkpoint: "weights.mmap", with the
+raw bytes of every tensor (aligned to 64 bytes), and "weights.index.json",
+with the dtype, the shape and the offset of each one, along with a digest
+of the content of the checkpoint it was converted from. A store whose
+checkpoint has changed since is not used.
+
+Usage:
+-----
+
+    python -m source.models.mapped_weights convert --model ./models/Bert-FaQuAD
+    python -m source.models.mapped_weights report --model ./models/Bert-FaQuAD --processes 4
+'''
+# General dependencies
+import os
+import glob
+import json
+import hashlib
+import argparse
+import warnings
+import numpy as np
+import multiprocessing
+
+# Names of the files of the store, in the directory of the model
+WEIGHTS_FILE = "weights.mmap"
+INDEX_FILE = "weights.index.json"
+
+# Alignment (in bytes) of every tensor in the store
+_ALIGNMENT = 64
+
+# Files of the checkpoint the store is converted from
+_CHECKPOINT_PATTERNS = ("config.json", "model*.safetensors", "model*.safetensors.index.json", "pytorch_model*.bin", "pytorch_model*.bin.index.json")
+
+# Bytes of every checkpoint file in its digest: its head (the whole config and
+# indexes, the safetensors header), its tail (the zip directory of a .bin, with
+# the checksum of every tensor) and evenly spaced samples of the rest
+_DIGEST_HEAD = 2**20
+_DIGEST_SAMPLES = 16
+_DIGEST_SAMPLE_SIZE = 2**16
+
+
+def get_checkpoint_digest(model_path: str) -> str:
+    '''
+    Returns a digest of the content of the checkpoint of a directory,
+    from a few MiB of every file, so copies of the checkpoint (whatever
+    their modification times) have the same digest.
+    '''
+    digest = hashlib.sha256()
+    paths = sorted(path for pattern in _CHECKPOINT_PATTERNS for path in glob.glob(os.path.join(model_path, pattern)))
+    for path in paths:
+        size = os.path.getsize(path)
+        digest.update("{}:{}\0".format(os.path.basename(path), size).encode("utf-8"))
+        offsets = [0, max(0, size - _DIGEST_HEAD)] + [size * idx // (_DIGEST_SAMPLES + 1) for idx in range(1, _DIGEST_SAMPLES + 1)]
+        with open(path, "rb") as fp:
+            for idx, offset in enumerate(offsets):
+                fp.seek(offset)
+                digest.update(fp.read(_DIGEST_HEAD if idx < 2 else _DIGEST_SAMPLE_SIZE))
+    return digest.hexdigest()
+
+
+def has_mapped_weights(model_path: str) -> bool:
+    ''' Indicates if the model of a directory has been converted to a weights store. '''
+    return os.path.isfile(os.path.join(model_path, INDEX_FILE)) and os.path.isfile(os.path.join(model_path, WEIGHTS_FILE))
+
+
+def write_weights_store(arrays: dict[str, np.ndarray], model_path: str, checkpoint: str | None = None) -> int:
+    '''
+    Writes named arrays to the weights store of a directory, returning
+    its size in bytes. Both files are written aside and renamed, the
+    index last, so processes never map a partial store. The digest of
+    the checkpoint of the arrays (see `get_checkpoint_digest`) is
+    recorded in the index.
+    '''
+    index = {}
+    weights_path = os.path.join(model_path, WEIGHTS_FILE)
+    index_path = os.path.join(model_path, INDEX_FILE)
+    with open(weights_path + ".tmp", "wb") as fp:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            padding = -fp.tell() % _ALIGNMENT
+            fp.write(b"\0" * padding)
+            index[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": fp.tell()}
+            fp.write(array.tobytes())
+        size = fp.tell()
+    with open(index_path + ".tmp", "w", encoding="utf-8") as fp:
+        json.dump({"size": size, "checkpoint": checkpoint, "tensors": index}, fp)
+    os.replace(weights_path + ".tmp", weights_path)
+    os.replace(index_path + ".tmp", index_path)
+    return size
+
+
+def read_weights_store(model_path: str) -> dict[str, np.ndarray]:
+    ''' Returns the arrays of the weights store of a directory, as read-only views over its mapped file. '''
+    with open(os.path.join(model_path, INDEX_FILE), "r", encoding="utf-8") as fp:
+        index = json.load(fp)
+    data = np.memmap(os.path.join(model_path, WEIGHTS_FILE), dtype=np.uint8, mode="r")
+    if len(data) != index["size"]:
+        raise ValueError("the weights store of {} is incomplete".format(model_path))
+    arrays = {}
+    for name, entry in index["tensors"].items():
+        dtype = np.dtype(entry["dtype"])
+        count = int(np.prod(entry["shape"], dtype=np.int64))
+        arrays[name] = data[entry["offset"]:entry["offset"] + count * dtype.itemsize].view(dtype).reshape(entry["shape"])
+    return arrays
+
+
+def convert_checkpoint(model_path: str) -> int:
+    '''
+    Converts the checkpoint of a model directory to a weights store in
+    the same directory (parameters and buffers), returning its size in
+    bytes. It only needs to run once, after every change of the weights.
+    '''
+    from transformers import BertForQuestionAnswering
+
+    # Digest taken before loading, so a checkpoint changing meanwhile leaves a stale store
+    checkpoint = get_checkpoint_digest(model_path)
+    model = BertForQuestionAnswering.from_pretrained(model_path)
+    tensors = {**dict(model.named_parameters()), **dict(model.named_buffers())}
+    return write_weights_store({name: tensor.detach().cpu().numpy() for name, tensor in tensors.items()}, model_path, checkpoint)
+
+
+def load_mapped_model(model_path: str):
+    '''
+    Builds the model of a directory over its weights store: the model is
+    created without memory for its weights (on the "meta" device) and
+    every parameter and buffer becomes a read-only view over the mapped
+    file. The model is meant for inference only. If the checkpoint has
+    changed since the conversion, it is loaded instead, with a warning.
+    '''
+    import torch
+    from transformers import BertConfig, BertForQuestionAnswering
+
+    # A store converted from another checkpoint is not used
+    with open(os.path.join(model_path, INDEX_FILE), "r", encoding="utf-8") as fp:
+        checkpoint = json.load(fp).get("checkpoint")
+    if checkpoint != get_checkpoint_digest(model_path):
+        warnings.warn("The weights store of {} does not match its checkpoint, which is loaded instead; convert it again "
+                      "with `python -m source.models.mapped_weights convert`".format(model_path))
+        return BertForQuestionAnswering.from_pretrained(model_path)
+
+    with torch.device("meta"):
+        model = BertForQuestionAnswering(BertConfig.from_pretrained(model_path))
+
+    # Tensors over the mapped pages (torch warns that they are not writable, as intended)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        for name, array in read_weights_store(model_path).items():
+            module_name, _, tensor_name = name.rpartition(".")
+            module = model.get_submodule(module_name)
+            tensor = torch.from_numpy(array)
+            if tensor_name in module._parameters:
+                module._parameters[tensor_name] = torch.nn.Parameter(tensor, requires_grad=False)
+            else:
+                module._buffers[tensor_name] = tensor
+    model.tie_weights()
+
+    # Every tensor must come from the store
+    missing = [name for name, tensor in [*model.named_parameters(), *model.named_buffers()] if tensor.is_meta]
+    if len(missing) > 0:
+        raise ValueError("the weights store of {} misses {}".format(model_path, ", ".join(missing)))
+    return model.eval()
+
+
+def _get_memory() -> dict[str, float]:
+    ''' Returns the resident and the proportional (shared memory split among its processes) memory of the process, in MiB. '''
+    memory = {}
+    with open("/proc/self/smaps_rollup", "r") as fp:
+        for line in fp:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss", "Shared_Clean", "Private_Dirty"):
+                memory[name.lower()] = int(value.split()[0]) / 1024
+    return memory
+
+
+def _load_and_measure(model_path: str, mapped: bool, barrier) -> dict[str, float]:
+    from transformers import BertForQuestionAnswering
+    model = load_mapped_model(model_path) if mapped else BertForQuestionAnswering.from_pretrained(model_path)
+    # (measured once every process holds the model, so the shared pages are split among all of them)
+    barrier.wait()
+    memory = _get_memory()
+    barrier.wait()
+    del model
+    return memory
+
+
+def report_memory(model_path: str, num_processes: int, mapped: bool) -> list[dict[str, float]]:
+    ''' Loads the model in several processes at once, returning the memory of each one. '''
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        barrier = manager.Barrier(num_processes)
+        with context.Pool(num_processes) as pool:
+            return pool.starmap(_load_and_measure, [(model_path, mapped, barrier)] * num_processes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Memory-mapped weights of the neural model, shared by every process of the host.")
+    parser.add_argument("command", choices=["convert", "report"])
+    parser.add_argument("--model", default=os.environ.get("QA_GAME_NEURAL_MODEL", "./models/Bert-FaQuAD"))
+    parser.add_argument("--processes", type=int, default=4, help="processes loading the model at once (report)")
+    args = parser.parse_args()
+
+    # Conversion of the checkpoint
+    if args.command == "convert":
+        size = convert_checkpoint(args.model)
+        print("Weights store of {} written ({:.1f} MiB)".format(args.model, size / 2**20))
+        return
+
+    # Memory of several processes with private (checkpoint) and shared (mapped) weights
+    print("{:<12}{:>14}{:>14}{:>14}".format("weights", "RSS MiB", "PSS MiB", "total PSS"))
+    for mapped in (False, True) if has_mapped_weights(args.model) else (False,):
+        memories = report_memory(args.model, args.processes, mapped)
+        print("{:<12}{:>14.1f}{:>14.1f}{:>14.1f}".format(
+            "mapped" if mapped else "checkpoint",
+            np.mean([memory["rss"] for memory in memories]),
+            np.mean([memory["pss"] for memory in memories]),
+            sum(memory["pss"] for memory in memories)))
+
+
+if __name__ == "__main__":
+    main()
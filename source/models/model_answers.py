@@ -0,0 +1,260 @@
+# General dependencies
+import os
+import csv
+import threading
+from typing import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Local dependencies
+from source.utils.faquad import FaquadDataset
+from source.utils.lru_cache import LRUCache
+from source.utils.answer_checker import check_answer_from_model_output
+from source.models.model_output_loader import load_outputs
+
+# Agents answering the questions
+AGENTS = ("symbolic", "neural")
+
+# Header of the CSV files of model outputs
+OUTPUTS_HEADER = [
+    "topic_idx", "context_idx", "question_idx",
+    "symbolic_answer", "neural_answer",
+    "symbolic_is_correct", "neural_is_correct"
+]
+
+
+# Modes of the symbolic model: the parser-based one and the parser-free ones
+SYMBOLIC_MODES = ("parser", "bm25", "tfidf")
+
+
+def _load_symbolic_predictor(mode: str = "parser") -> Callable[[str, str], str]:
+    from sentence_splitter import SentenceSplitter
+    splitter = SentenceSplitter(language="pt")
+    if mode == "parser":
+        from source.models.symbolic_model import symbolic_model
+        return lambda context, question: symbolic_model(context, question, splitter)
+    from source.models.sparse_symbolic_model import sparse_symbolic_model
+    return lambda context, question: sparse_symbolic_model(context, question, splitter, mode)
+
+
+def _load_neural_predictor(context_encodings_path: str | None = None) -> Callable[[str, str], Future]:
+    # Requests are batched with the ones of every other corpus and session (waiting for room in the queue)
+    from source.models.neural_model import ContextEncodings
+    from source.models.inference_service import get_neural_service
+    encodings = ContextEncodings(context_encodings_path)
+    service = get_neural_service()
+    return lambda context, question: service.submit(context, question, encodings, block=True)
+
+
+class ModelAnswers:
+    '''
+    Answers of the symbolic and neural models for the questions of a
+    dataset. The answers are read from the precomputed CSV of outputs
+    (see `load_outputs`); with live inference, the missing ones are
+    computed on demand by background workers and kept in a size-bounded
+    LRU cache shared by every session, being optionally appended to the
+    CSV file so they are precomputed for the next server.
+
+    Parameters:
+    ----------
+
+    dataset: FaquadDataset
+        The dataset of the questions.
+
+    csv_path: str | None
+        The path of the CSV of precomputed outputs, if any.
+
+    live_inference: bool
+        Computes the answers missing from the CSV file. Otherwise,
+        they are reported as empty, incorrect answers.
+
+    cache_size: int
+        The maximum number of live answers kept in memory.
+
+    num_workers: int
+        The number of background workers running the models.
+
+    write_back: bool
+        Appends every live answer to the CSV file.
+
+    symbolic_mode: str
+        The mode of the symbolic model, one of `SYMBOLIC_MODES`: the
+        parser-based model or the parser-free one, with BM25 or TF-IDF
+        weighting.
+
+    context_encodings_path: str | None
+        The path prefix of the store of encodings of the contexts for
+        the neural model (see `build_context_encodings`), if any.
+
+    predictors: dict[str, Callable[[str, str], str | Future]] | None
+        The functions answering a (context, question) pair for every
+        agent, either directly or as a future; by default, the models of
+        `symbolic_model` and `neural_model` (this one through the shared
+        micro-batching `InferenceService`), loaded by the first live
+        inference.
+    '''
+    def __init__(
+        self,
+        dataset: FaquadDataset,
+        csv_path: str | None = None,
+        live_inference: bool = False,
+        cache_size: int = 4096,
+        num_workers: int = 2,
+        write_back: bool = False,
+        symbolic_mode: str = "parser",
+        context_encodings_path: str | None = None,
+        predictors: dict[str, Callable[[str, str], str | Future]] | None = None
+    ) -> None:
+        self.dataset = dataset
+        self.csv_path = csv_path
+        self.live_inference = live_inference
+        self.write_back = write_back and csv_path is not None
+        if symbolic_mode not in SYMBOLIC_MODES:
+            raise ValueError("expected symbolic_mode to be one of {}, got {}".format(SYMBOLIC_MODES, symbolic_mode))
+        self.symbolic_mode = symbolic_mode
+        self.context_encodings_path = context_encodings_path
+
+        # Precomputed answers
+        self.precomputed: dict[str, dict[tuple[int,int,int], tuple[str, bool]]] = {agent: {} for agent in AGENTS}
+        if csv_path is not None and os.path.isfile(csv_path):
+            self.precomputed["symbolic"], self.precomputed["neural"] = load_outputs(csv_path)
+
+        # Live answers
+        self._cache = LRUCache(cache_size)
+        self._pending: dict[tuple[int,int,int], Future] = {}
+        self._predictors = predictors
+        self._lock = threading.Lock()
+        self._predictors_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="model_answers") if live_inference else None
+
+    def is_ready(self, indexes: tuple[int, int, int]) -> bool:
+        ''' Indicates if the answers for a question are available without waiting. '''
+        return indexes in self.precomputed["neural"] or indexes in self._cache or not self.live_inference
+
+    def request(self, indexes: tuple[int, int, int]) -> Future | None:
+        '''
+        Schedules the live inference of a question if its answers are not
+        available yet, returning the future of the inference (if any).
+        '''
+        if self.is_ready(indexes):
+            return None
+        with self._lock:
+            future = self._pending.get(indexes)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._infer, indexes)
+            self._pending[indexes] = future
+
+        # (added once it is pending and outside of the lock, as it runs right away for an inference already done)
+        future.add_done_callback(lambda done: self._forget(indexes, done))
+        return future
+
+    def _forget(self, indexes: tuple[int, int, int], future: Future) -> None:
+        ''' Removes a finished inference from the pending ones. '''
+        with self._lock:
+            if self._pending.get(indexes) is future:
+                del self._pending[indexes]
+
+    def get(self, indexes: tuple[int, int, int], timeout: float | None = None) -> dict[str, tuple[str, bool]]:
+        '''
+        Returns the answers of every agent for a question, waiting for
+        the live inference if needed. Every answer is a tuple with its
+        text and a boolean indicating if it is correct.
+        '''
+        indexes = tuple(int(idx) for idx in indexes)
+        if indexes in self.precomputed["neural"]:
+            return {agent: self.precomputed[agent].get(indexes, ("", False)) for agent in AGENTS}
+        if not self.live_inference:
+            return {agent: ("", False) for agent in AGENTS}
+        answers = self._cache.get(indexes)
+        if answers is None:
+            future = self.request(indexes)
+            answers = future.result(timeout) if future is not None else self._cache.get(indexes)
+        return answers
+
+    def _get_predictors(self) -> dict[str, Callable[[str, str], str | Future]]:
+        with self._predictors_lock:
+            if self._predictors is None:
+                self._predictors = {
+                    "symbolic": _load_symbolic_predictor(self.symbolic_mode),
+                    "neural": _load_neural_predictor(self.context_encodings_path),
+                }
+            return self._predictors
+
+    def warm_up(self, num_questions: int = 1) -> None:
+        '''
+        Loads the models of the live inference and runs them over the first
+        questions of the dataset, discarding their answers, so the first
+        players do not wait for the models to be loaded. Does nothing
+        without live inference.
+        '''
+        if not self.live_inference:
+            return
+        for question_id in range(min(num_questions, self.dataset.num_questions)):
+            title_idx, paragraph, question = self.dataset.get_question_indexes(question_id)
+            title = self.dataset.sorted_titles[title_idx]
+            context = self.dataset.get_context(title, paragraph)
+            question = self.dataset.get_question(title, paragraph, question)
+            for answer in [predictor(context, question) for predictor in self._get_predictors().values()]:
+                if isinstance(answer, Future):
+                    answer.result()
+
+    def _infer(self, indexes: tuple[int, int, int]) -> dict[str, tuple[str, bool]]:
+        ''' Runs every model over a question, caching (and writing back) the answers. '''
+        title = self.dataset.sorted_titles[indexes[0]]
+        context = self.dataset.get_context(title, indexes[1])
+        question = self.dataset.get_question(title, *indexes[1:])
+        truths = [answer["text"] for answer in self.dataset.get_answers(title, *indexes[1:])]
+
+        # Answers of every agent; predictors may return futures (as the batched neural
+        # model), resolved once every agent is running; failures are reported as empty
+        # answers, but not kept
+        outputs = {}
+        failed = False
+        for agent, predictor in self._get_predictors().items():
+            try:
+                outputs[agent] = predictor(context, question)
+            except Exception as e:
+                print("{} model failed on question {}: {}".format(agent, indexes, e))
+                outputs[agent], failed = "", True
+        answers = {}
+        for agent, answer in outputs.items():
+            if isinstance(answer, Future):
+                try:
+                    answer = answer.result()
+                except Exception as e:
+                    print("{} model failed on question {}: {}".format(agent, indexes, e))
+                    answer, failed = "", True
+            answer = answer if isinstance(answer, str) else ""
+            answers[agent] = (answer, check_answer_from_model_output(answer, truths))
+        if failed:
+            return answers
+        self._cache.put(indexes, answers)
+
+        # Appends the answers to the CSV of outputs
+        if self.write_back:
+            self._write_back(indexes, answers)
+        return answers
+
+    def _write_back(self, indexes: tuple[int, int, int], answers: dict[str, tuple[str, bool]]) -> None:
+        with self._lock:
+            write_header = not os.path.isfile(self.csv_path)
+            with open(self.csv_path, "a", newline="", encoding="utf-8") as target_file:
+                csv_writer = csv.writer(target_file)
+                if write_header:
+                    csv_writer.writerow(OUTPUTS_HEADER)
+                csv_writer.writerow([
+                    *indexes,
+                    answers["symbolic"][0], answers["neural"][0],
+                    answers["symbolic"][1], answers["neural"][1]
+                ])
+
+    @property
+    def stats(self) -> dict[str, int]:
+        ''' Statistics of the live inference. '''
+        return {
+            "precomputed": len(self.precomputed["neural"]),
+            "cached": len(self._cache),
+            "pending": len(self._pending),
+            "cache_hits": self._cache.hits,
+            "cache_misses": self._cache.misses,
+        }
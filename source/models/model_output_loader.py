@@ -1,5 +1,5 @@
-# General dependencies
-import pandas as pd
+# Path for the answers of the models over the FaQuAD test set
+MODELS_ANSWERS_PATH = "./data/models_answers.csv"
 
 def load_outputs(csv_path: str) -> tuple[dict[tuple[int,int,int], tuple[str, bool]], dict[tuple[int,int,int], tuple[str, bool]]]:
     '''
@@ -23,7 +23,8 @@ def load_outputs(csv_path: str) -> tuple[dict[tuple[int,int,int], tuple[str, boo
     neural_answers: dict[tuple[int,int,int], tuple[str, bool]]
         Same as the first output, but for the neural model. 
     '''
-    # Loads the data
+    # Loads the data (pandas is only imported once outputs are needed)
+    import pandas as pd
     df_outputs = pd.read_csv(csv_path)
 
     # Creates the holders for the outputs
@@ -6,10 +6,11 @@ from sentence_splitter import SentenceSplitter
 
 # Local dependencies
 from source.utils.faquad import FaquadDataset
-from source.models.symbolic_model import symbolic_model
+from source.models.symbolic_model import symbolic_model_batch
 from source.models.neural_model import get_prediction as neural_model
+from source.models.neural_model import ContextEncodings, build_context_encodings
 
-def write_model_outputs(csv_path: str, dataset: FaquadDataset) -> None:
+def write_model_outputs(csv_path: str, dataset: FaquadDataset, encodings_path: str | None = None) -> None:
     '''
     Writes an CSV for the outputs of both models, symbolic and 
     neural. The columns are the following: "topic_idx", "context_idx", 
@@ -23,6 +24,10 @@ def write_model_outputs(csv_path: str, dataset: FaquadDataset) -> None:
 
     dataset: FaquadDataset
         The dataset to retrieve the inputs from.
+
+    encodings_path: str | None
+        The path prefix of the store of encodings of the contexts for
+        the neural model; built if it does not exist yet.
     '''
 
     # File path verification
@@ -32,9 +37,17 @@ def write_model_outputs(csv_path: str, dataset: FaquadDataset) -> None:
 
     # Sentence splitter for the symbolic model
     splitter = SentenceSplitter(language="pt")
+
+    # Encodings of the contexts for the neural model, tokenized once per context
+    if encodings_path is not None and not os.path.isfile(encodings_path + ".index.json"):
+        build_context_encodings(
+            (dataset.get_context(topic, context_idx) for topic in dataset.sorted_titles for context_idx in range(dataset.get_num_paragraphs(topic))),
+            encodings_path)
+    encodings = ContextEncodings(encodings_path)
     
-    # Target .csv file opening
-    with open(csv_path, "w", newline="", encoding="utf-8") as target_file:
+    # Target .csv file opening (written aside and renamed once complete, so the
+    # servers watching it never load a partial file)
+    with open(csv_path + ".tmp", "w", newline="", encoding="utf-8") as target_file:
 
         # CSV writer and registry header
         csv_writer = writer(target_file)
@@ -50,15 +63,22 @@ def write_model_outputs(csv_path: str, dataset: FaquadDataset) -> None:
             for context_idx in tqdm(range(num_contexts), desc="context", total=num_contexts):
                 context = dataset.get_context(topic, context_idx)
                 num_questions = dataset.get_num_questions(topic, context_idx)
+                questions = [dataset.get_question(topic, context_idx, question_idx) for question_idx in range(num_questions)]
+
+                # The symbolic model answers every question of the context at once
+                symbolic_answers = symbolic_model_batch(context, questions, splitter)
                 for question_idx in tqdm(range(num_questions), desc="question", total=num_questions):
-                    question = dataset.get_question(topic, context_idx, question_idx)
+                    question = questions[question_idx]
 
                     # Gets the outputs of the models
-                    symbolic_answer = symbolic_model(context, question, splitter)
-                    neural_answer = neural_model(context, question)
+                    symbolic_answer = symbolic_answers[question_idx]
+                    neural_answer = neural_model(context, question, encodings)
 
                     # Writes the current row
                     csv_writer.writerow([
                         topic_idx, context_idx, question_idx, 
                         symbolic_answer, neural_answer
-                    ])
\ No newline at end of file
+                    ])
+
+    # Replaces the previous outputs at once
+    os.replace(csv_path + ".tmp", csv_path)
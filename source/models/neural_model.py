@@ -1,8 +1,22 @@
+import os
+import json
+import hashlib
 import torch
+import numpy as np
 from transformers import BertForQuestionAnswering, BertTokenizerFast
 
-model_path = "./models/Bert-FaQuAD"
-neural_model = BertForQuestionAnswering.from_pretrained(model_path)
+from source.utils.lru_cache import LRUCache
+from source.models.mapped_weights import has_mapped_weights, load_mapped_model
+
+# The model can be replaced by a distilled student (see distillation.py)
+model_path = os.environ.get("QA_GAME_NEURAL_MODEL", "./models/Bert-FaQuAD")
+
+# Weights mapped from the converted store (see mapped_weights.py), if any, so every
+# process of the host shares a single copy of them; otherwise, from the checkpoint
+if os.environ.get("QA_GAME_NEURAL_MAPPED_WEIGHTS", "1") == "1" and has_mapped_weights(model_path):
+  neural_model = load_mapped_model(model_path)
+else:
+  neural_model = BertForQuestionAnswering.from_pretrained(model_path)
 tokenizer = BertTokenizerFast.from_pretrained(model_path)
 
 device = torch.device('cuda') if torch.cuda.is_available() else torch.device('cpu')
@@ -10,13 +24,137 @@ print(f'Working on {device}')
 
 neural_model = neural_model.to(device)
 
-def get_prediction(context, question):
-  inputs = tokenizer.encode_plus(question, context, return_tensors='pt').to(device)
-  outputs = neural_model(**inputs)
 
-  answer_start = torch.argmax(outputs[0])
-  answer_end = torch.argmax(outputs[1]) + 1
+def encode_text(text):
+  '''
+  Tokenizes a text without special tokens, returning its ids
+  and the (start, end) character offsets of every token.
+  '''
+  encoding = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+  ids = np.asarray(encoding['input_ids'], dtype=np.int32)
+  offsets = np.asarray(encoding['offset_mapping'], dtype=np.int32).reshape(-1, 2)
+  return ids, offsets
+
+
+def _text_key(text):
+  return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def build_context_encodings(contexts, store_path):
+  '''
+  Tokenizes every distinct context once and stores their encodings as
+  memory-mapped NumPy files: "<store_path>.ids.npy" and
+  "<store_path>.offsets.npy" hold the tokens of every context, one after
+  the other, and "<store_path>.index.json" their (start, end) ranges.
+  '''
+  index = {}
+  all_ids, all_offsets = [], []
+  position = 0
+  for context in contexts:
+    key = _text_key(context)
+    if key in index:
+      continue
+    ids, offsets = encode_text(context)
+    index[key] = (position, position + len(ids))
+    all_ids.append(ids)
+    all_offsets.append(offsets)
+    position += len(ids)
+
+  np.save(store_path + '.ids.npy', np.concatenate(all_ids) if all_ids else np.zeros(0, dtype=np.int32))
+  np.save(store_path + '.offsets.npy', np.concatenate(all_offsets) if all_offsets else np.zeros((0, 2), dtype=np.int32))
+  with open(store_path + '.index.json', 'w', encoding='utf-8') as fp:
+    json.dump(index, fp)
+
+
+class ContextEncodings:
+  '''
+  Encodings (ids and offsets) of the contexts, computed once per context
+  and kept in a bounded LRU cache; the contexts found in a store built by
+  `build_context_encodings` are read from its memory-mapped files instead.
+
+  Parameters:
+  ----------
+
+  store_path: str | None
+      The path prefix of the store of encodings, if any.
+
+  cache_size: int
+      The maximum number of encodings kept in memory.
+  '''
+  def __init__(self, store_path=None, cache_size=1024):
+    self._cache = LRUCache(cache_size)
+    self._index = {}
+    self._ids = self._offsets = None
+    if store_path is not None and os.path.isfile(store_path + '.index.json'):
+      with open(store_path + '.index.json', 'r', encoding='utf-8') as fp:
+        self._index = json.load(fp)
+      self._ids = np.load(store_path + '.ids.npy', mmap_mode='r')
+      self._offsets = np.load(store_path + '.offsets.npy', mmap_mode='r')
+
+  def get(self, text):
+    ''' Returns the ids and the offsets of the tokens of a text. '''
+    key = _text_key(text)
+    encoding = self._cache.get(key)
+    if encoding is None:
+      if key in self._index:
+        start, end = self._index[key]
+        encoding = (self._ids[start:end], self._offsets[start:end])
+      else:
+        encoding = encode_text(text)
+      self._cache.put(key, encoding)
+    return encoding
+
+
+# Encodings shared by the predictions without a store of their own
+context_encodings = ContextEncodings()
+
+
+def _build_inputs(context, question, encodings):
+  # Joins the cached encodings as in "[CLS] question [SEP] context [SEP]"
+  context_ids, _ = encodings.get(context)
+  question_ids, _ = encode_text(question)
+  input_ids = np.concatenate(([tokenizer.cls_token_id], question_ids, [tokenizer.sep_token_id], context_ids, [tokenizer.sep_token_id]))
+  token_type_ids = np.concatenate((np.zeros(len(question_ids) + 2, dtype=np.int64), np.ones(len(context_ids) + 1, dtype=np.int64)))
+  return input_ids, token_type_ids
+
+
+def get_predictions(pairs, encodings=None):
+  '''
+  Answers several (context, question) pairs in a single forward pass,
+  padding their inputs to the longest one; `encodings` has the store of
+  encodings of every pair (the shared one if None).
+  '''
+  encodings = encodings or [None] * len(pairs)
+  inputs = [_build_inputs(context, question, pair_encodings or context_encodings) for (context, question), pair_encodings in zip(pairs, encodings)]
+
+  # Padded batch
+  length = max(len(input_ids) for input_ids, _ in inputs)
+  batch_ids = np.full((len(inputs), length), tokenizer.pad_token_id or 0, dtype=np.int64)
+  batch_types = np.zeros((len(inputs), length), dtype=np.int64)
+  batch_mask = np.zeros((len(inputs), length), dtype=np.int64)
+  for row, (input_ids, token_type_ids) in enumerate(inputs):
+    batch_ids[row, :len(input_ids)] = input_ids
+    batch_types[row, :len(input_ids)] = token_type_ids
+    batch_mask[row, :len(input_ids)] = 1
+
+  with torch.no_grad():
+    outputs = neural_model(
+      input_ids=torch.tensor(batch_ids, dtype=torch.long, device=device),
+      token_type_ids=torch.tensor(batch_types, dtype=torch.long, device=device),
+      attention_mask=torch.tensor(batch_mask, dtype=torch.long, device=device))
+
+  # The padding never starts nor ends an answer
+  padding = torch.tensor(batch_mask == 0, device=device)
+  start_logits = outputs[0].masked_fill(padding, float('-inf'))
+  end_logits = outputs[1].masked_fill(padding, float('-inf'))
+
+  answers = []
+  for row, (input_ids, _) in enumerate(inputs):
+    answer_start = int(torch.argmax(start_logits[row]))
+    answer_end = int(torch.argmax(end_logits[row])) + 1
+    answers.append(tokenizer.convert_tokens_to_string(tokenizer.convert_ids_to_tokens(input_ids[answer_start:answer_end])))
+  return answers
 
-  answer = tokenizer.convert_tokens_to_string(tokenizer.convert_ids_to_tokens(inputs['input_ids'][0][answer_start:answer_end]))
 
-  return answer
\ No newline at end of file
+def get_prediction(context, question, encodings=None):
+  return get_predictions([(context, question)], [encodings])[0]
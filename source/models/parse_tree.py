@@ -0,0 +1,169 @@
+'''
+Parser of the bracketed "oneline" output of the Stanford parser into
+lightweight immutable nodes, and extraction of the sentences and of
+their phrases (S, NP, PP and VP) used by the symbolic model.
+
+It reads the format exactly as `nltk.Tree.fromstring` does and extracts
+the same sentences and phrases as `extract_sentences` and
+`extract_phrases` of `symbolic_model`, in a single pass over the tokens
+of every tree: the phrases of every S node are gathered when it is
+closed, the sentences nested in a sentence are a contiguous range of the
+S nodes in pre-order, and duplicated sentences are found by a set lookup
+of their canonical form instead of comparing every pair of trees.
+'''
+# General dependencies
+import re
+
+# Tokens of the format, as read by `nltk.Tree.fromstring`: an opening bracket
+# with its (optional) label, a closing bracket or a leaf
+_TOKEN_RE = re.compile(r"\(\s*([^\s()]+)?|\)|([^\s()]+)")
+
+# Labels of the phrases extracted from every sentence
+PHRASE_LABELS = ("S", "NP", "PP", "VP")
+
+
+class ParseNode:
+    '''
+    Immutable node of a parse tree.
+
+    Parameters:
+    ----------
+
+    label: str
+        The label of the node.
+
+    children: tuple
+        The children of the node, either nodes or leaves (str).
+
+    leaves: list[str]
+        The leaves of the whole tree, shared by its nodes.
+
+    start: int
+        The index of the first leaf of the node.
+
+    end: int
+        The index after the last leaf of the node.
+    '''
+    __slots__ = ("label", "children", "_leaves", "start", "end")
+
+    def __init__(self, label: str, children: tuple, leaves: list[str], start: int, end: int) -> None:
+        self.label = label
+        self.children = children
+        self._leaves = leaves
+        self.start = start
+        self.end = end
+
+    @property
+    def leaves(self) -> list[str]:
+        ''' The leaves of the node, in order. '''
+        return self._leaves[self.start:self.end]
+
+    @property
+    def text(self) -> str:
+        ''' The leaves of the node joined by spaces (as `" ".join(tree.leaves())`). '''
+        return " ".join(self._leaves[self.start:self.end])
+
+
+class _Sentence:
+    ''' An S node of a tree, with what the extraction needs from it. '''
+    __slots__ = ("node", "key", "is_sentence", "phrases", "end")
+
+
+def _parse(line: str) -> tuple[ParseNode, list[_Sentence]]:
+    '''
+    Parses a bracketed tree, returning its root and its S nodes in
+    pre-order; raises `ValueError` for malformed trees, as
+    `nltk.Tree.fromstring` does.
+    '''
+    leaves: list[str] = []
+    sentences: list[_Sentence] = []
+
+    # Canonical tokens ("(<label>", ")" or a leaf), so equal subtrees have equal spans
+    canonical: list[str] = []
+
+    # Open nodes: label, children, first leaf, first canonical token and S node (if any)
+    stack: list[tuple] = [(None, [], 0, 0, None)]
+    for match in _TOKEN_RE.finditer(line):
+        token = match.group()
+
+        # Opening bracket
+        if token[0] == "(":
+            if len(stack) == 1 and len(stack[0][1]) > 0:
+                raise ValueError("expected end-of-string at position {} of {!r}".format(match.start(), line))
+            label = token[1:].lstrip()
+            sentence = None
+            if label == "S":
+                sentence = _Sentence()
+                sentences.append(sentence)
+            stack.append((label, [], len(leaves), len(canonical), sentence))
+            canonical.append("(" + label)
+
+        # Closing bracket
+        elif token == ")":
+            if len(stack) == 1:
+                raise ValueError("expected {} at position {} of {!r}".format(
+                    "'('" if len(stack[0][1]) == 0 else "end-of-string", match.start(), line))
+            canonical.append(")")
+            label, children, start, canonical_start, sentence = stack.pop()
+            node = ParseNode(label, tuple(children), leaves, start, len(leaves))
+            stack[-1][1].append(node)
+
+            # Phrases of an S node, from its children
+            if sentence is not None:
+                child_nodes = [child for child in children if not isinstance(child, str)]
+                sentence.node = node
+                sentence.key = " ".join(canonical[canonical_start:])
+                sentence.is_sentence = any(child.label != "S" for child in child_nodes)
+                sentence.phrases = [(child.label, child.text) for child in child_nodes if child.label in PHRASE_LABELS]
+                sentence.end = len(sentences)
+
+        # Leaf
+        else:
+            if len(stack) == 1:
+                raise ValueError("expected '(' at position {} of {!r}".format(match.start(), line))
+            stack[-1][1].append(token)
+            leaves.append(token)
+            canonical.append(token)
+
+    if len(stack) > 1:
+        raise ValueError("expected ')' at the end of {!r}".format(line))
+    if len(stack[0][1]) == 0:
+        raise ValueError("expected '(' in {!r}".format(line))
+    return stack[0][1][0], sentences
+
+
+def parse_oneline(line: str) -> ParseNode:
+    '''
+    Parses a bracketed tree, as "(ROOT (S (NP (N casa)) ...))", raising
+    `ValueError` for malformed ones, as `nltk.Tree.fromstring` does.
+    '''
+    return _parse(line)[0]
+
+
+def extract_sentences_phrases(tree_list: list[str]) -> dict[int, dict[str, list[str]]]:
+    '''
+    Returns the phrases of every distinct sentence of the trees, by the
+    index of the sentence, as `extract_phrases` over the output of
+    `extract_sentences` (see `symbolic_model`).
+
+    The sentences are the S nodes with a non-S node among their children,
+    in the order of the trees and of a pre-order walk of each one. The
+    phrases of a sentence are its text ("S", first) and the texts of the
+    S, NP, PP and VP children of every S node of the sentence.
+    '''
+    seen = set()
+    final = {}
+    for line in tree_list:
+        _, sentences = _parse(line)
+        for idx, sentence in enumerate(sentences):
+            if not sentence.is_sentence or sentence.key in seen:
+                continue
+            seen.add(sentence.key)
+
+            # The S nodes of the sentence follow it in pre-order
+            phrases = {"S": [sentence.node.text], "NP": [], "PP": [], "VP": []}
+            for nested in sentences[idx:sentence.end]:
+                for label, text in nested.phrases:
+                    phrases[label].append(text)
+            final[len(final)] = phrases
+    return final
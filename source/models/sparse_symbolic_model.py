@@ -0,0 +1,185 @@
+# General dependencies
+import re
+import time
+import itertools
+import numpy as np
+import scipy.sparse as sp
+from sentence_splitter import SentenceSplitter
+
+# Local dependencies
+from source.utils.search_index import tokenize
+from source.models.metrics import compute_f1, exact_match
+
+# Weightings of the term-sentence matrix
+WEIGHTINGS = ("bm25", "tfidf")
+
+# Boundaries of the clauses of a sentence
+_CLAUSES_REGEX = re.compile(r"\s*[;:,]\s+")
+
+
+def split_clauses(text: str, splitter: SentenceSplitter) -> list[str]:
+    '''
+    Splits a text into its sentences and then into their clauses, which
+    stand for the clauses (S nodes) given by the parser in `symbolic_model`.
+    '''
+    return [
+        clause
+        for sentence in splitter.split(text=text)
+        for clause in _CLAUSES_REGEX.split(sentence)
+        if clause.strip() != ""
+    ]
+
+
+def build_sentence_matrix(sentences: list[str], weighting: str = "bm25", k1: float = 1.5, b: float = 0.75) -> tuple[sp.csr_matrix, dict[str, int]]:
+    '''
+    Builds the sparse sentence-term matrix of a context, along
+    with the column of every term of its vocabulary.
+
+    Parameters:
+    ----------
+
+    sentences: list[str]
+        The sentences of the context.
+
+    weighting: str
+        Either "bm25" or "tfidf" (with L2-normalized rows).
+
+    k1: float
+        The term frequency saturation of BM25.
+
+    b: float
+        The length normalization of BM25.
+    '''
+    if weighting not in WEIGHTINGS:
+        raise ValueError("expected weighting to be one of {}, got {}".format(WEIGHTINGS, weighting))
+
+    # Term counts of every sentence
+    vocabulary: dict[str, int] = {}
+    rows, cols = [], []
+    for row, sentence in enumerate(sentences):
+        for token in tokenize(sentence):
+            rows.append(row)
+            cols.append(vocabulary.setdefault(token, len(vocabulary)))
+    counts = sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+        shape=(len(sentences), len(vocabulary)))
+    counts.sum_duplicates()
+
+    # Document frequencies and lengths
+    num_sentences = len(sentences)
+    df = np.bincount(counts.indices, minlength=len(vocabulary))
+    lengths = np.asarray(counts.sum(axis=1)).ravel()
+    tf = counts.data
+    term_rows = np.repeat(np.arange(num_sentences), np.diff(counts.indptr))
+
+    # Weights
+    if weighting == "bm25":
+        idf = np.log(1 + (num_sentences - df + 0.5) / (df + 0.5))
+        norms = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+        counts.data = idf[counts.indices] * tf * (k1 + 1) / (tf + norms[term_rows])
+    else:
+        idf = np.log((1 + num_sentences) / (1 + df)) + 1
+        counts.data = tf * idf[counts.indices]
+        row_norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+        counts.data /= np.maximum(row_norms, 1e-12)[term_rows]
+    return counts, vocabulary
+
+
+def score_sentences(matrix: sp.csr_matrix, vocabulary: dict[str, int], questions: list[str]) -> np.ndarray:
+    '''
+    Scores every sentence of a context against every question with one
+    sparse matrix product, returning a (questions x sentences) matrix.
+    '''
+    rows, cols = [], []
+    for row, question in enumerate(questions):
+        columns = {vocabulary[token] for token in tokenize(question) if token in vocabulary}
+        rows.extend([row] * len(columns))
+        cols.extend(columns)
+    queries = sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.float64), (rows, cols)),
+        shape=(len(questions), len(vocabulary)))
+    return (queries @ matrix.T).toarray()
+
+
+def sparse_symbolic_model_batch(text: str, questions: list[str], splitter: SentenceSplitter, weighting: str = "bm25") -> list[str]:
+    '''
+    Parser-free alternative to `symbolic_model_batch`: answers every
+    question of a context with the clause of the context best matching
+    it. The clauses are split by `split_clauses` once and scored through
+    a sparse term-sentence matrix; ties are broken by the last clause,
+    as in `symbolic_model`.
+
+    Parameters:
+    ----------
+
+    text: str
+        The context of the questions.
+
+    questions: list[str]
+        The questions to be answered.
+
+    splitter: SentenceSplitter
+        The splitter of the sentences of the context.
+
+    weighting: str
+        Either "bm25" or "tfidf".
+    '''
+    sentences = split_clauses(text, splitter)
+    if len(sentences) == 0:
+        return [""] * len(questions)
+    matrix, vocabulary = build_sentence_matrix(sentences, weighting)
+    scores = score_sentences(matrix, vocabulary, questions)
+    best = len(sentences) - 1 - np.argmax(scores[:, ::-1], axis=1)
+    return [sentences[num_sentence] for num_sentence in best]
+
+
+def sparse_symbolic_model(text: str, question: str, splitter: SentenceSplitter, weighting: str = "bm25") -> str:
+    ''' Answers a single question with `sparse_symbolic_model_batch`. '''
+    return sparse_symbolic_model_batch(text, [question], splitter, weighting)[0]
+
+
+if __name__ == "__main__":
+    from source.utils.faquad import FaquadDataset
+    from source.models.model_output_loader import load_outputs, MODELS_ANSWERS_PATH
+
+    # Questions of the validation dataset
+    dataset = FaquadDataset("data/dev.json")
+    sorted_titles = dataset.sorted_titles
+    questions = []
+    for question_id in range(dataset.num_questions):
+        title_idx, paragraph, question = dataset.get_question_indexes(question_id)
+        title = sorted_titles[title_idx]
+        questions.append((
+            (title_idx, paragraph, question),
+            dataset.get_context(title, paragraph),
+            dataset.get_question(title, paragraph, question),
+            [answer["text"] for answer in dataset.get_answers(title, paragraph, question)]
+        ))
+    print(f"Há {len(questions)} perguntas na validação")
+
+    # Scores of an answer against every truth
+    def evaluate(prediction: str, truths: list[str]) -> tuple[float, float]:
+        prediction = prediction if isinstance(prediction, str) else ""
+        return max(exact_match(prediction, truth) for truth in truths), max(compute_f1(prediction, truth) for truth in truths)
+
+    # Precomputed answers of the parser-based model
+    symbolic_outputs, _ = load_outputs(MODELS_ANSWERS_PATH)
+    results = [evaluate(symbolic_outputs[indexes][0], truths) for indexes, _, _, truths in questions if indexes in symbolic_outputs]
+    print(f"\nparser (saídas pré-computadas, {len(results)} perguntas)")
+    print(f"Exact match: {np.mean([em for em, _ in results])}")
+    print(f"F1 score: {np.mean([f1 for _, f1 in results])}")
+
+    # Parser-free model, for every weighting
+    splitter = SentenceSplitter(language="pt")
+    for weighting in WEIGHTINGS:
+        start = time.perf_counter()
+        predictions = []
+        for _, group in itertools.groupby(questions, key=lambda x: x[0][:2]):
+            group = list(group)
+            predictions.extend(sparse_symbolic_model_batch(group[0][1], [question for _, _, question, _ in group], splitter, weighting))
+        elapsed = time.perf_counter() - start
+        results = [evaluate(prediction, truths) for prediction, (_, _, _, truths) in zip(predictions, questions)]
+        print(f"\n{weighting}")
+        print(f"Exact match: {np.mean([em for em, _ in results])}")
+        print(f"F1 score: {np.mean([f1 for _, f1 in results])}")
+        print(f"Latência média: {1000 * elapsed / len(questions):.3f} ms")
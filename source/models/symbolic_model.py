@@ -6,6 +6,8 @@ import os
 import re
 import json
 import nltk
+import itertools
+import tempfile
 import numpy as np
 from nltk.tree import ParentedTree
 from nltk.corpus import stopwords
@@ -14,6 +16,7 @@ from nltk.stem import WordNetLemmatizer
 from sentence_splitter import SentenceSplitter
 
 from source.models.metrics import compute_f1, exact_match
+from source.models.parse_tree import extract_sentences_phrases
 
 nltk.download('punkt')
 nltk.download('stopwords')
@@ -51,8 +54,17 @@ def save_as_txt(text, path):
     f.close()
 
 
+def tree_key(tree):
+    """
+    Hashable key of a tree(format: nltk.Tree), equal for two trees if and only if they are equal.
+    """
+    return (tree.label(), tuple(tree_key(child) if isinstance(child, nltk.Tree) else child for child in tree))
+
+
 def extract_sentences(tree_list):
     sentences = []
+    # Chaves das sentenças já extraídas, evitando comparar cada nova sentença com todas as anteriores
+    seen = set()
 
     for tree_string in tree_list:
         # Crie uma árvore sintática a partir da string
@@ -63,8 +75,11 @@ def extract_sentences(tree_list):
                 # Percorre os filhos diretos da sentença
                 for child in subtree:
                     test_sentence = subtree
-                    if (isinstance(child, nltk.Tree)) & (child.label() != "S") & (test_sentence not in sentences): #Se o filho do nó é uma arvore
-                        sentences.append(test_sentence)
+                    if (isinstance(child, nltk.Tree)) & (child.label() != "S"): #Se o filho do nó é uma arvore
+                        key = tree_key(test_sentence)
+                        if key not in seen:
+                            seen.add(key)
+                            sentences.append(test_sentence)
     return sentences
 
 
@@ -111,54 +126,70 @@ def preprocess_context(text, splitter):
         context = "\n".join(text.split(','))
     else:
         context = "\n".join(text_splitted)
-    path = "text_sentences.txt"
-    save_as_txt(context, path)
     
-    # Fazendo analise sintatica
-    os.system(f"java -Xmx500m -cp stanford-parser-2010-11-30/stanford-parser.jar edu.stanford.nlp.parser.lexparser.LexicalizedParser -tokenized -sentences newline -outputFormat oneline -uwModel edu.stanford.nlp.parser.lexparser.BaseUnknownWordModel cintil.ser/cintil.ser text_sentences.txt > text_sintax_.txt;")
-    f = open('text_sintax_.txt', "r")
-    tree_context = f.read()
-    f.close()
+    # Fazendo analise sintatica (arquivos temporarios unicos, para permitir chamadas concorrentes)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "text_sentences.txt")
+        syntax_path = os.path.join(tmp_dir, "text_sintax_.txt")
+        save_as_txt(context, path)
+        os.system(f"java -Xmx500m -cp stanford-parser-2010-11-30/stanford-parser.jar edu.stanford.nlp.parser.lexparser.LexicalizedParser -tokenized -sentences newline -outputFormat oneline -uwModel edu.stanford.nlp.parser.lexparser.BaseUnknownWordModel cintil.ser/cintil.ser {path} > {syntax_path};")
+        f = open(syntax_path, "r")
+        tree_context = f.read()
+        f.close()
     tree_list = tree_context.split("\n")
     tree_list = [tree for tree in tree_list if tree != '']
     
-    # Utilizando a separacao sintatica para extrair as frases finais
-    sentences = extract_sentences(tree_list)
-
-    # Extraindo os sintagmas das frases finais
-    final = {}
-    for sentence in range(len(sentences)):
-        final[sentence] = extract_phrases(sentences[sentence])
-    
-    # Removendo arquivos temporarios
-    os.remove("text_sentences.txt")
-    os.remove("text_sintax_.txt")
-    
-    return final
+    # Utilizando a separacao sintatica para extrair as frases finais e os seus sintagmas
+    # (com o parser dedicado, equivalente a extract_sentences seguido de extract_phrases)
+    return extract_sentences_phrases(tree_list)
 
-def symbolic_model(text, question, splitter):
-    response = ""
+def symbolic_model_batch(text, questions, splitter):
+    """
+    Answers every question of a context at once: the context is preprocessed
+    a single time and the overlaps between the tokens of every question and
+    of every sentence are computed as one (questions x sentences) matrix. As
+    in the original model, the last sentence with the highest count wins.
+    """
+    responses = [""] * len(questions)
     try:
-        # Preprocessando dados
-        preprocess_question = tokenize_text(question)
+        # Preprocessando o contexto uma unica vez
         final_sentences = preprocess_context(text, splitter=splitter)
-
-        max_contador = 0
-        for num_sentence in final_sentences:
-            if len(final_sentences[num_sentence]['S']) == 1:
-                sentence = final_sentences[num_sentence]['S'][0]
-                contexto = tokenize_text(sentence)
-                contador = 0
-                for token in preprocess_question:
-                    if token in contexto:
-                        contador += 1
-                if contador >= max_contador:
-                    max_contador = contador
-                    response = sentence
-        return response
+        candidates = [
+            final_sentences[num_sentence]['S'][0]
+            for num_sentence in final_sentences
+            if len(final_sentences[num_sentence]['S']) == 1
+        ]
+        if len(candidates) == 0:
+            return responses
+
+        # Presenca dos tokens em cada frase (sentencas x vocabulario)
+        vocabulary = {}
+        sentences_tokens = [set(tokenize_text(sentence)) for sentence in candidates]
+        for tokens in sentences_tokens:
+            for token in tokens:
+                vocabulary.setdefault(token, len(vocabulary))
+        presence = np.zeros((len(candidates), len(vocabulary)), dtype=np.int32)
+        for num_sentence, tokens in enumerate(sentences_tokens):
+            presence[num_sentence, [vocabulary[token] for token in tokens]] = 1
+
+        # Contagem dos tokens de cada pergunta, com repeticoes (perguntas x vocabulario)
+        counts = np.zeros((len(questions), len(vocabulary)), dtype=np.int32)
+        for num_question, question in enumerate(questions):
+            for token in tokenize_text(question):
+                if token in vocabulary:
+                    counts[num_question, vocabulary[token]] += 1
+
+        # Contadores de todas as perguntas e frases; a ultima frase de maior contador vence
+        scores = counts @ presence.T
+        best = len(candidates) - 1 - np.argmax(scores[:, ::-1], axis=1)
+        return [candidates[num_sentence] for num_sentence in best]
     except Exception as e:
         print(e)
-        return response
+        return responses
+
+
+def symbolic_model(text, question, splitter):
+    return symbolic_model_batch(text, [question], splitter)[0]
 
 
 def question_answer(context, question, answer, splitter):
@@ -202,12 +233,16 @@ if __name__ == "__main__":
 
     answers = [i['text'] for i in valid_answers]
 
+    # Respondendo todas as perguntas de cada contexto de uma vez
     em_score_results = []
     f1_score_results = []
-    for context, question, answer in zip(valid_contexts, valid_questions, answers):
-        em_score, f1_score = question_answer(context, question, answer, splitter=splitter)
-        em_score_results.append(em_score)
-        f1_score_results.append(f1_score)
+    samples = list(zip(valid_contexts, valid_questions, answers))
+    for context, group in itertools.groupby(samples, key=lambda sample: sample[0]):
+        group = list(group)
+        predictions = symbolic_model_batch(context, [question for _, question, _ in group], splitter=splitter)
+        for prediction, (_, _, answer) in zip(predictions, group):
+            em_score_results.append(exact_match(prediction, answer))
+            f1_score_results.append(compute_f1(prediction, answer))
 
     print(f"Exact match: {np.asarray(em_score_results).mean()}")
     print(f"F1 score: {np.asarray(f1_score_results).mean()}")
@@ -0,0 +1,56 @@
+# General dependencies
+import os
+import streamlit as st
+
+# Local dependencies
+from source.pages.available_pages import Pages
+from source.utils.profiler import list_profiles, format_profile, PROFILES_DIRECTORY
+from source.models.inference_service import get_neural_service_metrics
+
+# Token of the hidden admin page, opened by "?admin=<token>"; disabled if not set
+ADMIN_TOKEN = os.environ.get("QA_GAME_ADMIN_TOKEN")
+
+def _go_to_home_page():
+    st.query_params.pop("admin", None)
+    st.session_state["current_page"] = Pages.HOME
+
+def generate_admin_page():
+    '''
+    Generates the hidden admin page, showing the profiles of the reruns
+    saved by the sessions with profiling enabled ("?profile=1") and the
+    metrics of the inference of the neural model.
+    '''
+    # Title
+    st.title("Administração")
+    st.divider()
+
+    # Profiles
+    profiles = list_profiles()
+    if len(profiles) == 0:
+        st.write("Nenhum perfil salvo em {}. Ative o perfilamento de uma sessão com \"?profile=1\".".format(PROFILES_DIRECTORY))
+    else:
+        cols = st.columns([3, 1, 1])
+        with cols[0]: profile = st.selectbox("Perfil:", profiles)
+        with cols[1]: sort_by = st.selectbox("Ordenar por:", ["cumulative", "tottime", "ncalls"])
+        with cols[2]: callees = st.toggle("Chamadas", help="Mostra as funções chamadas por cada função.")
+
+        # Report of the chosen profile
+        path = os.path.join(PROFILES_DIRECTORY, profile)
+        st.code(format_profile(path, sort_by, callees=callees), language=None)
+        with open(path, "rb") as fp:
+            st.download_button("Baixar perfil (.prof)", fp.read(), file_name=profile)
+
+    # Metrics of the micro-batching service of the neural model, if started
+    metrics = get_neural_service_metrics()
+    if metrics is not None:
+        st.divider()
+        st.subheader("Inferência do modelo neural")
+        cols = st.columns(4)
+        cols[0].metric("Fila", metrics["queue_depth"], help="Máximo: {}".format(metrics["max_queue_depth"]))
+        cols[1].metric("Requisições", metrics["requests"], help="Recusadas: {}, falhas: {}".format(metrics["rejected"], metrics["failed"]))
+        cols[2].metric("Lote médio", "{:.1f}".format(metrics["mean_batch_size"]), help="Lotes: {}".format(metrics["batches"]))
+        cols[3].metric("Espera média (ms)", "{:.1f}".format(metrics["mean_wait_ms"]), help="Lote médio: {:.1f} ms".format(metrics["mean_batch_ms"]))
+
+    # Return to title button
+    st.divider()
+    with st.columns(5)[-1]: st.button("Voltar à tela inicial", use_container_width=True, on_click=_go_to_home_page)
@@ -6,4 +6,17 @@ class Pages(Enum):
     GAME = 1
     RESULTS = 2
     LEADERBOARD = 3
-    CREDITS = 4
\ No newline at end of file
+    CREDITS = 4
+    ADMIN = 5
+
+# Module and function generating every page, imported only when the page is
+# shown (the None entry is the error page, for unknown pages)
+PAGE_GENERATORS = {
+    Pages.HOME: ("source.pages.title_page", "generate_title_page"),
+    Pages.GAME: ("source.pages.game_page", "generate_game_page"),
+    Pages.RESULTS: ("source.pages.result_page", "generate_results_page"),
+    Pages.LEADERBOARD: ("source.pages.leaderboard_page", "generate_leaderboard_page"),
+    Pages.CREDITS: ("source.pages.credits_page", "generate_credits_page"),
+    Pages.ADMIN: ("source.pages.admin_page", "generate_admin_page"),
+    None: ("source.pages.error_page", "generate_error_page"),
+}
\ No newline at end of file
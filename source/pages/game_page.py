@@ -4,103 +4,66 @@ import streamlit as st
 from text_highlighter import text_highlighter
 
 # Local dependencies
-from source.utils.answer_checker import check_answer_from_user_selections
+from source.utils.answer_records import get_selections_texts
 from source.pages.game_sidebar import generate_game_sidebar
 from source.pages.available_pages import Pages
+from source.engine.game_session import GameSession
+from source.utils.answer_events import AnswerEventLog, ANSWER_EVENTS_ENABLED
+
+
+@st.cache_resource
+def _load_answer_event_log() -> AnswerEventLog:
+    ''' Loads the log of the answers, shared by every session of the process. '''
+    return AnswerEventLog()
+
+
+def _log_answer(game: GameSession, correct: bool) -> None:
+    ''' Queues the answer just submitted to the log of the answers. '''
+    offsets = game.get_user_offsets()
+    _load_answer_event_log().append({
+        "timestamp": time.time(),
+        "game_id": game.game_id,
+        "user_name": game.user_name,
+        "corpus": game.corpus_name,
+        "question_id": game.question_id,
+        "selection_starts": [start for start, _ in offsets],
+        "selection_ends": [end for _, end in offsets],
+        "correct": correct,
+        "elapsed_seconds": time.time() - game.initial_time,
+    })
 
 
 def _go_to_previous_question():
-    st.session_state["selected_topic_idx"], st.session_state["selected_paragraph_idx"], st.session_state["selected_question_idx"] = st.session_state["dataset"].get_previous_question_indexes(
-        st.session_state["selected_topic"], 
-        st.session_state["selected_paragraph_idx"], 
-        st.session_state["selected_question_idx"])
+    st.session_state["game_session"].previous_question()
 
 
 def _go_to_next_question():
-    st.session_state["selected_topic_idx"], st.session_state["selected_paragraph_idx"], st.session_state["selected_question_idx"] = st.session_state["dataset"].get_next_question_indexes(
-        st.session_state["selected_topic"], 
-        st.session_state["selected_paragraph_idx"], 
-        st.session_state["selected_question_idx"])
+    st.session_state["game_session"].next_question()
 
 
 def _finish_game():
-    if len(st.session_state.user_textual_answers) > 0:
-        states_to_clear = [
-            "selected_topic",
-            "selected_topic_idx",
-            "selected_paragraph_idx",
-            "selected_question_idx",
-        ]
-        for state in states_to_clear:
-            del st.session_state[state]
+    if st.session_state["game_session"].num_answered > 0:
         st.session_state["current_page"] = Pages.RESULTS
     else:
         st.error("Nenhuma resposta foi submetida.")
 
 
-def generate_game_page():
+@st.fragment
+def _generate_question_panel():
     '''
-    Generates the page of the main game.
-
-    Session state dependencies:
-    --------------------------
-
-    dataset: FaquadDataset
-        The dataset for the QA Game.
-
-    selected_topic: str
-        The name of the topic selected by the user.
-    
-    selected_topic_idx: int
-        The index of the topic being selected.
-    
-    selected_paragraph_idx: int
-        The index of the paragraph selected by the user.
-    
-    selected_question_idx: int
-        The index of the question selected by the user.
-    
-    user_answered: dict[tuple[int,int,int], bool]
-        Indicates, for a tuple of indexes of a topic, a paragraph and 
-        a question, if the user already answered the question.
-    
-    user_correct_answers: dict[tuple[int,int,int], bool]
-        Indicates, for a tuple of indexes of a topic, a paragraph and 
-        a question, if the user correctly answered the question.
-    
-    user_textual_answers: dict[tuple[int,int,int], list[str]]
-        Indicates, for a tuple of indexes of a topic, a paragraph and 
-        a question, the textual answer of the user.
-    
-    Session state outputs:
-    ---------------------
-
-    initial_time: float
-        The time in which the game started.
+    Generates the context highlighter, the answer panel and the question
+    buttons. Being a fragment, highlighting the context only reruns this
+    panel; navigating and submitting rerun the whole page, since the
+    sidebar depends on them.
     '''
-    # Sidebar
-    generate_game_sidebar()
-
-    # Gets the variables from the session state
-    dataset = st.session_state["dataset"]
-    selected_topic = st.session_state["selected_topic"]
-    selected_topic_idx = st.session_state["selected_topic_idx"]
-    selected_paragraph_idx = st.session_state["selected_paragraph_idx"]
-    selected_question_idx = st.session_state["selected_question_idx"]
+    # Gets the game from the session state
+    game = st.session_state["game_session"]
+    context = game.context
 
     # Control flags
-    user_answered: bool = st.session_state.user_answered[(
-        selected_topic_idx, selected_paragraph_idx, selected_question_idx)]
+    user_answered: bool = game.answered
     answer_submitted: bool = False
 
-    # Time control
-    if "initial_time" not in st.session_state:
-        st.session_state["initial_time"] = time.perf_counter()
-
-    # Title
-    st.header("**Jogo de Perguntas e Respostas**")
-    st.divider()
-
     # Body columns
     col1, col2 = st.columns([3, 2], gap="large")
 
@@ -113,8 +76,9 @@ def generate_game_page():
         st.text("")
         st.write("**Contexto:**")
         user_selections = text_highlighter (
-            dataset.get_context(selected_topic, selected_paragraph_idx), 
-            labels = [("", "#b84e42")]
+            context,
+            labels = [("", "#b84e42")],
+            key = "context_highlighter_{}".format(game.question_id)
         )
 
     # Second column
@@ -122,9 +86,18 @@ def generate_game_page():
 
         # Question display
         st.write("**Pergunta:**")
-        st.write(dataset.get_question(selected_topic, selected_paragraph_idx, selected_question_idx))
+        st.write(game.question)
+
+        # Statistics of the question across every player
+        if game.question_stats is not None:
+            stats = game.question_stats.get(game.indexes)
+            if stats["attempts"] > 0:
+                st.caption("Acertada em {:.0%} das {} tentativas dos jogadores (F1 médio de {:.2f}).".format(
+                    stats["hit_rate"], stats["attempts"], stats["mean_f1"]))
+            else:
+                st.caption("Ainda não respondida por nenhum jogador.")
         st.divider()
-        
+
         # Answer display
         st.write("**Sua resposta:**")
 
@@ -135,14 +108,13 @@ def generate_game_page():
                     st.write(answer["text"])
             else:
                 st.write("...")
-        
+
         # If the user already answered
         else:
-            user_selections = st.session_state.user_textual_answers[(
-                selected_topic_idx, selected_paragraph_idx, selected_question_idx)]
-            if len(user_selections) > 0:
-                for answer in sorted(user_selections, key=lambda x: x["start"]):
-                    st.write(answer["text"])
+            user_offsets = game.get_user_offsets()
+            if len(user_offsets) > 0:
+                for answer in get_selections_texts(context, user_offsets):
+                    st.write(answer)
             else:
                 st.write("...")
 
@@ -153,58 +125,65 @@ def generate_game_page():
         bcol1, bcol2, bcol3 = st.columns(3)
 
         # Button for going to previous question
-        with bcol1: st.button("Questão anterior", on_click=_go_to_previous_question)
+        with bcol1:
+            if st.button("Questão anterior", on_click=_go_to_previous_question):
+                st.rerun()
 
         # Button for answer checking
         with bcol2: answer_submitted = st.button("Submeter resposta", disabled=user_answered, type="primary")
 
         # Button for going to next question
-        with bcol3: st.button("Próxima questão", on_click=_go_to_next_question)
+        with bcol3:
+            if st.button("Próxima questão", on_click=_go_to_next_question):
+                st.rerun()
 
     # Divider between sections
     st.divider()
 
-    # Show only if given a new answer
-    if answer_submitted is True and st.session_state.user_answered[(
-            selected_topic_idx, selected_paragraph_idx, selected_question_idx
-        )] is False:
-
-        # Updates the answer control flag
-        st.session_state.user_answered[(
-            selected_topic_idx, selected_paragraph_idx, selected_question_idx
-        )] = True
+    # Submits a new answer and reruns the whole page to update the score
+    if answer_submitted is True and game.answered is False:
+        st.session_state["celebrate_answer"] = game.submit(user_selections)
+        if ANSWER_EVENTS_ENABLED:
+            _log_answer(game, st.session_state["celebrate_answer"])
+        st.rerun()
 
-        # Updates the user textual answer
-        st.session_state.user_textual_answers[(
-            selected_topic_idx, selected_paragraph_idx, selected_question_idx
-        )] = user_selections
-
-        # Gets all available answers for the question
-        question_answers = dataset.get_answers(selected_topic, selected_paragraph_idx, selected_question_idx)
-
-        # Checks the current_answer
-        correct = check_answer_from_user_selections(user_selections, question_answers)
-        if correct is True:
-            st.balloons()
-            st.success("Respondido corretamente!")
-            st.session_state.user_correct_answers[(
-                selected_topic_idx, selected_paragraph_idx, selected_question_idx
-            )] = True
-        else:
-            st.error("Respondido incorretamente (;-;)")
-            st.session_state.user_correct_answers[(
-                selected_topic_idx, selected_paragraph_idx, selected_question_idx
-            )] = False
-    
     # Show instead if already answered
     elif user_answered is True:
-        if st.session_state.user_correct_answers[(
-            selected_topic_idx, selected_paragraph_idx, selected_question_idx
-        )] is True:
+        if game.correct is True:
+            if st.session_state.pop("celebrate_answer", False) is True:
+                st.balloons()
             st.success("Respondido corretamente!")
         else:
             st.error("Respondido incorretamente (;-;)")
-    
+
+
+def generate_game_page():
+    '''
+    Generates the page of the main game.
+
+    Session state dependencies:
+    --------------------------
+
+    game_session: GameSession
+        The engine of the current game.
+
+    Session state outputs:
+    ---------------------
+
+    celebrate_answer: bool
+        Indicates if the answer just submitted was correct,
+        so its celebration is shown once after the rerun.
+    '''
+    # Sidebar
+    generate_game_sidebar()
+
+    # Title
+    st.header("**Jogo de Perguntas e Respostas**")
+    st.divider()
+
+    # Context, answer and question buttons
+    _generate_question_panel()
+
     # Finish button
     st.write("###")
-    with st.columns(5)[-1]: st.button("Finalizar Jogo", use_container_width=True, on_click=_finish_game)
\ No newline at end of file
+    with st.columns(5)[-1]: st.button("Finalizar Jogo", use_container_width=True, on_click=_finish_game)
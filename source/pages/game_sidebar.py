@@ -1,117 +1,124 @@
 # General dependencies
-import numpy as np
 import streamlit as st
-from collections import defaultdict
 
 def _reset_question_and_paragraph():
-    st.session_state["selected_paragraph_idx"] = 0
-    st.session_state["selected_question_idx"] = 0
+    game = st.session_state["game_session"]
+    game.select_question(game.topic_idx, 0, 0)
 
 def _reset_question():
-    st.session_state["selected_question_idx"] = 0
+    game = st.session_state["game_session"]
+    game.select_question(game.topic_idx, game.paragraph_idx, 0)
+
+def _get_question_text(dataset, question_id: int) -> str:
+    title_idx, paragraph, question = dataset.get_question_indexes(question_id)
+    return dataset.get_question(dataset.sorted_titles[title_idx], paragraph, question)
+
+def _go_to_search_result():
+    game = st.session_state["game_session"]
+    if st.session_state["search_result"] is not None:
+        game.select_question(*game.dataset.get_question_indexes(st.session_state["search_result"]))
 
 def generate_game_sidebar():
-    ''' 
+    '''
     Generates the sidebar for the QA Game.
 
     Session state dependencies:
     --------------------------
 
-    dataset: FaquadDataset
-        The dataset for the QA Game.
-    
+    game_session: GameSession
+        The engine of the current game, whose selected
+        question is updated by the sidebar.
+
     Session state outputs:
     ---------------------
 
-    selected_topic: str
-        The name of the topic selected by the user.
-    
-    selected_topic_idx: int
-        The index of the topic being selected.
-    
-    selected_paragraph_idx: int
-        The index of the paragraph selected by the user.
-    
-    selected_question_idx: int
-        The index of the question selected by the user.
-    
-    user_answered: dict[tuple[int,int,int], bool]
-        Indicates, for a tuple of indexes of a topic, a paragraph and 
-        a question, if the user already answered the question.
-    
-    user_correct_answers: dict[tuple[int,int,int], bool]
-        Indicates, for a tuple of indexes of a topic, a paragraph and 
-        a question, if the user correctly answered the question.
-    
-    user_textual_answers: dict[tuple[int,int,int], list[str]]
-        Indicates, for a tuple of indexes of a topic, a paragraph and 
-        a question, the textual answer of the user.
+    search_query: str
+        The search of questions typed by the user.
+
+    search_result: int | None
+        The global id of the question chosen among the results of
+        the search, along with the query of the results
+        ("search_result_query").
     '''
-    # Gets the dataset stored in the session state
-    dataset = st.session_state.dataset
-
-    # Generates the dict of answers if it does not exist yey
-    if "user_answered" not in st.session_state:
-        st.session_state["user_answered"] = defaultdict(bool)
-    if "user_correct_answers" not in st.session_state:
-        st.session_state["user_correct_answers"] = defaultdict(bool)
-    if "user_textual_answers" not in st.session_state:
-        st.session_state["user_textual_answers"] = defaultdict(list)
-    
+    # Gets the game stored in the session state
+    game = st.session_state["game_session"]
+    dataset = game.dataset
+
     # Sidebar: title
     st.sidebar.title("Seleção de Sessão")
 
+    # Sidebar: search of questions and contexts
+    query = st.sidebar.text_input("Buscar perguntas:", key="search_query")
+    if query.strip() != "":
+        results = [question_id for question_id, _ in dataset.search_index.search(query)]
+
+        # A single key for the results of every query; the selection is kept while it is among the results
+        if st.session_state.get("search_result_query") != query:
+            st.session_state["search_result_query"] = query
+            if st.session_state.get("search_result") not in results:
+                st.session_state["search_result"] = None
+        if len(results) > 0:
+            st.sidebar.selectbox (
+                "Resultados da busca:",
+                results,
+                format_func=lambda x: _get_question_text(dataset, x),
+                index=None,
+                placeholder="Escolha uma pergunta",
+                key="search_result",
+                on_change=_go_to_search_result)
+        else:
+            st.sidebar.write("Nenhuma pergunta encontrada.")
+
     # Topics
-    topics = dataset.titles
+    topics = dataset.sorted_titles
     topics_indexes = list(range(len(topics)))
-    if "selected_topic" not in st.session_state: st.session_state["selected_topic"] = topics[0]
-    if "selected_topic_idx" not in st.session_state: st.session_state["selected_topic_idx"] = 0
 
     # Sidebar: topic selection
-    st.session_state["selected_topic_idx"] = st.sidebar.selectbox (
-        "Selecione um tópico:", 
-        topics_indexes, 
-        format_func=lambda x: topics[x], 
-        index=st.session_state["selected_topic_idx"], 
+    topic_idx = st.sidebar.selectbox (
+        "Selecione um tópico:",
+        topics_indexes,
+        format_func=lambda x: topics[x],
+        index=game.topic_idx,
         on_change=_reset_question_and_paragraph)
-    
-    # Name of the topic
-    st.session_state["selected_topic"] = topics[st.session_state["selected_topic_idx"]]
 
     # Paragraphs (contexts)
-    paragraph_previews: list[str] = dataset.get_paragraphs_previews(st.session_state["selected_topic"])
+    paragraph_previews: list[str] = dataset.get_paragraphs_previews(topics[topic_idx])
     paragraph_indexes = list(range(len(paragraph_previews)))
-    if "selected_paragraph_idx" not in st.session_state: st.session_state["selected_paragraph_idx"] = 0
 
     # Sidebar: context selection
-    st.session_state["selected_paragraph_idx"] = st.sidebar.selectbox (
-        "Selecione um contexto:", 
-        paragraph_indexes, 
-        format_func=lambda x: paragraph_previews[x], 
-        index=st.session_state["selected_paragraph_idx"], 
+    paragraph_idx = st.sidebar.selectbox (
+        "Selecione um contexto:",
+        paragraph_indexes,
+        format_func=lambda x: paragraph_previews[x],
+        index=game.paragraph_idx,
         on_change=_reset_question)
-    
+
     # Questions
-    questions_previews: list[str] = dataset.get_questions_previews(st.session_state["selected_topic"], st.session_state["selected_paragraph_idx"])
+    questions_previews: list[str] = dataset.get_questions_previews(topics[topic_idx], paragraph_idx)
+
+    # Hit rates of the questions across every player, along their previews
+    if game.question_stats is not None:
+        questions_previews = list(questions_previews)
+        for idx in range(len(questions_previews)):
+            hit_rate = game.question_stats.get((topic_idx, paragraph_idx, idx))["hit_rate"]
+            if hit_rate is not None:
+                questions_previews[idx] = "{} ({:.0%} de acerto)".format(questions_previews[idx], hit_rate)
     questions_indexes = list(range(len(questions_previews)))
-    if "selected_question_idx" not in st.session_state: st.session_state["selected_question_idx"] = 0
 
     # Sidebar: question selection
-    st.session_state["selected_question_idx"] = st.sidebar.selectbox (
-        "Selecione uma pergunta:", 
-        questions_indexes, 
-        format_func=lambda x: questions_previews[x], 
-        index=st.session_state["selected_question_idx"])
-    
-    # User performance data
-    user_answers = np.array(list(st.session_state["user_correct_answers"].values()))
-    num_correct_answers = user_answers.sum()
-    num_incorrect_answers = len(user_answers) - num_correct_answers
+    question_idx = st.sidebar.selectbox (
+        "Selecione uma pergunta:",
+        questions_indexes,
+        format_func=lambda x: questions_previews[x],
+        index=game.question_idx)
+
+    # Updates the selected question
+    game.select_question(topic_idx, paragraph_idx, question_idx)
 
     # User performance display
-    if len(user_answers) > 0:
+    if game.num_answered > 0:
         with st.sidebar:
             st.divider()
             st.title("Pontuação Atual")
-            st.write("Acertos: {}".format(num_correct_answers))
-            st.write("Erros: {}".format(num_incorrect_answers))
\ No newline at end of file
+            st.write("Acertos: {}".format(game.num_correct))
+            st.write("Erros: {}".format(game.num_answered - game.num_correct))
@@ -3,10 +3,37 @@ import streamlit as st
 
 # Local dependencies
 from source.pages.available_pages import Pages
+from source.engine.game_session import GameSession
+from source.engine.question_scheduler import ORDERINGS
+from source.utils.load_dataset import load_dataset, load_corpus_registry, load_question_stats, load_warmup, DEFAULT_CORPUS
+from source.utils.warmup import WarmUp
+
+# Names of the orderings of the questions shown to the user
+_ORDERINGS_NAMES = {
+    "sequential": "Sequencial",
+    "shuffled": "Aleatória",
+    "difficulty": "Por dificuldade",
+    "hit_rate": "Por taxa de acerto dos jogadores",
+}
 
 def _go_to_game_page():
+    corpus_name = st.session_state.get("corpus_name", DEFAULT_CORPUS)
+    corpus = load_dataset(corpus_name)
+    st.session_state["game_session"] = GameSession(
+        corpus.dataset, 
+        corpus.model_answers, 
+        user_name=st.session_state["user_name"],
+        ordering=st.session_state.get("question_ordering", "sequential"),
+        corpus_name=corpus_name,
+        question_stats=load_question_stats(corpus),
+        corpus_digest=corpus.digest)
     st.session_state["current_page"] = Pages.GAME
 
+def _rerun_when_ready(warmup: WarmUp) -> None:
+    ''' Reruns the page once the warm-up of the server is done. '''
+    if warmup.ready:
+        st.rerun()
+
 def _go_to_leaderboard():
     st.session_state["current_page"] = Pages.LEADERBOARD
 
@@ -22,7 +49,19 @@ def generate_title_page():
 
     user_name: str
         The name chosen by the user.
+
+    corpus_name: str
+        The name of the corpus chosen by the user.
+
+    question_ordering: str
+        The order of the questions chosen by the user.
+
+    game_session: GameSession
+        The engine of the new game, created once it is started.
     '''
+    # Games only start once the server is warm
+    warmup = load_warmup()
+    warming = warmup is not None and not warmup.ready
 
     # Title and its divider
     st.markdown("<h1 style='text-align: center;'>Jogo de Perguntas e Respostas</h1>", unsafe_allow_html=True)
@@ -34,8 +73,27 @@ def generate_title_page():
         # User name selection
         st.session_state["user_name"] = st.text_input("Escolha um nome de usuário:", "Convidado", max_chars=32)
 
-        # Start game button
-        st.button("Iniciar novo jogo", use_container_width=True, on_click=_go_to_game_page, type="primary")
+        # Corpus selection (loaded only when the game starts)
+        registry = load_corpus_registry()
+        st.selectbox(
+            "Escolha o conjunto de perguntas:", 
+            registry.names, 
+            index = registry.names.index(DEFAULT_CORPUS), 
+            format_func = registry.get_label, 
+            key = "corpus_name")
+
+        # Ordering of the questions
+        st.selectbox(
+            "Ordem das perguntas:", 
+            ORDERINGS, 
+            format_func = _ORDERINGS_NAMES.get, 
+            key = "question_ordering")
+
+        # Start game button, along with the progress of the warm-up (checked every second)
+        st.button("Iniciar novo jogo", use_container_width=True, on_click=_go_to_game_page, type="primary", disabled=warming)
+        if warming:
+            st.caption("Preparando o servidor ({})...".format(warmup.status["progress"]))
+            st.fragment(_rerun_when_ready, run_every=1)(warmup)
 
         # Go to leaderboard button
         st.button("Placar de líderes", use_container_width=True, on_click=_go_to_leaderboard)
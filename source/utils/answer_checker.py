@@ -2,6 +2,9 @@
 import re
 import itertools
 
+# Local dependencies
+from source.models.metrics import normalize_text
+
 def remove_white_spaces(string):
     ''' Removes white spaces from strings '''
     pattern = re.compile(r'\s+')
@@ -23,4 +26,10 @@ def check_answer_from_user_selections(user_selections: list[dict], question_answ
 
 def check_answer_from_text(answer: str, truth: str) -> bool:
     ''' Checks if an answer is correct. '''
-    return re.search(truth, answer) is not None
\ No newline at end of file
+    return re.search(truth, answer) is not None
+
+
+def check_answer_from_model_output(answer: str, truths: list[str]) -> bool:
+    ''' Checks if the answer of a model contains, once normalized, any of the expected answers. '''
+    answer = normalize_text(answer)
+    return len(answer) > 0 and any(normalize_text(truth) in answer for truth in truths)
\ No newline at end of file
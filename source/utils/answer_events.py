@@ -0,0 +1,378 @@
+'''
+Append-only log of the answers submitted in the game.
+
+Every submission becomes an event (see `ANSWER_EVENT_FIELDS`) handed to
+`AnswerEventLog.append`, which only puts it in a bounded queue: a
+background thread writes the queued events as JSON lines to the active
+segment of the process, "<directory>/<name>.jsonl.active". Segments are
+rotated by size and by age, becoming "<name>.jsonl", and the sealed
+segments are compacted into Parquet files, "<directory>/<name>.parquet",
+read by `load_answer_events` without replaying any session. Segments
+claimed by a compaction whose process died are compacted again.
+
+Usage:
+-----
+
+    python -m source.utils.answer_events compact
+    python -m source.utils.answer_events summary
+'''
+# General dependencies
+import os
+import sys
+import glob
+import json
+import time
+import queue
+import atexit
+import argparse
+import itertools
+import threading
+
+# Directory of the log of the answers
+ANSWER_EVENTS_DIRECTORY = os.environ.get("QA_GAME_ANSWER_EVENTS_DIRECTORY", "./data/answer_events")
+
+# Logs the answers of the game
+ANSWER_EVENTS_ENABLED = os.environ.get("QA_GAME_ANSWER_EVENTS", "1") == "1"
+
+# Rotation of the active segments, by size (in MB) and by age (in seconds)
+ANSWER_EVENTS_SEGMENT_MB = float(os.environ.get("QA_GAME_ANSWER_EVENTS_SEGMENT_MB", "16"))
+ANSWER_EVENTS_SEGMENT_SECONDS = float(os.environ.get("QA_GAME_ANSWER_EVENTS_SEGMENT_SECONDS", "3600"))
+
+# Fields of every event, with their Parquet (Arrow) types
+ANSWER_EVENT_FIELDS = {
+    "timestamp": "float64",            # wall clock of the submission
+    "game_id": "string",               # id of the game (`GameSession.game_id`)
+    "user_name": "string",
+    "corpus": "string",                # name of the corpus of the question
+    "question_id": "int32",            # global id of the question in its corpus
+    "selection_starts": "list<int32>", # offsets of the selections of the user
+    "selection_ends": "list<int32>",
+    "correct": "bool",
+    "elapsed_seconds": "float64",      # time since the start of the game
+}
+
+
+# Sequence of the segments of the process
+_SEGMENT_COUNTER = itertools.count()
+
+# Compactions of the process, one at a time
+_COMPACTION_LOCK = threading.Lock()
+
+
+def _segment_name() -> str:
+    ''' Returns a new segment name, unique among the processes writing to the same directory. '''
+    return "answers-{}-{}-{:04d}".format(time.strftime("%Y%m%d-%H%M%S"), os.getpid(), next(_SEGMENT_COUNTER))
+
+
+def _get_schema():
+    import pyarrow as pa
+    types = {"float64": pa.float64(), "string": pa.string(), "int32": pa.int32(), "bool": pa.bool_(), "list<int32>": pa.list_(pa.int32())}
+    return pa.schema([(name, types[kind]) for name, kind in ANSWER_EVENT_FIELDS.items()])
+
+
+def _read_segment(path: str) -> list[dict]:
+    ''' Reads the events of a segment, skipping a truncated last line. '''
+    events = []
+    with open(path, "r", encoding="utf-8") as fp:
+        for line in fp:
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return events
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _get_claims(directory: str) -> dict[int, list[str]]:
+    ''' Returns the segments claimed by the compactions of every process, "<name>.jsonl.compacting-<pid>". '''
+    claims = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl.compacting-*"))):
+        pid = path.rpartition("-")[2]
+        if pid.isdigit():
+            claims.setdefault(int(pid), []).append(path)
+    return claims
+
+
+def _get_parquet_path(claims: list[str]) -> str:
+    ''' Returns the path of the Parquet file of a compaction, named after its first claimed segment. '''
+    name = os.path.basename(claims[0]).split(".jsonl")[0]
+    return os.path.join(os.path.dirname(claims[0]), name + ".parquet")
+
+
+def _recover_claims(directory: str) -> None:
+    '''
+    Releases the segments claimed by compactions that died: removed if
+    their Parquet file was written, sealed again otherwise. Runs under
+    the compaction lock, so claims of this process are orphans too.
+    '''
+    for pid, claims in _get_claims(directory).items():
+        if pid != os.getpid() and _is_alive(pid):
+            continue
+        compacted = os.path.isfile(_get_parquet_path(claims))
+        for claim in claims:
+            try:
+                if compacted:
+                    os.remove(claim)
+                else:
+                    os.rename(claim, claim.rpartition(".compacting-")[0])
+            except OSError:
+                continue
+
+
+def compact_segments(directory: str = ANSWER_EVENTS_DIRECTORY) -> str | None:
+    '''
+    Compacts the sealed segments of a directory into a single Parquet
+    file, removing them. Every segment is claimed by renaming it first,
+    so several processes may compact the same directory at once; the
+    segments left claimed by dead processes are recovered first.
+
+    Returns:
+    -------
+
+    path: str | None
+        The path of the new Parquet file, if any segment was compacted.
+    '''
+    with _COMPACTION_LOCK:
+        _recover_claims(directory)
+        return _compact_claimed(directory)
+
+
+def _compact_claimed(directory: str) -> str | None:
+    # Claims the sealed segments
+    claimed = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        claim = "{}.compacting-{}".format(path, os.getpid())
+        try:
+            os.rename(path, claim)
+        except OSError:
+            continue
+        claimed.append(claim)
+    if len(claimed) == 0:
+        return None
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Columns of every event of the claimed segments
+    events = [event for path in claimed for event in _read_segment(path)]
+    columns = {name: [event.get(name) for event in events] for name in ANSWER_EVENT_FIELDS}
+    table = pa.Table.from_pydict(columns, schema=_get_schema())
+
+    # Written aside and renamed, so readers never see a partial file
+    path = _get_parquet_path(claimed)
+    pq.write_table(table, path + ".tmp", compression="zstd")
+    os.replace(path + ".tmp", path)
+    for claim in claimed:
+        os.remove(claim)
+    return path
+
+
+class AnswerEventLog:
+    '''
+    Buffered, non-blocking writer of the answer events of a process.
+
+    Parameters:
+    ----------
+
+    directory: str
+        The directory of the segments and of the Parquet files.
+
+    segment_bytes: int
+        The size from which the active segment is rotated.
+
+    segment_seconds: float
+        The age from which the active segment is rotated.
+
+    buffer_size: int
+        The maximum number of queued events; events appended to a full
+        queue are dropped (and counted), never blocking the caller.
+
+    compact: bool
+        Compacts the sealed segments on every rotation, in a thread of
+        its own.
+    '''
+    def __init__(
+        self,
+        directory: str = ANSWER_EVENTS_DIRECTORY,
+        segment_bytes: int = int(ANSWER_EVENTS_SEGMENT_MB * 2**20),
+        segment_seconds: float = ANSWER_EVENTS_SEGMENT_SECONDS,
+        buffer_size: int = 10000,
+        compact: bool = True
+    ) -> None:
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.compact = compact
+        self.num_dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=buffer_size)
+        self._segment = None
+        self._segment_path: str | None = None
+        self._segment_start = 0.0
+        self._closed = False
+        self._compaction: threading.Thread | None = None
+        self._thread = threading.Thread(target=self._run, name="answer-events", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+        # Seals again the segments of the compactions that died before, for the next one
+        if os.path.isdir(directory):
+            with _COMPACTION_LOCK:
+                _recover_claims(directory)
+
+    def append(self, event: dict) -> bool:
+        ''' Queues an event to be written, returning False if it was dropped. '''
+        if self._closed:
+            return False
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.num_dropped += 1
+            return False
+
+    def flush(self, timeout: float | None = None) -> None:
+        ''' Waits for the queued events to be written. '''
+        # Nothing writes the events once the log is closed or its thread is gone
+        if self._closed or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._queue.put(done, timeout=timeout)
+
+        # Stops waiting if the thread dies before writing the events
+        while not done.wait(1.0 if deadline is None else min(1.0, max(0.0, deadline - time.monotonic()))):
+            if not self._thread.is_alive() or (deadline is not None and time.monotonic() >= deadline):
+                return
+
+    def close(self) -> None:
+        ''' Writes the queued events, seals the active segment and waits for a running compaction. '''
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self._compaction is not None:
+            self._compaction.join()
+
+    def _run(self) -> None:
+        while True:
+            # Waits for an event, rotating old segments meanwhile
+            try:
+                item = self._queue.get(timeout=min(self.segment_seconds, 60))
+            except queue.Empty:
+                self._rotate_if_needed()
+                continue
+
+            # Writes every event already queued at once
+            items = [item]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = [json.dumps(event, ensure_ascii=False) + "\n" for event in items if isinstance(event, dict)]
+            if len(lines) > 0:
+                self._open_segment()
+                self._segment.write("".join(lines))
+                self._segment.flush()
+            self._rotate_if_needed()
+
+            # Flush and close requests
+            for event in items:
+                if isinstance(event, threading.Event):
+                    event.set()
+            if any(event is None for event in items):
+                self._seal_segment()
+                return
+
+    def _open_segment(self) -> None:
+        if self._segment is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._segment_path = os.path.join(self.directory, _segment_name() + ".jsonl.active")
+            self._segment = open(self._segment_path, "a", encoding="utf-8")
+            self._segment_start = time.time()
+
+    def _rotate_if_needed(self) -> None:
+        if self._segment is None:
+            return
+        if self._segment.tell() >= self.segment_bytes or time.time() - self._segment_start >= self.segment_seconds:
+            self._seal_segment()
+
+            # Compacts in its own thread, so the queue keeps being written meanwhile
+            # (the segments sealed during a compaction are left to the next one)
+            if self.compact and (self._compaction is None or not self._compaction.is_alive()):
+                self._compaction = threading.Thread(target=self._compact, name="answer-events-compaction", daemon=True)
+                self._compaction.start()
+
+    def _compact(self) -> None:
+        try:
+            compact_segments(self.directory)
+        except Exception as exception:
+            print("Compaction of the answer events failed: {}".format(exception), file=sys.stderr)
+
+    def _seal_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            os.replace(self._segment_path, self._segment_path[:-len(".active")])
+            self._segment = self._segment_path = None
+
+
+def load_answer_events(directory: str = ANSWER_EVENTS_DIRECTORY, include_segments: bool = True):
+    '''
+    Loads the logged events as an Arrow table: the compacted Parquet
+    files and, optionally, the segments not compacted yet (including
+    the ones claimed by a compaction that did not write its file).
+    '''
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _get_schema()
+    tables = [pq.read_table(path, schema=schema) for path in sorted(glob.glob(os.path.join(directory, "*.parquet")))]
+    if include_segments:
+        paths = glob.glob(os.path.join(directory, "*.jsonl")) + glob.glob(os.path.join(directory, "*.jsonl.active"))
+        paths += [claim for claims in _get_claims(directory).values() if not os.path.isfile(_get_parquet_path(claims)) for claim in claims]
+        events = [event for path in sorted(paths) for event in _read_segment(path)]
+        if len(events) > 0:
+            tables.append(pa.Table.from_pydict({name: [event.get(name) for event in events] for name in ANSWER_EVENT_FIELDS}, schema=schema))
+    return pa.concat_tables(tables) if tables else schema.empty_table()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Log of the answers of the QA Game.")
+    parser.add_argument("command", choices=("compact", "summary"))
+    parser.add_argument("--directory", default=ANSWER_EVENTS_DIRECTORY)
+    parser.add_argument("--limit", type=int, default=20, help="questions shown by the summary")
+    args = parser.parse_args()
+
+    # Compacts the sealed segments
+    if args.command == "compact":
+        path = compact_segments(args.directory)
+        print("Compacted into {}".format(path) if path else "No sealed segment to compact")
+        return
+
+    # Accuracy and time of the most answered questions
+    start = time.perf_counter()
+    table = load_answer_events(args.directory)
+    summary = table.group_by(["corpus", "question_id"]).aggregate([
+        ("correct", "count"), ("correct", "mean"), ("elapsed_seconds", "mean")
+    ]).sort_by([("correct_count", "descending")])
+    elapsed = time.perf_counter() - start
+
+    print("{} answers of {} games, summarized in {:.2f} s".format(table.num_rows, len(table.column("game_id").unique()), elapsed))
+    print("{:<10}{:>10}{:>10}{:>10}{:>14}".format("corpus", "question", "answers", "accuracy", "mean time (s)"))
+    for row in summary.slice(0, args.limit).to_pylist():
+        print("{:<10}{:>10}{:>10}{:>10.2f}{:>14.1f}".format(
+            str(row["corpus"]), row["question_id"], row["correct_count"], row["correct_mean"], row["elapsed_seconds_mean"]))
+
+
+if __name__ == "__main__":
+    main()
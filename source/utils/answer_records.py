@@ -0,0 +1,115 @@
+# General dependencies
+import base64
+from array import array
+from typing import Iterator
+
+# Flags of an answer
+_CORRECT = 1
+
+class AnswerRecords:
+    '''
+    Compact records of the answers submitted by a user.
+
+    Every answer is stored as the global id of its question (see
+    `FaquadDataset.get_question_id`), a byte of flags (whether it is
+    correct) and the (start, end) offsets of the selections made over
+    the context, all of them held in typed arrays. The selected text is
+    not stored: it is rebuilt on demand from the context, which is
+    shared by every session.
+    '''
+    def __init__(self) -> None:
+
+        # Global ids of the answered questions and their flags
+        self._question_ids = array("i")
+        self._flags = array("b")
+
+        # Every answer owns the selections in [_bounds[i], _bounds[i+1])
+        self._bounds = array("i", [0])
+
+        # Flattened (start, end) pairs of the selections
+        self._offsets = array("i")
+
+        # Position of every answered question in the records, so lookups do not scan them
+        self._positions: dict[int, int] = {}
+        self._num_correct = 0
+
+    def __len__(self) -> int:
+        return len(self._question_ids)
+
+    def __contains__(self, question_id: int) -> bool:
+        return question_id in self._positions
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._question_ids)
+
+    @property
+    def num_correct(self) -> int:
+        ''' The number of correct answers. '''
+        return self._num_correct
+
+    def add(self, question_id: int, user_selections: list[dict], correct: bool = False) -> None:
+        '''
+        Records the selections of the user for a question, and if they
+        are correct. Only the "start" and "end" of every selection are
+        kept, sorted by start.
+        '''
+        if question_id in self._positions:
+            raise ValueError("question {} was already answered".format(question_id))
+        for selection in sorted(user_selections, key=lambda x: x["start"]):
+            self._offsets.extend((selection["start"], selection["end"]))
+        self._positions[question_id] = len(self._question_ids)
+        self._question_ids.append(question_id)
+        self._flags.append(_CORRECT if correct else 0)
+        self._num_correct += bool(correct)
+        self._bounds.append(len(self._offsets) // 2)
+
+    def is_correct(self, question_id: int) -> bool:
+        ''' Indicates if a question was answered correctly (False for questions not answered). '''
+        position = self._positions.get(question_id)
+        return position is not None and bool(self._flags[position] & _CORRECT)
+
+    def get_offsets(self, question_id: int) -> list[tuple[int, int]]:
+        ''' Returns the (start, end) pairs of the selections for an answered question. '''
+        if question_id not in self._positions:
+            raise ValueError("question {} was not answered".format(question_id))
+        return self._get_offsets_at(self._positions[question_id])
+
+    def items(self) -> Iterator[tuple[int, list[tuple[int, int]]]]:
+        ''' Iterates through every answer as pairs of question id and selection offsets. '''
+        for answer_idx, question_id in enumerate(self._question_ids):
+            yield question_id, self._get_offsets_at(answer_idx)
+
+    def to_state(self) -> dict[str, str]:
+        ''' Returns the typed arrays of the records as base64 strings, for serialization. '''
+        return {
+            name: base64.b64encode(getattr(self, "_" + name).tobytes()).decode("ascii")
+            for name in ("question_ids", "flags", "bounds", "offsets")
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, str]) -> "AnswerRecords":
+        ''' Rebuilds the records from the output of `to_state`. '''
+        records = cls()
+        for name in ("question_ids", "flags", "bounds", "offsets"):
+            values = array("b" if name == "flags" else "i")
+            values.frombytes(base64.b64decode(state[name]))
+            setattr(records, "_" + name, values)
+        records._positions = {question_id: answer_idx for answer_idx, question_id in enumerate(records._question_ids)}
+        records._num_correct = sum(bool(flags & _CORRECT) for flags in records._flags)
+        return records
+
+    def _get_offsets_at(self, answer_idx: int) -> list[tuple[int, int]]:
+        return [
+            (self._offsets[2*sel_idx], self._offsets[2*sel_idx + 1])
+            for sel_idx in range(self._bounds[answer_idx], self._bounds[answer_idx + 1])
+        ]
+
+
+def get_selections_texts(context: str, offsets: list[tuple[int, int]]) -> list[str]:
+    ''' Rebuilds the texts of the selections of an answer from its context. '''
+    return [context[start:end] for start, end in offsets]
+
+
+def get_answer_text(context: str, offsets: list[tuple[int, int]]) -> str:
+    ''' Rebuilds the full textual answer of the user from its context. '''
+    return "".join(get_selections_texts(context, offsets))
@@ -9,21 +9,9 @@ def clear_game():
 
     # All states to clear
     states_to_clear = [
-        "selected_topic",
-        "selected_topic_idx",
-        "selected_paragraph_idx",
-        "selected_question_idx",
-        "user_answered",
-        "user_correct_answers",
-        "user_textual_answers", 
-        "user_answered_topics_indexes", 
-        "user_answered_paragraphs_indexes", 
-        "user_answered_questions_indexes", 
-        "generated_results", 
-        "scores_results", 
+        "game_session",
+        "celebrate_answer", 
         "user_name", 
-        "initial_time", 
-        "end_time"
     ]
 
     # Clear every state
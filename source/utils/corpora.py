@@ -0,0 +1,67 @@
+# General dependencies
+import os
+import functools
+
+# Local dependencies
+from source.utils.corpus_registry import CorpusRegistry
+from source.models.model_answers import ModelAnswers
+from source.utils.paths import (
+    FAQUAD_DATASET_PATH, FAQUAD_TRAIN_PATH, FAQUAD_TEST_PATH,
+    FAQUAD_DATASET_OUTPUTS_PATH, FAQUAD_TRAIN_OUTPUTS_PATH, FAQUAD_TEST_OUTPUTS_PATH,
+    FAQUAD_DATASET_ENCODINGS_PATH, FAQUAD_TRAIN_ENCODINGS_PATH, FAQUAD_TEST_ENCODINGS_PATH,
+    CORPORA_DIRECTORY)
+
+# Corpus played by default
+DEFAULT_CORPUS = "dev"
+
+# Maximum estimated memory (in MB) of the loaded corpora; unbounded if not set
+CORPORA_MEMORY_BUDGET_MB = os.environ.get("QA_GAME_CORPORA_MEMORY_MB")
+
+# Interval (in seconds) between the checks for changes of the files of the loaded corpora; never checked if 0
+CORPORA_RELOAD_SECONDS = float(os.environ.get("QA_GAME_CORPORA_RELOAD_SECONDS", "10"))
+
+# Live inference of the answers missing from the precomputed outputs of the models
+LIVE_INFERENCE = os.environ.get("QA_GAME_LIVE_INFERENCE", "0") == "1"
+PREDICTION_CACHE_SIZE = int(os.environ.get("QA_GAME_PREDICTION_CACHE_SIZE", "4096"))
+# (workers mostly wait for the batches of the neural model, so several of them feed each batch)
+PREDICTION_WORKERS = int(os.environ.get("QA_GAME_PREDICTION_WORKERS", "8"))
+PREDICTION_WRITE_BACK = os.environ.get("QA_GAME_PREDICTION_WRITE_BACK", "0") == "1"
+SYMBOLIC_MODE = os.environ.get("QA_GAME_SYMBOLIC_MODE", "parser")
+
+def build_corpus_registry(
+    live_inference: bool = LIVE_INFERENCE,
+    write_back: bool = PREDICTION_WRITE_BACK,
+    symbolic_mode: str = SYMBOLIC_MODE
+) -> CorpusRegistry:
+    '''
+    Function to build the registry of the corpora of the QA Game: the
+    dev, train and full FaQuAD datasets, along with the corpora added
+    to the corpora directory. None of them is loaded yet.
+
+    Parameters:
+    ----------
+
+    live_inference: bool
+        Computes the answers missing from the outputs of the models.
+
+    write_back: bool
+        Appends the live answers to the outputs file of their corpus.
+
+    symbolic_mode: str
+        The mode of the symbolic model for the live answers.
+    '''
+    registry = CorpusRegistry(
+        memory_budget = int(float(CORPORA_MEMORY_BUDGET_MB) * 2**20) if CORPORA_MEMORY_BUDGET_MB else None,
+        model_answers_factory = functools.partial(
+            ModelAnswers,
+            live_inference=live_inference,
+            cache_size=PREDICTION_CACHE_SIZE,
+            num_workers=PREDICTION_WORKERS,
+            write_back=write_back,
+            symbolic_mode=symbolic_mode))
+    registry.register("dev", "FaQuAD (validação)", FAQUAD_TEST_PATH, FAQUAD_TEST_OUTPUTS_PATH, FAQUAD_TEST_ENCODINGS_PATH)
+    registry.register("train", "FaQuAD (treino)", FAQUAD_TRAIN_PATH, FAQUAD_TRAIN_OUTPUTS_PATH, FAQUAD_TRAIN_ENCODINGS_PATH)
+    registry.register("full", "FaQuAD (completo)", FAQUAD_DATASET_PATH, FAQUAD_DATASET_OUTPUTS_PATH, FAQUAD_DATASET_ENCODINGS_PATH)
+    if os.path.isdir(CORPORA_DIRECTORY):
+        registry.discover(CORPORA_DIRECTORY)
+    return registry
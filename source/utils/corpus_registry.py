@@ -0,0 +1,407 @@
+# General dependencies
+import os
+import glob
+import time
+import zlib
+import weakref
+import threading
+from typing import Callable
+
+# Local dependencies
+from source.utils.faquad import FaquadDataset
+from source.models.model_answers import ModelAnswers
+
+# Loaded corpora take about twice the size of their files in memory
+_MEMORY_FACTOR = 2
+
+# Size (in bytes) of the chunks read to compute the digest of the files of a corpus
+_DIGEST_CHUNK_SIZE = 2**20
+
+
+def _get_signature(paths: list[str]) -> tuple:
+    ''' Returns the modification time and the size of every file (None for missing ones). '''
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _get_digest(paths: list[str]) -> str:
+    ''' Returns the digest of the content of the files, the same in every process. '''
+    digest = 0
+    for path in paths:
+        digest = zlib.crc32(b"\0", digest)
+        if not os.path.isfile(path):
+            continue
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(_DIGEST_CHUNK_SIZE), b""):
+                digest = zlib.crc32(chunk, digest)
+    return "{:08x}".format(digest)
+
+
+class Corpus:
+    '''
+    A dataset of the QA Game together with the answers of the models
+    for its questions, both shared by every session playing it.
+
+    Parameters:
+    ----------
+
+    name: str
+        The name of the corpus in the registry.
+
+    dataset: FaquadDataset
+        The dataset of the questions.
+
+    model_answers: ModelAnswers
+        The answers of the models for the questions of the dataset.
+
+    version: int
+        The version of the corpus in the registry, increased by every
+        change of the content of its files.
+
+    digest: str
+        The digest of the content of the files of the corpus, which
+        identifies the version across processes and restarts.
+
+    signature: tuple
+        The modification times and the sizes of the watched files of
+        the corpus when it was loaded.
+    '''
+    def __init__(
+        self,
+        name: str,
+        dataset: FaquadDataset,
+        model_answers: ModelAnswers,
+        version: int = 1,
+        digest: str | None = None,
+        signature: tuple = ()
+    ) -> None:
+        self.name = name
+        self.dataset = dataset
+        self.model_answers = model_answers
+        self.version = version
+        self.digest = digest
+        self.signature = signature
+
+
+class CorpusRegistry:
+    '''
+    Registry of the corpora available to the players. Every corpus is
+    loaded the first time it is requested and shared by the following
+    requests; once the estimated memory of the loaded corpora exceeds the
+    budget, the least recently used ones are evicted. Evicted corpora are
+    only weakly referenced, so sessions still playing them keep them alive
+    (and share them with new sessions) until they are done.
+
+    The files of the loaded corpora can be watched (see `watch`): once
+    their content changes, the corpus is loaded again in the background
+    and swapped in under a new version, so new games play it while the
+    games in progress keep the version they started on (see
+    `get_version`). The registry only holds the latest version; the
+    previous one is freed once its last game is done.
+
+    Parameters:
+    ----------
+
+    memory_budget: int | None
+        The maximum estimated memory (in bytes) of the loaded corpora;
+        the most recently used corpus is always kept. Unbounded if None.
+
+    model_answers_factory: Callable[..., ModelAnswers] | None
+        Builds the model answers of a dataset given the path of its
+        outputs file and the keyword `context_encodings_path`; by
+        default, answers without live inference.
+    '''
+    def __init__(
+        self,
+        memory_budget: int | None = None,
+        model_answers_factory: Callable[..., ModelAnswers] | None = None
+    ) -> None:
+        self.memory_budget = memory_budget
+        self._model_answers_factory = model_answers_factory or ModelAnswers
+        self._specs: dict[str, dict] = {}
+        self._loaded: dict[str, Corpus] = {}
+        self._last_access: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._loading_locks: dict[str, threading.Lock] = {}
+
+        # Latest version and digest of every loaded corpus
+        self._versions: dict[str, tuple[int, str]] = {}
+
+        # Versions no longer held by the registry (evicted or replaced), alive while
+        # their games are: the model answers (which hold the dataset), the version
+        # and the signature, by the name and the digest of the corpus
+        self._released: dict[tuple[str, str], tuple[weakref.ref, int, tuple]] = {}
+
+        # Reloads of the changed corpora, one at a time, and their last errors
+        self._reload_lock = threading.Lock()
+        self._watcher: threading.Thread | None = None
+        self.reload_errors: dict[str, str] = {}
+
+    def register(
+        self,
+        name: str,
+        label: str,
+        dataset_path: str,
+        outputs_path: str | None = None,
+        encodings_path: str | None = None
+    ) -> None:
+        '''
+        Registers a corpus, without loading it.
+
+        Parameters:
+        ----------
+
+        name: str
+            The name of the corpus in the registry.
+
+        label: str
+            The name of the corpus shown to the players.
+
+        dataset_path: str
+            The path to the .json file of the dataset.
+
+        outputs_path: str | None
+            The path to the .csv file of the outputs of the models
+            for the dataset, if any.
+
+        encodings_path: str | None
+            The path prefix of the store of encodings of the contexts
+            for the neural model, if any.
+        '''
+        with self._lock:
+            if name in self._specs:
+                raise ValueError("corpus {} is already registered".format(name))
+            self._specs[name] = {
+                "label": label,
+                "dataset_path": dataset_path,
+                "outputs_path": outputs_path,
+                "encodings_path": encodings_path,
+            }
+            self._loading_locks[name] = threading.Lock()
+
+    def discover(self, directory: str) -> list[str]:
+        '''
+        Registers every `<name>.json` dataset of a directory, along with
+        its `<name>_models_answers.csv` outputs file and its
+        `<name>_encodings` store of encodings, returning the names of
+        the new corpora.
+        '''
+        names = []
+        for dataset_path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+            name = os.path.splitext(os.path.basename(dataset_path))[0]
+            if name in self._specs:
+                continue
+            outputs_path = os.path.join(directory, "{}_models_answers.csv".format(name))
+            encodings_path = os.path.join(directory, "{}_encodings".format(name))
+            self.register(name, name, dataset_path, outputs_path, encodings_path)
+            names.append(name)
+        return names
+
+    @property
+    def names(self) -> list[str]:
+        ''' The names of the registered corpora. '''
+        return list(self._specs.keys())
+
+    @property
+    def loaded_names(self) -> list[str]:
+        ''' The names of the corpora currently held by the registry. '''
+        return list(self._loaded.keys())
+
+    @property
+    def versions(self) -> dict[str, int]:
+        ''' The versions of the corpora currently held by the registry. '''
+        return {name: corpus.version for name, corpus in list(self._loaded.items())}
+
+    def get_label(self, name: str) -> str:
+        ''' Returns the name of a corpus shown to the players. '''
+        return self._specs[name]["label"]
+
+    def get(self, name: str) -> Corpus:
+        ''' Returns the latest version of a corpus, loading it if needed. '''
+        if name not in self._specs:
+            raise KeyError("unknown corpus {}".format(name))
+
+        # Only one thread loads a given corpus; the others wait for it
+        with self._loading_locks[name]:
+            with self._lock:
+                corpus = self._loaded.get(name) or self._revive(name)
+                if corpus is not None:
+                    self._last_access[name] = time.monotonic()
+                    return corpus
+
+            # Loads the corpus outside of the registry lock
+            corpus = self._load(name)
+            with self._lock:
+                self._install(corpus)
+                self._evict()
+            return corpus
+
+    def get_version(self, name: str, digest: str | None) -> Corpus | None:
+        '''
+        Returns the version of a corpus with the given digest, as long as
+        it is the latest one or it is still alive (played by some game),
+        or None. Any version matches a None digest.
+        '''
+        corpus = self.get(name)
+        if digest is None or corpus.digest == digest:
+            return corpus
+        with self._lock:
+            entry = self._released.get((name, digest))
+        model_answers = entry[0]() if entry is not None else None
+        if model_answers is None:
+            return None
+        return Corpus(name, model_answers.dataset, model_answers, entry[1], digest, entry[2])
+
+    def when_released(self, corpus: Corpus, callback: Callable[[], None]) -> None:
+        '''
+        Calls `callback` once a version of a corpus is freed: when the
+        registry no longer holds it (replaced or evicted) and its last
+        game is done. The callback must not reference the corpus.
+        '''
+        weakref.finalize(corpus.model_answers, callback)
+
+    def _get_watched_paths(self, name: str, write_back: bool) -> list[str]:
+        '''
+        Returns the files of a corpus whose changes make a new version: the
+        dataset and the outputs of the models, unless the corpus appends
+        its own live answers to them.
+        '''
+        spec = self._specs[name]
+        if spec["outputs_path"] is None or write_back:
+            return [spec["dataset_path"]]
+        return [spec["dataset_path"], spec["outputs_path"]]
+
+    def _load(self, name: str) -> Corpus:
+        ''' Loads the files of a corpus into a new version. '''
+        spec = self._specs[name]
+
+        # The signature and the digest are taken before reading the files, so a
+        # change made while they are read is found by the next check
+        paths = self._get_watched_paths(name, False)
+        signature, digest = _get_signature(paths), _get_digest(paths)
+        dataset = FaquadDataset(spec["dataset_path"])
+        model_answers = self._model_answers_factory(
+            dataset, spec["outputs_path"], context_encodings_path=spec["encodings_path"])
+        if model_answers.write_back:
+            paths = self._get_watched_paths(name, True)
+            signature, digest = _get_signature(paths), _get_digest(paths)
+
+        # Same version as the latest one if the content did not change
+        with self._lock:
+            version, latest_digest = self._versions.get(name, (0, None))
+        return Corpus(name, dataset, model_answers, version if digest == latest_digest else version + 1, digest, signature)
+
+    def _install(self, corpus: Corpus) -> None:
+        ''' Makes a corpus the latest version of its name, releasing the previous one (under the lock). '''
+        previous = self._loaded.get(corpus.name)
+        if previous is not None and previous is not corpus:
+            self._release(previous)
+        self._loaded[corpus.name] = corpus
+        self._last_access[corpus.name] = time.monotonic()
+        self._versions[corpus.name] = (corpus.version, corpus.digest)
+
+    def _release(self, corpus: Corpus) -> None:
+        ''' Keeps a weak reference to a corpus no longer held by the registry (under the lock). '''
+        self._released = {key: entry for key, entry in self._released.items() if entry[0]() is not None}
+        self._released[(corpus.name, corpus.digest)] = (weakref.ref(corpus.model_answers), corpus.version, corpus.signature)
+
+    def _revive(self, name: str) -> Corpus | None:
+        ''' Holds again the latest version of an evicted corpus, if still alive and unchanged (under the lock). '''
+        version, digest = self._versions.get(name, (0, None))
+        entry = self._released.get((name, digest))
+        model_answers = entry[0]() if entry is not None else None
+        if model_answers is None or _get_signature(self._get_watched_paths(name, model_answers.write_back)) != entry[2]:
+            return None
+        del self._released[(name, digest)]
+        corpus = Corpus(name, model_answers.dataset, model_answers, version, digest, entry[2])
+        self._install(corpus)
+        return corpus
+
+    def reload_changed(self) -> list[str]:
+        '''
+        Loads again the held corpora whose files changed, swapping every new
+        version in once it is fully loaded, and returns their names. The
+        corpora are reloaded one at a time, so at most one of them is held
+        twice; a corpus that fails to load keeps its previous version (the
+        error is kept in `reload_errors`).
+        '''
+        if not self._reload_lock.acquire(blocking=False):
+            return []
+        try:
+            reloaded = []
+            for name in self.loaded_names:
+                corpus = self._loaded.get(name)
+                if corpus is None:
+                    continue
+
+                # Files touched without changing their content keep the version
+                paths = self._get_watched_paths(name, corpus.model_answers.write_back)
+                signature = _get_signature(paths)
+                if signature == corpus.signature:
+                    continue
+                try:
+                    if _get_digest(paths) == corpus.digest:
+                        corpus.signature = signature
+                        continue
+                    new_corpus = self._load(name)
+                except Exception as e:
+                    error = "{}: {}".format(type(e).__name__, e)
+                    if self.reload_errors.get(name) != error:
+                        print("Corpus {} could not be reloaded: {}".format(name, error))
+                    self.reload_errors[name] = error
+                    continue
+                self.reload_errors.pop(name, None)
+
+                # Swaps the new version in, unless the corpus was evicted meanwhile
+                with self._lock:
+                    if self._loaded.get(name) is corpus:
+                        self._install(new_corpus)
+                        reloaded.append(name)
+            return reloaded
+        finally:
+            self._reload_lock.release()
+
+    def watch(self, interval: float) -> None:
+        '''
+        Checks the files of the held corpora every `interval` seconds in a
+        background thread, reloading the changed ones (see
+        `reload_changed`). Does nothing if the interval is not positive or
+        the registry is already watched.
+        '''
+        if interval <= 0 or self._watcher is not None:
+            return
+
+        def watch_files() -> None:
+            while True:
+                time.sleep(interval)
+                self.reload_changed()
+
+        self._watcher = threading.Thread(target=watch_files, name="corpus_watcher", daemon=True)
+        self._watcher.start()
+
+    def estimate_memory(self, name: str) -> int:
+        ''' Returns the estimated memory (in bytes) of a loaded corpus. '''
+        spec = self._specs[name]
+        size = os.path.getsize(spec["dataset_path"])
+        if spec["outputs_path"] is not None and os.path.isfile(spec["outputs_path"]):
+            size += os.path.getsize(spec["outputs_path"])
+        return _MEMORY_FACTOR * size
+
+    def _evict(self) -> None:
+        ''' Evicts the least recently used corpora while over the memory budget. '''
+        if self.memory_budget is None:
+            return
+        by_access = sorted(self._loaded.keys(), key=lambda name: self._last_access[name])
+        total = sum(self.estimate_memory(name) for name in by_access)
+        for name in by_access[:-1]:
+            if total <= self.memory_budget:
+                break
+            total -= self.estimate_memory(name)
+            self._release(self._loaded.pop(name))
+            del self._last_access[name]
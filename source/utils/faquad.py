@@ -1,7 +1,12 @@
 # General dependencies
 import os
 import json
+import threading
 import numpy as np
+from typing import Container
+
+# Local dependencies
+from source.utils.search_index import SearchIndex
 
 class FaquadDataset:
     '''
@@ -28,6 +33,29 @@ class FaquadDataset:
             for elem in self._data.values():
                 del elem["title"]
 
+            # Sorted titles and their indexes, computed once as every navigation needs them
+            self._sorted_titles: list[str] = sorted(self._data.keys())
+            self._title_indexes: dict[str, int] = {title: tit_idx for tit_idx, title in enumerate(self._sorted_titles)}
+
+            # Global ids of the questions, following the order of the sorted titles
+            self._question_indexes: list[tuple[int,int,int]] = [
+                (tit_idx, par_idx, qas_idx)
+                for tit_idx, title in enumerate(self._sorted_titles)
+                for par_idx, paragraph in enumerate(self._data[title]["paragraphs"])
+                for qas_idx in range(len(paragraph["qas"]))
+            ]
+            self._question_ids: dict[tuple[int,int,int], int] = {
+                indexes: question_id for question_id, indexes in enumerate(self._question_indexes)
+            }
+
+            # Previews are computed once and reused by every rerun
+            self._paragraphs_previews: dict[str, list[str]] = {}
+            self._questions_previews: dict[tuple[str, int], list[str]] = {}
+
+            # Search index, built by the first search
+            self._search_index: SearchIndex | None = None
+            self._search_index_lock = threading.Lock()
+
         # If file does not exist
         else:
             raise ValueError("expected {} to be a file path".format(file_path))
@@ -39,8 +67,33 @@ class FaquadDataset:
 
     @property
     def sorted_titles(self) -> list[str]:
-        ''' The sorted titles of the contexts for question-answering '''
-        return sorted(self._data.keys())
+        ''' The sorted titles of the contexts for question-answering (shared, not to be modified). '''
+        return self._sorted_titles
+
+    @property
+    def num_questions(self) -> int:
+        ''' The total number of questions of the dataset. '''
+        return len(self._question_indexes)
+
+    @property
+    def search_index(self) -> SearchIndex:
+        ''' The full-text index over the questions and the contexts, built once. '''
+        with self._search_index_lock:
+            if self._search_index is None:
+                self._search_index = SearchIndex(self)
+        return self._search_index
+
+    def get_question_id(self, title_idx: int, paragraph: int, question: int) -> int:
+        ''' Returns the global id of a question given the indexes of its sorted title, paragraph and question. '''
+        return self._question_ids[(title_idx, paragraph, question)]
+
+    def get_question_indexes(self, question_id: int) -> tuple[int, int, int]:
+        ''' Returns the indexes of the sorted title, the paragraph and the question for a global question id. '''
+        return self._question_indexes[question_id]
+
+    def get_title_index(self, title: str) -> int:
+        ''' Returns the index of a title among the sorted titles. '''
+        return self._title_indexes[title]
 
     def get_num_paragraphs(self, title: str) -> int:
         ''' Returns the number of paragraphs of a given title. '''
@@ -48,10 +101,12 @@ class FaquadDataset:
 
     def get_paragraphs_previews(self, title: str) -> list[str]:
         ''' Returns the previews (first fours words) of every paragraph from a given title '''
-        return [
-            " ".join(par["context"].split(" ")[:4]) + "..."
-            for par in self._data[title]["paragraphs"]
-        ]
+        if title not in self._paragraphs_previews:
+            self._paragraphs_previews[title] = [
+                " ".join(par["context"].split(" ")[:4]) + "..."
+                for par in self._data[title]["paragraphs"]
+            ]
+        return self._paragraphs_previews[title]
 
     def get_context(self, title: str, paragraph: int) -> str:
         ''' Returns the context for a given paragraph of a title. '''
@@ -63,10 +118,12 @@ class FaquadDataset:
     
     def get_questions_previews(self, title: str, paragraph: int) -> list[str]:
         ''' Returns the previews of all questions for a given paragraph. '''
-        return [ 
-            " ".join(par["question"].split(" ")[:4]) + "..." 
-            for par in self._data[title]["paragraphs"][paragraph]["qas"]
-        ]
+        if (title, paragraph) not in self._questions_previews:
+            self._questions_previews[(title, paragraph)] = [ 
+                " ".join(par["question"].split(" ")[:4]) + "..." 
+                for par in self._data[title]["paragraphs"][paragraph]["qas"]
+            ]
+        return self._questions_previews[(title, paragraph)]
     
     def get_question(self, title: str, paragraph: int, question: int) -> str:
         ''' Returns the question for the given title, paragraph index and question index.'''
@@ -86,7 +143,7 @@ class FaquadDataset:
         '''
         # Gets the sorted titles
         sorted_titles = self.sorted_titles
-        title_idx = sorted_titles.index(title)
+        title_idx = self.get_title_index(title)
 
         # Tries next question first
         num_questions = len(self._data[title]["paragraphs"][paragraph]["qas"])
@@ -111,7 +168,7 @@ class FaquadDataset:
         '''
         # Gets the sorted titles
         sorted_titles = self.sorted_titles
-        title_idx = sorted_titles.index(title)
+        title_idx = self.get_title_index(title)
 
         # Tries next question first
         num_questions = len(self._data[title]["paragraphs"][paragraph]["qas"])
@@ -136,28 +193,29 @@ class FaquadDataset:
         return num_titles-1, num_paragraphs-1, num_questions-1
 
 
-    def get_answered_topics_mask(self, user_answered: dict[tuple[int,int,int], bool]) -> np.ndarray[bool]:
+    def get_answered_topics_mask(self, answered: Container[int]) -> np.ndarray[bool]:
         ''' 
         Returns the boolean maks for the titles of the contexts 
-        for question-answering that were answered by the user. 
+        for question-answering that were answered by the user, 
+        given the global ids of the answered questions. 
         '''
         # Mask for selection of the titles
         answered_titles = np.full(len(self.sorted_titles), fill_value=False)
         
         # Gets the answered titles
-        for (topic_idx, _, _), answered in user_answered.items():
-            if answered is True:
-                answered_titles[topic_idx] = True
+        for question_id in answered:
+            answered_titles[self._question_indexes[question_id][0]] = True
 
         return answered_titles
 
 
-    def get_answered_paragraphs_mask(self, title: str, user_answered: dict[tuple[int,int,int], bool]) -> np.ndarray[bool]:
+    def get_answered_paragraphs_mask(self, title: str, answered: Container[int]) -> np.ndarray[bool]:
         ''' 
-        Returns the boolean mask for every answered paragraph from a given title.
+        Returns the boolean mask for every answered paragraph from a given 
+        title, given the global ids of the answered questions.
         '''
         # Gets the title idx
-        tit_idx = self.sorted_titles.index(title)
+        tit_idx = self.get_title_index(title)
 
         # Gets the number of paragraphs for the given title
         num_paragraphs = self.get_num_paragraphs(title)
@@ -169,19 +227,20 @@ class FaquadDataset:
         for par_idx in range(num_paragraphs):
             num_questions = self.get_num_questions(title, par_idx)
             for qas_idx in range(num_questions):
-                if (tit_idx, par_idx, qas_idx) in user_answered and user_answered[(tit_idx, par_idx, qas_idx)] is True:
+                if self._question_ids[(tit_idx, par_idx, qas_idx)] in answered:
                     answered_paragraphs[par_idx] = True
                     break
 
         return answered_paragraphs
 
 
-    def get_answered_questions_mask(self, title: str, paragraph: int, user_answered: dict[tuple[int,int,int], bool]) -> np.ndarray[bool]:
+    def get_answered_questions_mask(self, title: str, paragraph: int, answered: Container[int]) -> np.ndarray[bool]:
         ''' 
-        Returns the boolean mask of all answered questions for a given paragraph. 
+        Returns the boolean mask of all answered questions for a given 
+        paragraph, given the global ids of the answered questions. 
         '''
         # Gets the title idx
-        tit_idx = self.sorted_titles.index(title)
+        tit_idx = self.get_title_index(title)
 
         # Gets the number of questions for the given paragraph
         num_questions = self.get_num_questions(title, paragraph)
@@ -191,7 +250,7 @@ class FaquadDataset:
 
         # Verifies every question
         for qas_idx in range(num_questions):
-            if (tit_idx, paragraph, qas_idx) in user_answered and user_answered[(tit_idx, paragraph, qas_idx)] is True:
+            if self._question_ids[(tit_idx, paragraph, qas_idx)] in answered:
                 answered_questions[qas_idx] = True
 
         return answered_questions
\ No newline at end of file
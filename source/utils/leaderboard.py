@@ -1,11 +1,22 @@
 # Dependencies
 import os
+import threading
+import contextlib
 import pandas as pd
 
+# File locks between processes, where available
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 # Constants
 ORIGINAL_LEADERBOARD_PATH = "./data/original_leaderboard.csv"
 GAME_LEADERBOARD_PATH = "./data/game_leaderboard.csv"
 
+# Lock of the read-modify-write of the leaderboard among the threads of the process
+_thread_lock = threading.Lock()
+
 def load_leaderboard() -> pd.DataFrame:
     ''' Loads and returns the leaderboard. '''
 
@@ -28,9 +39,23 @@ def load_leaderboard() -> pd.DataFrame:
     # Returns the DataFrame
     return df
 
+@contextlib.contextmanager
+def locked_leaderboard():
+    ''' Holds the exclusive lock of the leaderboard, among threads and processes, around a read-modify-write. '''
+    with _thread_lock, open(GAME_LEADERBOARD_PATH + ".lock", "a+") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
 def save_leaderboard(df: pd.DataFrame) -> None:
-    ''' Saves the given leaderboard. '''
-    df.to_csv(GAME_LEADERBOARD_PATH, index=False)
+    ''' Saves the given leaderboard (written aside and renamed, so it is never read half written). '''
+    temporary_path = "{}.{}-{}.tmp".format(GAME_LEADERBOARD_PATH, os.getpid(), threading.get_ident())
+    df.to_csv(temporary_path, index=False)
+    os.replace(temporary_path, GAME_LEADERBOARD_PATH)
 
 def add_row_to_leaderboard(df: pd.DataFrame, user: str, tr: int, ta: int, f1: float, em: float, time: float) -> pd.DataFrame:
     ''' Adds a row to the leaderboard '''
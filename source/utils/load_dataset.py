@@ -2,31 +2,76 @@
 import streamlit as st
 
 # Local dependencies
-from source.utils.faquad import FaquadDataset
+from source.utils.corpus_registry import Corpus, CorpusRegistry
+from source.utils.corpora import build_corpus_registry, DEFAULT_CORPUS, CORPORA_RELOAD_SECONDS
+from source.utils.question_stats import QuestionStats, get_question_stats_path
+from source.utils.warmup import WarmUp, build_warmup_steps, WARMUP_ENABLED
+from source.pages.available_pages import PAGE_GENERATORS
 
-# Path for the FaQuAD dataset .json files
-FAQUAD_DATASET_PATH = "./data/dataset.json"
-FAQUAD_TRAIN_PATH = "./data/train.json"
-FAQUAD_TEST_PATH = "./data/dev.json"
 
-def load_dataset(path: str) -> FaquadDataset:
+@st.cache_resource
+def load_corpus_registry() -> CorpusRegistry:
     '''
-    Function to load the dataset for the QA Game.
+    Function to load the registry of the corpora, shared by every
+    session of the server (and so are the corpora it loads). The
+    corpora are reloaded once their files change.
+    '''
+    registry = build_corpus_registry()
+    registry.watch(CORPORA_RELOAD_SECONDS)
+    return registry
+
+
+def load_dataset(corpus_name: str = DEFAULT_CORPUS) -> Corpus:
+    '''
+    Function to load the latest version of a corpus for the QA Game,
+    loading it only if no other session has done it before.
+
+    Parameters:
+    ----------
+
+    corpus_name: str
+        The name of the corpus in the registry.
+    '''
+    return load_corpus_registry().get(corpus_name)
+
+
+@st.cache_resource
+def _load_question_stats_by_corpus() -> dict[str, tuple[int, QuestionStats]]:
+    ''' The statistics of the latest version of every corpus, along with the version. '''
+    return {}
+
+
+def load_question_stats(corpus: Corpus) -> QuestionStats:
+    '''
+    Function to load the statistics of the questions of a version of a
+    corpus across every player; the ones of the latest version are
+    shared by every session of the server.
 
     Parameters:
     ----------
 
-    path: str
-        The path to the .json file to be loaded.
+    corpus: Corpus
+        The version of the corpus, as returned by the registry.
+    '''
+    stats_by_corpus = _load_question_stats_by_corpus()
+    version, question_stats = stats_by_corpus.get(corpus.name, (0, None))
+    if question_stats is None or question_stats.dataset is not corpus.dataset:
+        question_stats = QuestionStats(corpus.dataset, get_question_stats_path(corpus.name, corpus.digest), digest=corpus.digest)
+        load_corpus_registry().when_released(corpus, question_stats.close)
+        if corpus.version >= version:
+            stats_by_corpus[corpus.name] = (corpus.version, question_stats)
+    return question_stats
 
-    Session state outputs:
-    ---------------------
 
-    dataset: FaquadDataset
-        Entry of the dataset itself.
+@st.cache_resource
+def load_warmup() -> WarmUp | None:
+    '''
+    Function to start the warm-up of the shared resources (the default
+    corpora, the leaderboard, the pages and, with live inference, the
+    models) in the background, once per server process. None if the
+    warm-up is disabled.
     '''
-    if "dataset" in st.session_state:
-        dataset = st.session_state["dataset"]
-    else:
-        dataset = FaquadDataset(path)
-        st.session_state["dataset"] = dataset
\ No newline at end of file
+    if not WARMUP_ENABLED:
+        return None
+    modules = tuple(module for module, _ in PAGE_GENERATORS.values())
+    return WarmUp(build_warmup_steps(load_corpus_registry(), modules=modules)).start()
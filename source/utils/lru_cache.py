@@ -0,0 +1,48 @@
+# General dependencies
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable
+
+class LRUCache:
+    '''
+    Thread-safe cache holding up to a maximum number of entries; once
+    full, the least recently used entry is evicted.
+
+    Parameters:
+    ----------
+
+    max_size: int
+        The maximum number of entries.
+    '''
+    def __init__(self, max_size: int) -> None:
+        if max_size <= 0:
+            raise ValueError("expected a positive max_size, got {}".format(max_size))
+        self.max_size = max_size
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        ''' Returns the value of a key, marking it as the most recently used one. '''
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        ''' Stores a value, evicting the least recently used entry if needed. '''
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
@@ -0,0 +1,20 @@
+# Local dependencies
+from source.models.model_output_loader import MODELS_ANSWERS_PATH
+
+# Path for the FaQuAD dataset .json files
+FAQUAD_DATASET_PATH = "./data/dataset.json"
+FAQUAD_TRAIN_PATH = "./data/train.json"
+FAQUAD_TEST_PATH = "./data/dev.json"
+
+# Paths for the .csv files of the model outputs for each dataset
+FAQUAD_DATASET_OUTPUTS_PATH = "./data/models_answers_dataset.csv"
+FAQUAD_TRAIN_OUTPUTS_PATH = "./data/models_answers_train.csv"
+FAQUAD_TEST_OUTPUTS_PATH = MODELS_ANSWERS_PATH
+
+# Path prefixes for the stores of encodings of the contexts for each dataset
+FAQUAD_DATASET_ENCODINGS_PATH = "./data/dataset_encodings"
+FAQUAD_TRAIN_ENCODINGS_PATH = "./data/train_encodings"
+FAQUAD_TEST_ENCODINGS_PATH = "./data/dev_encodings"
+
+# Directory of added corpora: every <name>.json with its <name>_models_answers.csv and <name>_encodings
+CORPORA_DIRECTORY = "./data/corpora"
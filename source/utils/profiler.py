@@ -0,0 +1,82 @@
+# General dependencies
+import io
+import os
+import time
+import pstats
+import cProfile
+import threading
+from typing import Callable
+
+# Directory of the saved profiles
+PROFILES_DIRECTORY = os.environ.get("QA_GAME_PROFILES_DIRECTORY", "./profiles")
+
+# Profiles every rerun of every session
+PROFILE_ALL = os.environ.get("QA_GAME_PROFILE", "0") == "1"
+
+# Only one rerun is profiled at a time, since profilers are process-wide in newer Pythons
+_PROFILER_LOCK = threading.Lock()
+
+
+def profile_call(function: Callable[[], None], name: str, directory: str = PROFILES_DIRECTORY) -> str | None:
+    '''
+    Runs a function under the deterministic profiler, saving its stats to
+    "<directory>/<timestamp>_<name>.prof". Exceptions of the function
+    (as the ones of `st.rerun`) are propagated once the stats are saved.
+    If another call is already being profiled, the function just runs.
+
+    Parameters:
+    ----------
+
+    function: Callable[[], None]
+        The function to be profiled.
+
+    name: str
+        The name of the profile, as the session and the page.
+
+    directory: str
+        The directory of the saved profiles.
+
+    Returns:
+    -------
+
+    path: str | None
+        The path of the saved profile, if profiled.
+    '''
+    if not _PROFILER_LOCK.acquire(blocking=False):
+        function()
+        return None
+    profiler = cProfile.Profile()
+    timestamp = "{}-{:03d}".format(time.strftime("%Y%m%d-%H%M%S"), int(time.time() * 1000) % 1000)
+    path = os.path.join(directory, "{}_{}.prof".format(timestamp, name))
+    try:
+        profiler.enable()
+        try:
+            function()
+        finally:
+            profiler.disable()
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(path)
+    finally:
+        _PROFILER_LOCK.release()
+    return path
+
+
+def list_profiles(directory: str = PROFILES_DIRECTORY) -> list[str]:
+    ''' Returns the names of the saved profiles, from the newest to the oldest. '''
+    if not os.path.isdir(directory):
+        return []
+    return sorted((name for name in os.listdir(directory) if name.endswith(".prof")), reverse=True)
+
+
+def format_profile(path: str, sort_by: str = "cumulative", limit: int = 40, callees: bool = False) -> str:
+    '''
+    Returns the report of a saved profile: the slowest functions by a
+    given key or, with `callees`, the functions called by each of them.
+    '''
+    stream = io.StringIO()
+    stats = pstats.Stats(path, stream=stream).strip_dirs().sort_stats(sort_by)
+    if callees:
+        stats.print_callees(limit)
+    else:
+        stats.print_stats(limit)
+    return stream.getvalue()
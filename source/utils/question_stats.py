@@ -0,0 +1,210 @@
+# General dependencies
+import os
+import time
+import struct
+import atexit
+import weakref
+import contextlib
+import threading
+import numpy as np
+
+# File locks between processes, where available
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Local dependencies
+from source.utils.faquad import FaquadDataset
+
+# Directory of the statistics of the questions of every corpus
+QUESTION_STATS_DIRECTORY = os.environ.get("QA_GAME_QUESTION_STATS_DIRECTORY", "./data/question_stats")
+
+# Interval (in seconds) between the flushes of the statistics to the disk
+QUESTION_STATS_FLUSH_SECONDS = float(os.environ.get("QA_GAME_QUESTION_STATS_FLUSH_SECONDS", "30"))
+
+# Columns of the statistics of every question
+_ATTEMPTS, _HITS, _F1_SUM = range(3)
+
+# Header of the file: a magic, the digest of the corpus and the number of questions,
+# padded so the statistics that follow it stay aligned
+_MAGIC = b"QASTATS1"
+_HEADER = struct.Struct("<8s16sQ")
+_HEADER_SIZE = 64
+
+# Open statistics, flushed by a single background thread of the process
+_OPEN_STATS: "weakref.WeakSet[QuestionStats]" = weakref.WeakSet()
+_flusher: threading.Thread | None = None
+_flusher_lock = threading.Lock()
+
+
+def _flush_open_stats() -> None:
+    while True:
+        time.sleep(1)
+        for question_stats in list(_OPEN_STATS):
+            if question_stats._dirty and time.monotonic() - question_stats._last_flush >= question_stats.flush_seconds:
+                question_stats.flush()
+
+
+def _start_flusher() -> None:
+    global _flusher
+    with _flusher_lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_open_stats, name="question_stats_flusher", daemon=True)
+            _flusher.start()
+
+
+class QuestionStats:
+    '''
+    Statistics of the answers of every player for every question of a
+    corpus: the number of attempts, the number of hits and the sum of the
+    F1 scores. They are kept in a memory-mapped file shared by every
+    process of the server, so each submission updates them in O(1) under
+    a file lock, and reading them never scans the history of the answers.
+    A background thread flushes the changed pages to the disk every
+    `flush_seconds`; `close` releases the statistics once their version
+    of the corpus is no longer played.
+
+    Parameters:
+    ----------
+
+    dataset: FaquadDataset
+        The dataset of the questions, whose (topic, paragraph, question)
+        indexes address the statistics.
+
+    path: str
+        The path of the file of the statistics.
+
+    flush_seconds: float
+        The minimum interval between the flushes to the disk.
+
+    digest: str | None
+        The digest of the content of the corpus. It is stored in the
+        header of the file along with the number of questions, and a file
+        written for other questions is replaced rather than misread.
+    '''
+    def __init__(
+        self,
+        dataset: FaquadDataset,
+        path: str,
+        flush_seconds: float = QUESTION_STATS_FLUSH_SECONDS,
+        digest: str | None = None
+    ) -> None:
+        self.dataset = dataset
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.digest = digest
+        self._thread_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._dirty = False
+
+        # Creates (or replaces) the file under the lock, so processes agree on its header
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock_file = open(path + ".lock", "a+")
+        header = _HEADER.pack(_MAGIC, (digest or "").encode("ascii"), dataset.num_questions).ljust(_HEADER_SIZE, b"\0")
+        with self._locked():
+            self._create_file(header)
+        self._stats = np.memmap(path, dtype=np.float64, mode="r+", offset=_HEADER_SIZE, shape=(dataset.num_questions, 3))
+
+        # Flushed periodically and at exit, without keeping the statistics (and their dataset) alive until then
+        reference = weakref.ref(self)
+        self._flush_at_exit = lambda: reference() is not None and reference().flush()
+        atexit.register(self._flush_at_exit)
+        _OPEN_STATS.add(self)
+        _start_flusher()
+
+    def _create_file(self, header: bytes) -> None:
+        ''' Writes a new file of statistics if it is missing or not the one of these questions. '''
+        size = _HEADER_SIZE + self.dataset.num_questions * 3 * np.dtype(np.float64).itemsize
+        if os.path.isfile(self.path) and os.path.getsize(self.path) == size:
+            with open(self.path, "rb") as fp:
+                if fp.read(_HEADER_SIZE) == header:
+                    return
+
+        # Written aside and renamed, so processes mapping the previous file never see it shrink
+        temporary = "{}.tmp-{}".format(self.path, os.getpid())
+        with open(temporary, "wb") as fp:
+            fp.write(header)
+            fp.truncate(size)
+        os.replace(temporary, self.path)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        ''' Holds the exclusive lock of the statistics, among threads and processes. '''
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def record(self, indexes: tuple[int, int, int], correct: bool, f1: float) -> None:
+        '''
+        Records an answer to a question.
+
+        Parameters:
+        ----------
+
+        indexes: tuple[int, int, int]
+            The indexes of the sorted topic, the paragraph and the question.
+
+        correct: bool
+            Indicates if the answer is correct.
+
+        f1: float
+            The F1 score of the answer.
+        '''
+        row = self.dataset.get_question_id(*indexes)
+        with self._locked():
+            self._stats[row, _ATTEMPTS] += 1
+            self._stats[row, _HITS] += bool(correct)
+            self._stats[row, _F1_SUM] += f1
+            self._dirty = True
+
+    def get(self, indexes: tuple[int, int, int]) -> dict[str, float | int | None]:
+        '''
+        Returns the statistics of a question: "attempts", "hit_rate" and
+        "mean_f1" (these two are None for questions never answered).
+        '''
+        attempts, hits, f1_sum = self._stats[self.dataset.get_question_id(*indexes)]
+        return {
+            "attempts": int(attempts),
+            "hit_rate": float(hits / attempts) if attempts > 0 else None,
+            "mean_f1": float(f1_sum / attempts) if attempts > 0 else None,
+        }
+
+    def get_hit_rates(self, prior: float = 0.5, prior_weight: float = 2.0) -> np.ndarray:
+        '''
+        Returns the hit rate of every question by global id, smoothed
+        towards a prior so questions with few attempts are not extreme.
+        '''
+        attempts = self._stats[:, _ATTEMPTS]
+        return (self._stats[:, _HITS] + prior * prior_weight) / (attempts + prior_weight)
+
+    def flush(self) -> None:
+        ''' Flushes the statistics to the disk. '''
+        self._last_flush = time.monotonic()
+        self._dirty = False
+        self._stats.flush()
+
+    def close(self) -> None:
+        ''' Flushes the statistics and releases their lock file and their exit hook; they are not recorded anymore. '''
+        if self._lock_file.closed:
+            return
+        _OPEN_STATS.discard(self)
+        atexit.unregister(self._flush_at_exit)
+        self.flush()
+        self._lock_file.close()
+
+
+def get_question_stats_path(corpus_name: str, digest: str | None = None, directory: str = QUESTION_STATS_DIRECTORY) -> str:
+    '''
+    Returns the path of the file of the statistics of a version of a
+    corpus; every content digest has its own file, as the positions of
+    the questions change between versions.
+    '''
+    if digest is None:
+        return os.path.join(directory, "{}.stats".format(corpus_name))
+    return os.path.join(directory, "{}-{}.stats".format(corpus_name, digest))
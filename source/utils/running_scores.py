@@ -0,0 +1,74 @@
+# General dependencies
+import math
+import base64
+import numpy as np
+from array import array
+
+# Metrics and agents of the scores of a game
+METRICS = ("f1", "em")
+AGENTS = ("user", "symbolic", "neural")
+
+
+class RunningScores:
+    '''
+    Scores of the answers of a game, updated as every answer is scored:
+    the running mean and variance (Welford's method) of the F1 score and
+    of the exact match of every agent, and the hits of every agent in
+    the order of the answers. Summarizing them takes constant time, no
+    matter how many answers the game has.
+    '''
+    def __init__(self) -> None:
+
+        # Count, mean and sum of squared deviations of every score ("<metric>_<agent>")
+        self._moments: dict[str, list[float]] = {
+            "{}_{}".format(metric, agent): [0, 0.0, 0.0] for metric in METRICS for agent in AGENTS
+        }
+
+        # Hits of every agent by the position of the answer (-1 while not scored)
+        self._hits: dict[str, array] = {agent: array("b") for agent in AGENTS}
+
+    def add(self, position: int, agent: str, f1: float, em: float, hit: bool) -> None:
+        ''' Adds the scores of an agent for the answer at a given position of the game. '''
+        for metric, value in (("f1", f1), ("em", em)):
+            moments = self._moments["{}_{}".format(metric, agent)]
+            moments[0] += 1
+            delta = value - moments[1]
+            moments[1] += delta / moments[0]
+            moments[2] += delta * (value - moments[1])
+        hits = self._hits[agent]
+        if len(hits) <= position:
+            hits.extend([-1] * (position + 1 - len(hits)))
+        hits[position] = int(hit)
+
+    def get_count(self, agent: str) -> int:
+        ''' Returns the number of scored answers of an agent. '''
+        return int(self._moments["f1_" + agent][0])
+
+    def summary(self) -> dict:
+        '''
+        Returns the scores in the format of `GameSession.finish`: the mean
+        and the standard deviation of every "<metric>_<agent>" score and
+        the boolean array of the hits of every agent ("hit_<agent>").
+        '''
+        scores = {
+            key: (float(mean), math.sqrt(m2 / count)) if count > 0 else (math.nan, math.nan)
+            for key, (count, mean, m2) in self._moments.items()
+        }
+        scores.update({"hit_" + agent: np.array(hits, dtype=np.int8) == 1 for agent, hits in self._hits.items()})
+        return scores
+
+    def to_state(self) -> dict:
+        ''' Returns the running sums and the hits, for serialization. '''
+        return {
+            "moments": self._moments,
+            "hits": {agent: base64.b64encode(hits.tobytes()).decode("ascii") for agent, hits in self._hits.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "RunningScores":
+        ''' Rebuilds the scores from the output of `to_state`. '''
+        scores = cls()
+        scores._moments = {key: list(moments) for key, moments in state["moments"].items()}
+        for agent, hits in state["hits"].items():
+            scores._hits[agent] = array("b", base64.b64decode(hits))
+        return scores
@@ -0,0 +1,126 @@
+# General dependencies
+import re
+import unicodedata
+import numpy as np
+from collections import defaultdict
+
+# Portuguese stop words, without accents
+STOP_WORDS = frozenset('''
+a ao aos as ate com como da das de dela dele do dos e ela ele em entre era
+essa esse esta este eu foi for ha isso isto ja la lhe mais mas me mesmo na
+nas nao no nos num numa o os ou para pela pelas pelo pelos por qual quais
+quando que quem se sem ser seu seus sua suas sao so tambem te tem um uma
+umas uns voce
+'''.split())
+
+# Words of a text
+_WORDS_REGEX = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> list[str]:
+    ''' Returns the lowered words of a text without accents and stop words. '''
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return [word for word in _WORDS_REGEX.findall(text) if word not in STOP_WORDS]
+
+
+def _build_postings(documents: list[str], k1: float, b: float) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    '''
+    Builds the inverted index of the documents. Every term is mapped to the
+    documents containing it along with their BM25 weights for the term, so
+    scoring a query only sums the weights of its terms.
+    '''
+    # Term frequencies of every document
+    frequencies: dict[str, dict[int, int]] = defaultdict(dict)
+    lengths = np.zeros(len(documents), dtype=np.float64)
+    for doc_id, document in enumerate(documents):
+        tokens = tokenize(document)
+        lengths[doc_id] = len(tokens)
+        for token in tokens:
+            frequencies[token][doc_id] = frequencies[token].get(doc_id, 0) + 1
+
+    # BM25 weights of every posting
+    norms = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+    postings = {}
+    for term, term_frequencies in frequencies.items():
+        doc_ids = np.fromiter(term_frequencies.keys(), dtype=np.int32, count=len(term_frequencies))
+        tf = np.fromiter(term_frequencies.values(), dtype=np.float64, count=len(term_frequencies))
+        idf = np.log(1 + (len(documents) - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+        postings[term] = (doc_ids, (idf * tf * (k1 + 1) / (tf + norms[doc_ids])).astype(np.float32))
+    return postings
+
+
+class SearchIndex:
+    '''
+    Full-text BM25 index over the questions and the contexts of a dataset.
+    A question is scored by its own text and, with a lower weight, by the
+    text of its context. The search ignores case, accents and stop words.
+
+    Parameters:
+    ----------
+
+    dataset: FaquadDataset
+        The dataset to be indexed.
+
+    context_weight: float
+        The weight of the score of the context of a question.
+
+    k1: float
+        The term frequency saturation of BM25.
+
+    b: float
+        The length normalization of BM25.
+    '''
+    def __init__(self, dataset, context_weight: float = 0.5, k1: float = 1.5, b: float = 0.75) -> None:
+        self.context_weight = context_weight
+
+        # Texts of the questions (in the order of their global ids) and of the contexts
+        questions, contexts = [], []
+        question_paragraphs = np.zeros(dataset.num_questions, dtype=np.int32)
+        paragraph_ids: dict[tuple[int,int], int] = {}
+        sorted_titles = dataset.sorted_titles
+        for question_id in range(dataset.num_questions):
+            title_idx, paragraph, question = dataset.get_question_indexes(question_id)
+            title = sorted_titles[title_idx]
+            if (title_idx, paragraph) not in paragraph_ids:
+                paragraph_ids[(title_idx, paragraph)] = len(contexts)
+                contexts.append(dataset.get_context(title, paragraph))
+            questions.append(dataset.get_question(title, paragraph, question))
+            question_paragraphs[question_id] = paragraph_ids[(title_idx, paragraph)]
+
+        # Inverted indexes
+        self._questions_postings = _build_postings(questions, k1, b)
+        self._contexts_postings = _build_postings(contexts, k1, b)
+        self._question_paragraphs = question_paragraphs
+        self._num_contexts = len(contexts)
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[int, float]]:
+        '''
+        Returns the global ids of the questions best matching
+        a query, along with their scores, from best to worst.
+        '''
+        terms = set(tokenize(query))
+        scores = np.zeros(len(self._question_paragraphs), dtype=np.float32)
+
+        # Scores of the questions
+        for term in terms:
+            if term in self._questions_postings:
+                doc_ids, weights = self._questions_postings[term]
+                scores[doc_ids] += weights
+
+        # Scores of the contexts, given to each of their questions
+        if self.context_weight > 0:
+            context_scores = np.zeros(self._num_contexts, dtype=np.float32)
+            for term in terms:
+                if term in self._contexts_postings:
+                    doc_ids, weights = self._contexts_postings[term]
+                    context_scores[doc_ids] += weights
+            scores += self.context_weight * context_scores[self._question_paragraphs]
+
+        # Best questions
+        limit = min(limit, int(np.count_nonzero(scores)))
+        if limit <= 0:
+            return []
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(int(question_id), float(scores[question_id])) for question_id in best]
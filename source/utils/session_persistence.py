@@ -0,0 +1,109 @@
+# General dependencies
+import json
+import zlib
+import streamlit as st
+
+# Local dependencies
+from source.pages.available_pages import Pages
+from source.engine.game_session import GameSession
+from source.engine.session_store import SessionStore, build_session_store
+from source.utils.load_dataset import load_corpus_registry, load_question_stats
+
+# Pages whose game is kept in the session store
+_PERSISTED_PAGES = (Pages.GAME, Pages.RESULTS)
+
+
+@st.cache_resource
+def load_session_store() -> SessionStore | None:
+    ''' Loads the store of the games, shared by every session of the process. '''
+    return build_session_store()
+
+
+def restore_game_session() -> None:
+    '''
+    Restores the game of the "sid" query parameter from the session
+    store, when the session state does not have a game (as after a
+    restart of the server or a reconnection to another process), over
+    the version of its corpus it started on. Games whose version is no
+    longer available (its files changed meanwhile) are dropped, and so
+    are invalid ids and games that cannot be read.
+
+    Session state outputs:
+    ---------------------
+
+    game_session: GameSession
+        The restored game, if found.
+
+    current_page: Pages
+        The game page, or the results page for finished games.
+    '''
+    session_id = st.query_params.get("sid")
+    store = load_session_store()
+    if session_id is None or store is None or "game_session" in st.session_state:
+        return
+
+    # Drops unknown (or expired) games, and the ones whose corpus changed
+    try:
+        data = store.get(session_id)
+        corpus_name, corpus_digest = (None, None) if data is None else GameSession.read_corpus(data)
+        registry = load_corpus_registry()
+        corpus = registry.get_version(corpus_name, corpus_digest) if corpus_name in registry.names else None
+        if corpus is None:
+            st.query_params.pop("sid", None)
+            return
+
+        # Rebuilds the game over the shared resources of its corpus
+        game = GameSession.from_bytes(data, corpus.dataset, corpus.model_answers, load_question_stats(corpus))
+
+    # Drops invalid ids and corrupt (or outdated) games, so the URL does not fail on every rerun
+    except (ValueError, KeyError, json.JSONDecodeError, zlib.error):
+        st.query_params.pop("sid", None)
+        try:
+            store.delete(session_id)
+        except ValueError:
+            pass
+        return
+    st.session_state["game_session"] = game
+    st.session_state["game_session_digest"] = zlib.crc32(data)
+    st.session_state["current_page"] = Pages.RESULTS if game.finished else Pages.GAME
+
+
+def persist_game_session() -> None:
+    '''
+    Saves the game of the session to the session store (only if it
+    changed) while it is being played or its results are shown, keeping
+    its id in the "sid" query parameter; removes it from the store once
+    the player leaves it.
+
+    Session state dependencies:
+    --------------------------
+
+    game_session: GameSession
+        The engine of the current game, if any.
+
+    Session state outputs:
+    ---------------------
+
+    game_session_digest: int
+        The checksum of the last saved state of the game.
+    '''
+    store = load_session_store()
+    if store is None:
+        return
+    game: GameSession | None = st.session_state.get("game_session")
+
+    # Saves the game in play
+    if game is not None and st.session_state["current_page"] in _PERSISTED_PAGES:
+        data = game.to_bytes()
+        digest = zlib.crc32(data)
+        if st.session_state.get("game_session_digest") != digest:
+            store.put(game.game_id, data)
+            st.session_state["game_session_digest"] = digest
+        if st.query_params.get("sid") != game.game_id:
+            st.query_params["sid"] = game.game_id
+
+    # Removes the game left by the player
+    elif "sid" in st.query_params:
+        store.delete(st.query_params["sid"])
+        st.query_params.pop("sid", None)
+        st.session_state.pop("game_session_digest", None)
@@ -0,0 +1,126 @@
+# General dependencies
+import os
+import time
+import threading
+from typing import Callable
+
+# Local dependencies
+from source.utils.corpus_registry import CorpusRegistry
+
+# Warm-up of the shared resources when the server starts
+WARMUP_ENABLED = os.environ.get("QA_GAME_WARMUP", "1") == "1"
+
+# Corpora loaded by the warm-up (comma-separated names)
+WARMUP_CORPORA = [name for name in os.environ.get("QA_GAME_WARMUP_CORPORA", "dev").split(",") if name]
+
+# Questions answered by the models of every warmed corpus, with live inference
+WARMUP_INFERENCES = int(os.environ.get("QA_GAME_WARMUP_INFERENCES", "2"))
+
+
+class WarmUp:
+    '''
+    Warm-up of the shared resources of a server process: runs its steps
+    once, in order, in a background thread, so the first players do not
+    pay for the cold caches. A failed step is recorded and skipped (its
+    resource is then loaded on demand, as without the warm-up).
+
+    Parameters:
+    ----------
+
+    steps: list[tuple[str, Callable[[], object]]]
+        The name and the function of every step.
+    '''
+    def __init__(self, steps: list[tuple[str, Callable[[], object]]]) -> None:
+        self.steps = steps
+        self.current_step: str | None = None
+        self.timings: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+
+    def start(self) -> "WarmUp":
+        ''' Starts the warm-up in the background, returning itself. '''
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        for name, step in self.steps:
+            self.current_step = name
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                self.errors[name] = "{}: {}".format(type(e).__name__, e)
+            self.timings[name] = time.perf_counter() - start
+        self.current_step = None
+        self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        ''' Indicates if every step is done. '''
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        ''' Waits up to `timeout` seconds for the warm-up, returning if it is done. '''
+        return self._done.wait(timeout)
+
+    @property
+    def status(self) -> dict:
+        ''' The readiness, the running step, the time of the finished ones (in seconds) and their errors. '''
+        return {
+            "ready": self.ready,
+            "step": self.current_step,
+            "progress": "{}/{}".format(len(self.timings), len(self.steps)),
+            "timings_s": dict(self.timings),
+            "errors": dict(self.errors),
+        }
+
+
+def _load_leaderboard() -> None:
+    from source.utils.leaderboard import load_leaderboard
+    load_leaderboard()
+
+
+def build_warmup_steps(
+    registry: CorpusRegistry,
+    corpus_names: list[str] = WARMUP_CORPORA,
+    num_inferences: int = WARMUP_INFERENCES,
+    modules: tuple[str, ...] = (),
+    leaderboard: bool = True
+) -> list[tuple[str, Callable[[], object]]]:
+    '''
+    Builds the steps of the warm-up of a server: the loading of the
+    dataset and of the model outputs of the given corpora, the reading
+    of the leaderboard, the import of the given modules (as the pages of
+    the app) and, with live inference, the loading of the models and a
+    few inferences over every corpus.
+
+    Parameters:
+    ----------
+
+    registry: CorpusRegistry
+        The corpora of the server.
+
+    corpus_names: list[str]
+        The corpora to be loaded; unknown names are ignored.
+
+    num_inferences: int
+        The number of questions answered by the models of every corpus.
+
+    modules: tuple[str, ...]
+        The modules to be imported.
+
+    leaderboard: bool
+        Reads the leaderboard (only shown by the app).
+    '''
+    corpus_names = [name for name in dict.fromkeys(corpus_names) if name in registry.names]
+    steps = [("corpus:" + name, lambda name=name: registry.get(name)) for name in corpus_names]
+    if leaderboard:
+        steps.append(("leaderboard", _load_leaderboard))
+    steps += [("import:" + module, lambda module=module: __import__(module)) for module in dict.fromkeys(modules)]
+    if num_inferences > 0:
+        steps += [
+            ("models:" + name, lambda name=name: registry.get(name).model_answers.warm_up(num_inferences))
+            for name in corpus_names
+        ]
+    return steps